@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Microbenchmarks of the protocol core, no port and no camera involved:
+#
+#   python benchmark.py [-n loops]
+#
+# Every line is the best of 5 runs, in microseconds per operation.
+#
+
+import argparse
+import timeit
+
+from pyviscalib.protocol import ViscaProtocol, Framer, encode
+from pyviscalib.packet import Packet
+
+ZOOM = b'\x01\x04\x47\x00\x02\x00\x00'
+ACK = b'\x90\x41\xff'
+COMPLETION = b'\x90\x51\xff'
+ZOOM_REPLY = b'\x90\x50\x00\x02\x00\x00\xff'
+
+
+def command_round_trip(protocol):
+    protocol.encode(1, ZOOM)
+    protocol.start(1)
+    protocol.receive_data(ACK)
+    protocol.receive_data(COMPLETION)
+
+
+def inquiry_round_trip(protocol):
+    protocol.encode(1, b'\x09\x04\x47')
+    protocol.start(1, True)
+    protocol.receive_data(ZOOM_REPLY)
+
+
+def byte_by_byte(protocol):
+    # how the blocking client feeds a serial port
+    protocol.start(1, True)
+    for i in range(len(ZOOM_REPLY)):
+        protocol.receive_data(ZOOM_REPLY[i:i+1])
+
+
+BENCHMARKS = [
+    ('encode', lambda: encode(0, 1, ZOOM)),
+    ('frame 3 packets in one chunk', lambda f=Framer(): f.feed(ACK + COMPLETION + ZOOM_REPLY)),
+    ('classify reply', lambda: Packet(ZOOM_REPLY).type),
+    ('decode zoom word', lambda p=Packet(ZOOM_REPLY): p.word()),
+    ('command: encode, ACK, COMPLETION', lambda p=ViscaProtocol(): command_round_trip(p)),
+    ('inquiry: encode, reply', lambda p=ViscaProtocol(): inquiry_round_trip(p)),
+    ('inquiry reply fed byte by byte', lambda p=ViscaProtocol(): byte_by_byte(p)),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='protocol microbenchmarks')
+    parser.add_argument('-n', type=int, default=20000, help='loops per run')
+    args = parser.parse_args(argv)
+
+    for name, fn in BENCHMARKS:
+        best = min(timeit.repeat(fn, number=args.n, repeat=5))
+        print('%-36s %8.3f us' % (name, best / args.n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Bus bandwidth accounting and admission control.
+#
+# At 9600 baud a byte takes 10 bits on the wire, the link carries about
+# 960 bytes per second. ViscaControl.bandwidth sees every byte written
+# and read and keeps the wire time of the last `window` seconds, in total
+# and per consumer:
+#
+#   bus = visca.bandwidth
+#   bus.set_budget('zoom', max_share=0.4)      # zoom polling <= 40 %
+#   bus.set_budget('registers', only_below=0.2)  # only on a quiet bus
+#
+#   with bus.consumer('zoom'):                 # traffic of this thread
+#       visca.inquiry_precise_zoom_position(1) # counts as 'zoom'
+#
+# Inside consumer() blocks ViscaControl waits before sending until the
+# budget admits the packet. Periodic pollers (PTZStream,
+# TelemetryPublisher) ask admit() first and skip the slot instead, so
+# over budget work is thinned rather than queued. A max_share too small
+# for even the largest request is refused by set_budget(), it would
+# block its consumer forever.
+#
+# Sessions, macros, register dumps and the gateway write their packets
+# themselves (ViscaControl.write_raw) while holding the bus lock for a
+# whole batch: their bytes are charged to the consumer of the thread like
+# any other, but they are not held back by its budget. Groups wait for
+# the budget before they lock the ports.
+#
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# what a typical inquiry costs: 5 bytes out, 7 bytes back
+INQUIRY_BYTES = 12
+
+# the largest request send_packet waits for: a 16 byte packet, an ACK
+# and a COMPLETION (or a 7 byte reply) back
+MAX_REQUEST_BYTES = 16 + 7
+
+
+class Budget():
+
+    __slots__ = ('max_share', 'only_below')
+
+    def __init__(self, max_share=None, only_below=None):
+        # share of the bus the consumer may use on its own
+        self.max_share = max_share
+        # the consumer may only use the bus while its total utilization
+        # is below this
+        self.only_below = only_below
+
+
+class BandwidthManager():
+
+    def __init__(self, transport, window=1.0):
+        self.transport = transport
+        self.window = window
+        self.budgets = {}
+        # (time, seconds on the wire, consumer) of the last window
+        self._events = deque()
+        self._total = 0.0
+        self._by_consumer = {}
+        # everything since the start, for stats()
+        self.bytes = 0
+        self.deferred = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def set_budget(self, consumer, max_share=None, only_below=None):
+        """
+        raises ValueError for a budget that could never admit a request
+        """
+        if max_share is not None:
+            smallest = self.transport.wire_time(MAX_REQUEST_BYTES) / self.window
+            if max_share < smallest:
+                raise ValueError("max_share %.4f of %s is below one request (%.4f)"
+                                 % (max_share, consumer, smallest))
+        if only_below is not None and only_below <= 0:
+            raise ValueError("only_below of %s must be above 0" % consumer)
+        self.budgets[consumer] = Budget(max_share, only_below)
+
+    def clear_budget(self, consumer):
+        self.budgets.pop(consumer, None)
+
+    @contextmanager
+    def consumer(self, name):
+        """
+        the bus traffic of this thread inside the block is charged to name
+        """
+        previous = getattr(self._local, 'consumer', None)
+        self._local.consumer = name
+        try:
+            yield self
+        finally:
+            self._local.consumer = previous
+
+    @property
+    def current(self):
+        return getattr(self._local, 'consumer', None)
+
+    def _expire(self, now):
+        limit = now - self.window
+        events = self._events
+        while events and events[0][0] < limit:
+            t, seconds, consumer = events.popleft()
+            self._total -= seconds
+            self._by_consumer[consumer] -= seconds
+        if not events:
+            # no rounding errors piling up over the hours
+            self._total = 0.0
+            self._by_consumer.clear()
+
+    def account(self, nbytes, now=None):
+        """
+        nbytes went over the wire (either direction), charged to the
+        consumer of the calling thread
+        """
+        seconds = self.transport.wire_time(nbytes)
+        if now is None:
+            now = time.monotonic()
+        consumer = self.current
+        with self._lock:
+            self.bytes += nbytes
+            if not seconds:
+                return
+            self._events.append((now, seconds, consumer))
+            self._total += seconds
+            self._by_consumer[consumer] = self._by_consumer.get(consumer, 0.0) + seconds
+            self._expire(now)
+
+    def utilization(self, consumer=None, now=None):
+        """
+        share of the last window the wire was busy (0..1), of all traffic
+        or of one consumer only
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            busy = self._total if consumer is None else self._by_consumer.get(consumer, 0.0)
+        return max(0.0, busy / self.window)
+
+    def admit(self, consumer=None, nbytes=INQUIRY_BYTES, now=None):
+        """
+        True if consumer may put nbytes on the wire now without going over
+        its budget
+        """
+        if consumer is None:
+            consumer = self.current
+        budget = self.budgets.get(consumer)
+        if budget is None:
+            return True
+        cost = self.transport.wire_time(nbytes) / self.window
+        if budget.only_below is not None and self.utilization(now=now) >= budget.only_below:
+            return False
+        if budget.max_share is not None and self.utilization(consumer, now) + cost > budget.max_share:
+            return False
+        return True
+
+    def wait(self, consumer=None, nbytes=INQUIRY_BYTES, timeout=None):
+        """
+        blocks until admit() says yes, False if that did not happen
+        within timeout seconds
+        """
+        if self.admit(consumer, nbytes):
+            return True
+        self.deferred += 1
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.admit(consumer, nbytes):
+            if deadline is not None and time.monotonic() >= deadline:
+                self.rejected += 1
+                return False
+            # traffic leaves the window continuously, a fraction of it is
+            # enough to look again
+            time.sleep(self.window / 50)
+        return True
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            consumers = dict((c, s / self.window) for c, s in self._by_consumer.items() if s > 1e-9)
+            total = self._total / self.window
+        return {'utilization': max(0.0, total), 'consumers': consumers,
+                'bytes': self.bytes, 'deferred': self.deferred,
+                'rejected': self.rejected}
@@ -0,0 +1,269 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Exposure bracketing on a fixed cadence, e.g. for HDR capture:
+#
+#   bracket = Bracket(visca, 1, shutter=[0x0a, 0x0d, 0x10], cadence=1/30.)
+#   result = bracket.run()
+#   for step in result.steps:
+#       step.values, step.sent, step.completed      # monotonic times
+#
+# The steps are compiled once into a macro (see macro.py): the exposure
+# mode first, `lead` seconds before the first step, then one step every
+# `cadence` seconds, each step sending the shutter (iris, gain) values
+# given for it. run() plays the macro from a thread of its own, with
+# real time priority where the system allows it, so the caller's thread
+# and the GIL switches of its other threads do not add to the schedule.
+# Every step is confirmed by the COMPLETION of each of its packets.
+#
+
+import os
+import threading
+
+from .macro import Macro, MacroError
+
+# ae modes, see ViscaControl.cmd_cam_ae_mode
+MANUAL = 0x03
+SHUTTER_PRIORITY = 0x0A
+IRIS_PRIORITY = 0x0B
+
+# setting -> ViscaControl method
+SETTINGS = (
+    ('shutter', 'cmd_cam_shutter_speed'),
+    ('iris', 'cmd_cam_iris_direct'),
+    ('gain', 'cmd_cam_gain_direct'),
+)
+
+
+def _realtime(priority):
+    """
+    moves the calling thread to SCHED_FIFO, False if not allowed
+    (needs CAP_SYS_NICE or a suitable rtprio limit)
+    """
+    if not priority or not hasattr(os, 'sched_setscheduler'):
+        return False
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except OSError:
+        return False
+    return True
+
+
+class BracketStep():
+
+    __slots__ = ('index', 'values', 'scheduled', 'sent', 'completed', 'error')
+
+    def __init__(self, index, values, scheduled):
+        self.index = index
+        # {setting: value} sent by this step
+        self.values = values
+        # monotonic times: planned, first packet written, last
+        # COMPLETION read
+        self.scheduled = scheduled
+        self.sent = None
+        self.completed = None
+        self.error = None
+
+    @property
+    def jitter(self):
+        if self.sent is None:
+            return None
+        return self.sent - self.scheduled
+
+    @property
+    def latency(self):
+        """
+        seconds from the first packet to the last COMPLETION
+        """
+        if self.sent is None or self.completed is None:
+            return None
+        return self.completed - self.sent
+
+    def __repr__(self):
+        return 'BracketStep(%d, %s, jitter=%s, latency=%s, error=%s)' % (
+            self.index, self.values,
+            '%.3fms' % (self.jitter * 1000) if self.jitter is not None else None,
+            '%.3fms' % (self.latency * 1000) if self.latency is not None else None,
+            self.error)
+
+
+class BracketResult():
+
+    def __init__(self, start, steps, macro, realtime):
+        # monotonic time of the first step
+        self.start = start
+        self.steps = steps
+        # the MacroResult, with the exposure mode step
+        self.macro = macro
+        # the sending thread ran with real time priority
+        self.realtime = realtime
+
+    @property
+    def ok(self):
+        return all(s.error is None and s.completed is not None for s in self.steps) and self.macro.ok
+
+    def jitter_stats(self):
+        return self.macro.jitter_stats()
+
+    def intervals(self):
+        """
+        measured time between the sends of consecutive steps
+        """
+        sent = [s.sent for s in self.steps]
+        return [b - a for a, b in zip(sent, sent[1:]) if a is not None and b is not None]
+
+    def __repr__(self):
+        return 'BracketResult(ok=%s, %d steps, realtime=%s, %r)' % (
+            self.ok, len(self.steps), self.realtime, self.macro)
+
+
+class Bracket():
+
+    def __init__(self, visca, device=1, shutter=None, iris=None, gain=None,
+                 cadence=1 / 30.0, lead=0.1, ae_mode=None, priority=10):
+        """
+        shutter, iris, gain = one value per step (the byte the cmd_cam_*
+                  method takes), lists of the same length
+        cadence = seconds between steps (one frame: 1/30, 1/60, ...)
+        lead    = seconds between the exposure mode and the first step
+        ae_mode = exposure mode sent first; by default shutter priority
+                  for shutter only, iris priority for iris only, manual
+                  otherwise. False to leave it alone
+        priority = SCHED_FIFO priority of the sending thread, 0 for none
+        """
+        self.visca = visca
+        self.device = device
+        self.cadence = cadence
+        self.priority = priority
+        self._thread = None
+        self._result = None
+        # what the sending thread raised, for join()
+        self._error = None
+
+        given = dict((name, list(values)) for name, values in
+                     (('shutter', shutter), ('iris', iris), ('gain', gain)) if values is not None)
+        if not given:
+            raise MacroError("nothing to bracket")
+        counts = set(len(values) for values in given.values())
+        if len(counts) != 1:
+            raise MacroError("shutter, iris and gain need one value per step")
+        self.count = counts.pop()
+
+        if ae_mode is None:
+            if list(given) == ['shutter']:
+                ae_mode = SHUTTER_PRIORITY
+            elif list(given) == ['iris']:
+                ae_mode = IRIS_PRIORITY
+            else:
+                ae_mode = MANUAL
+        self.ae_mode = ae_mode
+
+        macro = Macro(visca, device)
+        if ae_mode is not False:
+            macro.add('cmd_cam_ae_mode', ae_mode)
+            macro.wait(lead)
+        self.lead = lead if ae_mode is not False else 0.0
+        # macro step index -> bracket step index
+        self._owners = [None] * len(macro.steps)
+        self.values = []
+        for i in range(self.count):
+            values = {}
+            # the first packet of a step waits a cadence, the others of
+            # the same step follow it right away
+            delay = cadence if i else 0.0
+            for name, method in SETTINGS:
+                if name not in given:
+                    continue
+                value = given[name][i]
+                values[name] = value
+                if name == 'shutter':
+                    value = bytes([value])
+                macro.add(method, value, delay=delay)
+                self._owners.append(i)
+                delay = 0.0
+            self.values.append(values)
+        self.compiled = macro.compile()
+
+    def _play(self, start):
+        realtime = _realtime(self.priority)
+        try:
+            result = self.compiled.run(start=start)
+            self._result = self._collect(result, realtime)
+        except Exception as e:
+            self._error = e
+
+    def _collect(self, result, realtime):
+        first = result.start + self.lead
+        steps = [BracketStep(i, values, first + i * self.cadence)
+                 for i, values in enumerate(self.values)]
+        # every packet of a step COMPLETEd: the last of them
+        done = [True] * len(steps)
+        for owner, (name, offset, sent, acked, completed, error) in zip(self._owners, result.steps):
+            if owner is None:
+                continue
+            step = steps[owner]
+            if sent is not None and step.sent is None:
+                step.sent = result.start + sent
+            if error is not None:
+                step.error = error
+            if completed is None:
+                done[owner] = False
+            elif step.completed is None or result.start + completed > step.completed:
+                step.completed = result.start + completed
+        for step in steps:
+            if not done[step.index]:
+                step.completed = None
+        return BracketResult(first, steps, result, realtime)
+
+    def start(self, start=None):
+        """
+        plays the bracket in its own thread; start = monotonic time of the
+        exposure mode step (e.g. a frame boundary), None for right away
+        """
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._play, args=(start,), daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+        """
+        waits for the bracket started by start(), returns the
+        BracketResult (None if still running after timeout). Raises
+        what the sending thread raised (e.g. the port failing).
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return None
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        return self._result
+
+    def run(self, start=None):
+        self.start(start)
+        return self.join()
@@ -0,0 +1,367 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# pyvisca command line:
+#
+#   pyvisca zoom 12                     one shot command
+#   pyvisca get ae-mode                 one shot inquiry
+#   pyvisca watch zoom-position ae-mode --rate 5
+#   pyvisca shell                       interactive, with tab completion
+#   pyvisca list                        everything the registry knows
+#
+# Every transaction is timed: wire time is what the bytes cost on the
+# link (10 bits per byte at 9600 baud), camera time is the rest of the
+# round trip.
+#
+
+import argparse
+import cmd
+import inspect
+import re
+import shlex
+import sys
+import time
+
+from .visca import ViscaControl
+
+# short names for the commands used most
+ALIASES = {
+    'zoom': 'cmd_cam_zoom_direct',
+    'power': 'cmd_cam_power',
+    'mirror': 'cmd_cam_lr_reverse',
+    'flip': 'cmd_cam_ud_reverse',
+    'effect': 'cmd_cam_picture_effect',
+    'shutter': 'cmd_cam_shutter_speed',
+    'ae': 'cmd_cam_ae_mode',
+}
+
+INQUIRY_ALIASES = {
+    'zoom': 'inquiry_combined_zoom_pos',
+    'mirror': 'inquiry_mirror_mode',
+    'flip': 'inquiry_flip_mode',
+    'effect': 'inquiry_picture_effect',
+    'shutter': 'inquiry_shutter_speed',
+    'version': 'inquiry_version',
+}
+
+# arguments that are sent as single bytes
+BYTE_ARGUMENTS = {
+    'cmd_cam_shutter_speed': (0,),
+    'cmd_cam_register_set': (0, 1),
+    'inquiry_register': (0,),
+    'inquiry_register_raw': (0,),
+}
+
+# on/off style setters: mirror on -> cmd_cam_lr_reverse(device, 0x02)
+ONOFF = ('cmd_cam_lr_reverse', 'cmd_cam_ud_reverse', 'cmd_cam_stabilization',
+         'cmd_cam_backlight_set', 'cmd_cam_hires_set', 'cmd_cam_freeze')
+
+
+def command_name(method):
+    """
+    cmd_cam_zoom_direct -> zoom-direct, inquiry_AEMode -> ae-mode
+    """
+    for prefix in ('cmd_cam_', 'cmd_', 'inquiry_'):
+        if method.startswith(prefix):
+            method = method[len(prefix):]
+            break
+    method = re.sub(r'([a-z])([A-Z])', r'\1_\2', method)
+    method = re.sub(r'([A-Z]+)([A-Z][a-z])', r'\1_\2', method)
+    return method.lower().replace('_', '-')
+
+
+def build_registry():
+    """
+    returns ({command: method name}, {inquiry: method name})
+    """
+    commands = {}
+    inquiries = {}
+    for name in dir(ViscaControl):
+        if name.startswith('cmd_') and name not in ('cmd_cam', 'cmd_pt', 'cmd_inquiry', 'cmd_pt_inquiry'):
+            commands[command_name(name)] = name
+        elif name.startswith('inquiry_'):
+            inquiries[command_name(name)] = name
+    inquiries['zoom-position'] = 'inquiry_precise_zoom_position'
+    commands.update(ALIASES)
+    inquiries.update(INQUIRY_ALIASES)
+    return commands, inquiries
+
+
+def parse_argument(text):
+    lower = text.lower()
+    if lower in ('on', 'true', 'yes'):
+        return True
+    if lower in ('off', 'false', 'no'):
+        return False
+    try:
+        return int(text, 0)
+    except ValueError:
+        return text
+
+
+def format_value(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex() or '-'
+    if isinstance(value, dict):
+        return ', '.join('%s: %s' % (k, format_value(v)) for k, v in value.items())
+    return str(value)
+
+
+def format_timing(transactions):
+    if not transactions:
+        return '  (no bus traffic)'
+    wire = sum(t.wire_time for t in transactions)
+    camera = sum(t.camera_time for t in transactions)
+    total = sum(t.total for t in transactions)
+    return '  %d tx  wire %.1f ms  camera %.1f ms  total %.1f ms' % (
+        len(transactions), wire * 1000, camera * 1000, total * 1000)
+
+
+class Runner():
+
+    def __init__(self, visca, device=1, timing=True, out=None):
+        self.visca = visca
+        self.device = device
+        self.timing = timing
+        self.out = out if out is not None else sys.stdout
+        self.commands, self.inquiries = build_registry()
+
+    def _call(self, method_name, args):
+        method = getattr(self.visca, method_name)
+        params = list(inspect.signature(method).parameters)
+        args = [parse_argument(a) if isinstance(a, str) else a for a in args]
+
+        if method_name in ONOFF and len(args) == 1 and isinstance(args[0], bool):
+            args = [0x02 if args[0] else 0x03]
+        for i in BYTE_ARGUMENTS.get(method_name, ()):
+            if i < len(args) and isinstance(args[i], int):
+                args[i] = bytes([args[i]])
+        if params and params[0] == 'device':
+            args = [self.device] + args
+
+        with self.visca.timed() as transactions:
+            result = method(*args)
+        return result, transactions
+
+    def _report(self, result, transactions):
+        print(format_value(result), file=self.out)
+        if self.timing:
+            print(format_timing(transactions), file=self.out)
+
+    def run(self, name, args):
+        method_name = self.commands.get(name)
+        if method_name is None:
+            raise KeyError("unknown command '%s' (try 'list')" % name)
+        self._report(*self._call(method_name, args))
+
+    def get(self, name, args=()):
+        method_name = self.inquiries.get(name)
+        if method_name is None:
+            raise KeyError("unknown inquiry '%s' (try 'list')" % name)
+        self._report(*self._call(method_name, list(args)))
+
+    def watch(self, names, rate=2.0, count=None):
+        """
+        polls the inquiries `names` at `rate` Hz until Ctrl-C (or count)
+        """
+        for name in names:
+            if name not in self.inquiries:
+                raise KeyError("unknown inquiry '%s' (try 'list')" % name)
+        period = 1.0 / rate
+        deadline = time.monotonic()
+        start = deadline
+        n = 0
+        try:
+            while count is None or n < count:
+                columns = ['%8.3f' % (time.monotonic() - start)]
+                for name in names:
+                    result, transactions = self._call(self.inquiries[name], [])
+                    column = '%s=%s' % (name, format_value(result))
+                    if self.timing and transactions:
+                        column += ' (%.1f/%.1f ms)' % (
+                            sum(t.wire_time for t in transactions) * 1000,
+                            sum(t.camera_time for t in transactions) * 1000)
+                    columns.append(column)
+                print('  '.join(columns), file=self.out)
+                n += 1
+                deadline += period
+                time.sleep(max(0, deadline - time.monotonic()))
+        except KeyboardInterrupt:
+            pass
+
+    def listing(self):
+        lines = ['commands:']
+        lines += ['  %-28s %s' % (k, v) for k, v in sorted(self.commands.items())]
+        lines += ['inquiries (get <name>):']
+        lines += ['  %-28s %s' % (k, v) for k, v in sorted(self.inquiries.items())]
+        return '\n'.join(lines)
+
+
+class Shell(cmd.Cmd):
+
+    intro = "pyvisca shell, 'list' shows the commands, 'help' the shell itself"
+
+    def __init__(self, runner):
+        cmd.Cmd.__init__(self, stdout=runner.out)
+        self.runner = runner
+        self._update_prompt()
+
+    def _update_prompt(self):
+        self.prompt = 'visca[%d]> ' % self.runner.device
+
+    def _print(self, *args):
+        print(*args, file=self.runner.out)
+
+    def _guard(self, fn, line):
+        """
+        fn(words of line), errors are printed and the shell goes on
+        """
+        try:
+            fn(shlex.split(line))
+        except KeyError as e:
+            self._print('error: %s' % e.args[0])
+        except (TypeError, ValueError) as e:
+            # an unclosed quote is a ValueError of shlex too
+            self._print('error: %s' % e)
+
+    def emptyline(self):
+        pass
+
+    def default(self, line):
+        self._guard(self._run, line)
+
+    def _run(self, words):
+        self.runner.run(words[0], words[1:])
+
+    def completenames(self, text, *ignored):
+        names = list(self.runner.commands) + [n[3:] for n in self.get_names() if n.startswith('do_')]
+        return sorted(n for n in set(names) if n.startswith(text))
+
+    def do_get(self, line):
+        """get <inquiry> [args]: ask the camera"""
+        self._guard(self._get, line)
+
+    def _get(self, words):
+        if not words:
+            self._print('usage: get <inquiry>')
+            return
+        self.runner.get(words[0], words[1:])
+
+    def complete_get(self, text, line, begidx, endidx):
+        return sorted(n for n in self.runner.inquiries if n.startswith(text))
+
+    def do_watch(self, line):
+        """watch <inquiry> [<inquiry> ...] [rate=Hz]: poll until Ctrl-C"""
+        self._guard(self._watch, line)
+
+    def _watch(self, words):
+        rate = 2.0
+        names = []
+        for w in words:
+            if w.startswith('rate='):
+                rate = float(w[5:])
+            else:
+                names.append(w)
+        if not names:
+            self._print('usage: watch <inquiry> [...] [rate=Hz]')
+            return
+        self.runner.watch(names, rate)
+
+    complete_watch = complete_get
+
+    def do_device(self, line):
+        """device <n>: talk to camera n of the chain"""
+        try:
+            self.runner.device = int(line, 0)
+        except ValueError:
+            self._print('usage: device <n>')
+        self._update_prompt()
+
+    def do_timing(self, line):
+        """timing on|off: show wire/camera time of every transaction"""
+        self.runner.timing = parse_argument(line or 'on') is True
+
+    def do_list(self, line):
+        """list the command registry"""
+        self._print(self.runner.listing())
+
+    def do_quit(self, line):
+        """leave the shell"""
+        return True
+
+    do_exit = do_quit
+
+    def do_EOF(self, line):
+        self._print()
+        return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pyvisca', description='control VISCA cameras')
+    parser.add_argument('--port', '-p', default='/dev/ttyUSB0', help='serial port, udp://host or loop://')
+    parser.add_argument('--device', '-d', type=int, default=1, help='camera address on the chain')
+    parser.add_argument('--timeout', type=float, default=1, help='reply timeout in seconds')
+    parser.add_argument('--bus-map', default=None, help='bus map file (see registry.py)')
+    parser.add_argument('--no-timing', action='store_true', help='do not print transaction timing')
+    parser.add_argument('--rate', type=float, default=2.0, help='watch: polls per second')
+    parser.add_argument('--count', type=int, default=None, help='watch: stop after n polls')
+    parser.add_argument('command', help="command, 'get', 'watch', 'shell' or 'list'")
+    parser.add_argument('args', nargs='*')
+    args = parser.parse_args(argv)
+
+    visca = ViscaControl(portname=args.port, timeout=args.timeout)
+    runner = Runner(visca, args.device, timing=not args.no_timing)
+
+    if args.command == 'list':
+        print(runner.listing())
+        return 0
+
+    visca.start(bus_map=args.bus_map)
+
+    try:
+        if args.command == 'shell':
+            Shell(runner).cmdloop()
+        elif args.command == 'get':
+            if not args.args:
+                parser.error('get needs an inquiry name')
+            runner.get(args.args[0], args.args[1:])
+        elif args.command == 'watch':
+            if not args.args:
+                parser.error('watch needs at least one inquiry name')
+            runner.watch(args.args, args.rate, args.count)
+        else:
+            runner.run(args.command, args.args)
+    except KeyError as e:
+        print('error: %s' % e.args[0], file=sys.stderr)
+        return 2
+    except (TypeError, ValueError) as e:
+        print('error: %s' % e, file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
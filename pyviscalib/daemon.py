@@ -0,0 +1,483 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Control daemon: one process owns the camera port and serves the
+# cmd_*/inquiry_* API of ViscaControl to other local processes over a
+# unix domain socket.
+#
+# Wire format, every frame is prefixed by its length (2 bytes, big endian):
+#
+#   request:  id (4) | method name length (1) | name | argc (1) | args
+#   response: id (4) | status (1, 0 = ok, 1 = error) | value
+#
+# values are tagged: N None, T/F bool, i int (8), d float (8),
+# b bytes / s str (2 byte length + data), l list and m dict (1 byte count
+# + items).
+#
+# A connection can send many requests before reading the responses
+# (pipelining), they are answered in order. Inquiry results are shared
+# between all clients for cache_ttl seconds and identical inquiries in
+# flight at the same time go to the camera only once. Any command on a
+# device drops the cached inquiries of that device, and an inquiry that
+# was already on its way when the command came is not cached.
+#
+# The socket is only accessible by the user running the daemon (mode
+# 0600), by default in the per user runtime directory.
+#
+
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+
+LENGTH = struct.Struct('>H')
+REQUEST = struct.Struct('>IB')
+RESPONSE = struct.Struct('>IB')
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+def default_socket():
+    """
+    $XDG_RUNTIME_DIR/pyvisca.sock, /tmp/pyvisca-<uid>.sock without one
+    """
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, 'pyvisca.sock')
+    return '/tmp/pyvisca-%d.sock' % os.getuid()
+
+
+DEFAULT_SOCKET = default_socket()
+
+
+class RPCError(Exception):
+    pass
+
+
+# ----------------------- value encoding ----------------------------------
+
+def encode_value(value):
+    if value is None:
+        return b'N'
+    if value is True:
+        return b'T'
+    if value is False:
+        return b'F'
+    if isinstance(value, int):
+        return b'i' + struct.pack('>q', value)
+    if isinstance(value, float):
+        return b'd' + struct.pack('>d', value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value)
+        return b'b' + LENGTH.pack(len(value)) + value
+    if isinstance(value, str):
+        value = value.encode('utf8')
+        return b's' + LENGTH.pack(len(value)) + value
+    if isinstance(value, (list, tuple)):
+        return b'l' + bytes([len(value)]) + b''.join(encode_value(v) for v in value)
+    if isinstance(value, dict):
+        return b'm' + bytes([len(value)]) + b''.join(encode_value(k) + encode_value(v)
+                                                    for k, v in value.items())
+    raise RPCError("can not encode %r" % (value,))
+
+
+def decode_value(data, pos=0):
+    """
+    returns (value, position after it)
+    """
+    tag = data[pos:pos+1]
+    pos += 1
+    if tag == b'N':
+        return None, pos
+    if tag == b'T':
+        return True, pos
+    if tag == b'F':
+        return False, pos
+    if tag == b'i':
+        return struct.unpack_from('>q', data, pos)[0], pos + 8
+    if tag == b'd':
+        return struct.unpack_from('>d', data, pos)[0], pos + 8
+    if tag in (b'b', b's'):
+        length = LENGTH.unpack_from(data, pos)[0]
+        pos += LENGTH.size
+        value = bytes(data[pos:pos+length])
+        if tag == b's':
+            value = value.decode('utf8')
+        return value, pos + length
+    if tag == b'l':
+        count = data[pos]
+        pos += 1
+        items = []
+        for i in range(count):
+            item, pos = decode_value(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == b'm':
+        count = data[pos]
+        pos += 1
+        items = {}
+        for i in range(count):
+            key, pos = decode_value(data, pos)
+            items[key], pos = decode_value(data, pos)
+        return items, pos
+    raise RPCError("unknown value tag %r" % tag)
+
+
+def encode_request(request_id, name, args):
+    name = name.encode('ascii')
+    body = REQUEST.pack(request_id, len(name)) + name + bytes([len(args)]) + \
+        b''.join(encode_value(a) for a in args)
+    return LENGTH.pack(len(body)) + body
+
+
+def decode_request(body):
+    request_id, length = REQUEST.unpack_from(body)
+    pos = REQUEST.size
+    name = bytes(body[pos:pos+length]).decode('ascii')
+    pos += length
+    argc = body[pos]
+    pos += 1
+    args = []
+    for i in range(argc):
+        arg, pos = decode_value(body, pos)
+        args.append(arg)
+    return request_id, name, args
+
+
+def encode_response(request_id, status, value):
+    body = RESPONSE.pack(request_id, status) + encode_value(value)
+    return LENGTH.pack(len(body)) + body
+
+
+def decode_response(body):
+    request_id, status = RESPONSE.unpack_from(body)
+    value, pos = decode_value(body, RESPONSE.size)
+    return request_id, status, value
+
+
+def read_frame(sock, buffer):
+    """
+    reads one length prefixed frame, `buffer` keeps what was read ahead.
+    returns None when the peer closed the connection
+    """
+    while True:
+        if len(buffer) >= LENGTH.size:
+            length = LENGTH.unpack_from(buffer)[0]
+            if len(buffer) >= LENGTH.size + length:
+                body = bytes(buffer[LENGTH.size:LENGTH.size+length])
+                del buffer[:LENGTH.size+length]
+                return body
+        data = sock.recv(4096)
+        if not data:
+            return None
+        buffer += data
+
+
+# bus level calls clients may not make: they renumber or reset the whole
+# chain and end the process (sys.exit) when it does not answer as expected
+NOT_SERVED = ('cmd_adress_set', 'cmd_if_clear_all')
+
+
+def allowed(name):
+    if name in NOT_SERVED:
+        return False
+    return (name.startswith('cmd_') or name.startswith('inquiry_')
+            or name in ('get_zoom_position', 'keep_trying_to_get_zoom_position'))
+
+
+def _no_exit(name, method):
+    """
+    method, with the sys.exit() of ViscaControl (every write does it
+    when the port is not open) turned into an RPCError, so it ends
+    neither the daemon nor the connection
+    """
+    def call(*args):
+        try:
+            return method(*args)
+        except SystemExit:
+            raise RPCError("%s: the camera port is not open" % name)
+    return call
+
+
+# ----------------------- server ------------------------------------------
+
+class ViscaDaemon():
+
+    def __init__(self, visca, path=DEFAULT_SOCKET, cache_ttl=0.1, mode=0o600):
+        """
+        visca     = a started ViscaControl
+        cache_ttl = seconds an inquiry result is shared between clients,
+                    0 disables the cache
+        mode      = permissions of the socket file
+        """
+        self.visca = visca
+        self.path = path
+        self.cache_ttl = cache_ttl
+        self.mode = mode
+        self.sock = None
+        self._cache = {}
+        self._inflight = {}
+        # device -> commands sent to it, an inquiry started before a
+        # command must not be cached after it. None counts broadcasts.
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._exit = False
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # nobody else may connect, not even between bind and chmod
+        umask = os.umask(0o177)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, self.mode)
+        self.sock.listen(16)
+        self.sock.settimeout(0.2)
+        self._exit = False
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._exit = True
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _accept_loop(self):
+        while not self._exit:
+            try:
+                conn, address = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.settimeout(None)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        buffer = bytearray()
+        try:
+            while not self._exit:
+                body = read_frame(conn, buffer)
+                if body is None:
+                    break
+                try:
+                    request_id, name, args = decode_request(body)
+                except (RPCError, struct.error, IndexError, UnicodeDecodeError) as e:
+                    conn.sendall(encode_response(0, STATUS_ERROR, 'bad request: %s' % e))
+                    continue
+                try:
+                    value = self.call(name, args)
+                    response = encode_response(request_id, STATUS_OK, value)
+                except Exception as e:
+                    response = encode_response(request_id, STATUS_ERROR, '%s: %s' % (type(e).__name__, e))
+                conn.sendall(response)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def _generation(self, device):
+        # the caller holds self._lock
+        return self._generations.get(None, 0), self._generations.get(device, 0)
+
+    def call(self, name, args):
+        if not allowed(name):
+            raise RPCError("method '%s' not allowed" % name)
+        method = _no_exit(name, getattr(self.visca, name))
+
+        if name.startswith('cmd_'):
+            # device settings changed, forget what we know about it
+            device = args[0] if args else None
+            with self._lock:
+                if name.endswith('_all') or device == self.visca.BROADCAST:
+                    device = None
+                    self._cache.clear()
+                    self._inflight.clear()
+                self._generations[device] = self._generations.get(device, 0) + 1
+                for key in [k for k in self._cache if k[1][:1] == (device,)]:
+                    del self._cache[key]
+                # inquiries asked from now on do not join those in flight
+                for key in [k for k in self._inflight if k[1][:1] == (device,)]:
+                    del self._inflight[key]
+            return method(*args)
+
+        if not self.cache_ttl:
+            return method(*args)
+
+        key = (name, tuple(args))
+        device = args[0] if args else None
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached[0] < self.cache_ttl:
+                self.hits += 1
+                return cached[1]
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                inflight = self._inflight[key] = [threading.Event(), None, None]
+                generation = self._generation(device)
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            # somebody else is asking the camera the same thing right now
+            inflight[0].wait()
+            self.hits += 1
+            if inflight[2] is not None:
+                raise inflight[2]
+            return inflight[1]
+
+        self.misses += 1
+        try:
+            inflight[1] = method(*args)
+            with self._lock:
+                if self._generation(device) == generation:
+                    self._cache[key] = (time.monotonic(), inflight[1])
+            return inflight[1]
+        except Exception as e:
+            inflight[2] = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is inflight:
+                    del self._inflight[key]
+            inflight[0].set()
+
+
+# ----------------------- client ------------------------------------------
+
+class ViscaClient():
+    """
+    mirrors the cmd_*/inquiry_* API of ViscaControl:
+
+        c = ViscaClient()
+        c.cmd_cam_zoom_direct(1, 12)
+        c.inquiry_combined_zoom_pos(1)
+
+    submit()/result() pipeline requests on the same connection.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self._buffer = bytearray()
+        self._next_id = 1
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, name, *args):
+        """
+        sends a request without waiting, returns its id for result()
+        """
+        with self._lock:
+            request_id = self._next_id
+            self._next_id = (self._next_id + 1) & 0xffffffff
+            self.sock.sendall(encode_request(request_id, name, args))
+        return request_id
+
+    def result(self, request_id):
+        with self._lock:
+            while request_id not in self._results:
+                body = read_frame(self.sock, self._buffer)
+                if body is None:
+                    raise RPCError("connection closed by the daemon")
+                rid, status, value = decode_response(body)
+                self._results[rid] = (status, value)
+            status, value = self._results.pop(request_id)
+        if status != STATUS_OK:
+            raise RPCError(value)
+        return value
+
+    def call(self, name, *args):
+        return self.result(self.submit(name, *args))
+
+    def call_many(self, calls):
+        """
+        calls = [(name, args), ...], all sent before reading any reply
+        """
+        ids = [self.submit(name, *args) for name, args in calls]
+        return [self.result(i) for i in ids]
+
+    def __getattr__(self, name):
+        if not allowed(name):
+            raise AttributeError(name)
+
+        def method(*args):
+            return self.call(name, *args)
+        method.__name__ = name
+        return method
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='share a VISCA camera over a unix socket')
+    parser.add_argument('--port', default='/dev/ttyUSB0', help='serial port, udp://host or loop://')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='unix socket path')
+    parser.add_argument('--cache-ttl', type=float, default=0.1, help='seconds inquiry results are shared')
+    parser.add_argument('--bus-map', default=None, help='bus map file (see registry.py)')
+    args = parser.parse_args(argv)
+
+    from .visca import ViscaControl
+    visca = ViscaControl(portname=args.port)
+    visca.start(bus_map=args.bus_map)
+    print("serving %s on %s" % (args.port, args.socket))
+    ViscaDaemon(visca, args.socket, args.cache_ttl).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
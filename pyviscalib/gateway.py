@@ -0,0 +1,365 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# VISCA over IP gateway: many UDP clients share the serial link owned
+# by one ViscaControl.
+#
+# Requests of all clients are queued per client and served round robin
+# so a chatty client can not starve the others. Replies are routed back
+# by (device, socket): an ACK binds the camera socket to the client and
+# sequence number that issued the command, the later COMPLETION (or
+# error) for that socket is sent back to the same client/sequence.
+#
+
+import socket
+import threading
+import time
+from collections import deque
+
+from . import viscaip
+from .packet import NETWORK_CHANGE
+from .protocol import TIMEOUT
+
+
+class TokenBucket():
+    """
+    rate = requests per second, burst = bucket size
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst else max(1, rate))
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class GatewayClient():
+
+    def __init__(self, address):
+        self.address = address
+        self.queue = deque()
+        self.limiter = None
+        self.last_seen = time.monotonic()
+        # last sequence answered and the replies sent for it, so a
+        # retransmitted datagram gets the same answer instead of being
+        # executed twice.
+        self.last_seq = None
+        self.last_replies = []
+        self.requests = 0
+        self.rejected = 0
+        self.replies = 0
+
+
+class ViscaGateway():
+
+    DEBUG = False
+
+    def __init__(self, visca, host='0.0.0.0', port=viscaip.VISCA_IP_PORT,
+                 rate=None, burst=None, max_queue=16,
+                 completion_timeout=30, client_timeout=60):
+        """
+        visca              = a started ViscaControl
+        rate, burst        = default per client rate limit (requests/s),
+                             None disables limiting
+        max_queue          = requests a client may have waiting
+        completion_timeout = seconds a camera socket stays bound to a
+                             client waiting for its COMPLETION
+        client_timeout     = idle seconds before a client is forgotten
+        """
+        self.visca = visca
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.completion_timeout = completion_timeout
+        self.client_timeout = client_timeout
+
+        self.sock = None
+        self.clients = {}
+        self.rate_limits = {}
+        self._order = deque()
+        self._cond = threading.Condition()
+        self._exit = False
+        self._threads = []
+        self._expired = 0
+        # owners of the camera sockets waiting for a COMPLETION, copied
+        # from visca.protocol while the scheduler held visca.mutex: the
+        # other threads must not walk the protocol's sockets themselves
+        self._pending = []
+
+    # ----------------------- lifecycle -----------------------------------
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.settimeout(0.2)
+        # port=0 picks a free port, tell the caller which one
+        self.port = self.sock.getsockname()[1]
+
+        self._exit = False
+        self._threads = [threading.Thread(target=self._receive_loop, daemon=True),
+                         threading.Thread(target=self._schedule_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._exit = True
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def set_rate_limit(self, address, rate, burst=None):
+        """
+        per client override of the default rate limit,
+        address = (ip, port) of the client, rate=None disables limiting
+        """
+        self.rate_limits[address] = (rate, burst)
+        with self._cond:
+            client = self.clients.get(address)
+            if client:
+                client.limiter = TokenBucket(rate, burst) if rate else None
+
+    def stats(self):
+        with self._cond:
+            return dict((c.address, {'requests': c.requests,
+                                     'rejected': c.rejected,
+                                     'replies': c.replies,
+                                     'queued': len(c.queue)})
+                        for c in self.clients.values())
+
+    # ----------------------- network side --------------------------------
+
+    def _send(self, client, payload_type, seq, payload):
+        try:
+            self.sock.sendto(viscaip.pack(payload_type, seq, payload), client.address)
+        except OSError as e:
+            print("gateway: could not reply to %s: %s" % (client.address, e))
+
+    def _reply(self, client, seq, packet):
+        client.replies += 1
+        if client.last_seq == seq:
+            client.last_replies.append(packet)
+        self._send(client, viscaip.PAYLOAD_REPLY, seq, packet)
+
+    def _client(self, address):
+        client = self.clients.get(address)
+        if client is None:
+            client = GatewayClient(address)
+            rate, burst = self.rate_limits.get(address, (self.rate, self.burst))
+            if rate:
+                client.limiter = TokenBucket(rate, burst)
+            self.clients[address] = client
+            self._order.append(client)
+        client.last_seen = time.monotonic()
+        return client
+
+    def _reject(self, client, seq, packet):
+        # answer like a camera would: "command buffer full"
+        client.rejected += 1
+        sender = (packet[0] & 0b111) << 4
+        self._send(client, viscaip.PAYLOAD_REPLY, seq, bytes([0x80 | sender, 0x60, 0x03, 0xff]))
+
+    def _receive_loop(self):
+        while not self._exit:
+            if time.monotonic() - self._expired > 1:
+                self._expire()
+            try:
+                datagram, address = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            frame = viscaip.unpack(datagram)
+            with self._cond:
+                client = self._client(address)
+                if frame is None:
+                    self._send(client, viscaip.PAYLOAD_CONTROL_REPLY, 0, viscaip.CONTROL_ERROR_MESSAGE)
+                    continue
+                payload_type, seq, payload = frame
+
+                if payload_type == viscaip.PAYLOAD_CONTROL:
+                    if payload == viscaip.CONTROL_RESET:
+                        client.last_seq = None
+                        client.last_replies = []
+                        self._send(client, viscaip.PAYLOAD_CONTROL_REPLY, seq, viscaip.CONTROL_RESET)
+                    else:
+                        self._send(client, viscaip.PAYLOAD_CONTROL_REPLY, seq, viscaip.CONTROL_ERROR_MESSAGE)
+                    continue
+
+                if payload_type not in (viscaip.PAYLOAD_COMMAND, viscaip.PAYLOAD_INQUIRY):
+                    self._send(client, viscaip.PAYLOAD_CONTROL_REPLY, seq, viscaip.CONTROL_ERROR_MESSAGE)
+                    continue
+
+                if (len(payload) < 3 or len(payload) > 16 or payload[-1] != 0xff
+                        or not payload[0] & 0x80):
+                    self._send(client, viscaip.PAYLOAD_CONTROL_REPLY, seq, viscaip.CONTROL_ERROR_MESSAGE)
+                    continue
+
+                if seq == client.last_seq:
+                    # retransmission of something already executed
+                    for packet in client.last_replies:
+                        self._send(client, viscaip.PAYLOAD_REPLY, seq, packet)
+                    continue
+                if any(s == seq for s, p, q in client.queue):
+                    continue
+
+                if len(client.queue) >= self.max_queue or (client.limiter and not client.limiter.take()):
+                    self._reject(client, seq, payload)
+                    continue
+
+                client.requests += 1
+                client.queue.append((seq, payload_type, payload))
+                self._cond.notify()
+
+    def _expire(self):
+        now = time.monotonic()
+        self._expired = now
+        with self._cond:
+            # camera sockets bound to clients are in visca.protocol.sockets,
+            # the scheduler thread expires those
+            busy = set(id(owner[0]) for owner in self._pending if self._owned(owner))
+            for address, client in list(self.clients.items()):
+                if (now - client.last_seen > self.client_timeout and not client.queue
+                        and id(client) not in busy):
+                    del self.clients[address]
+                    self._order.remove(client)
+
+    # ----------------------- serial side ---------------------------------
+
+    def _next_request(self):
+        """
+        round robin over the clients with something queued
+        """
+        with self._cond:
+            while not self._exit:
+                for i in range(len(self._order)):
+                    client = self._order[0]
+                    self._order.rotate(-1)
+                    if client.queue:
+                        seq, payload_type, packet = client.queue.popleft()
+                        client.last_seq = seq
+                        client.last_replies = []
+                        return client, seq, payload_type, packet
+                if self._pending:
+                    # completions are still due, go and poll the port
+                    self._cond.wait(0.005)
+                    return None
+                self._cond.wait(0.2)
+        return None
+
+    @staticmethod
+    def _owned(owner):
+        # the protocol is shared with whoever else uses the port
+        return isinstance(owner, tuple) and isinstance(owner[0], GatewayClient)
+
+    def _route(self, event):
+        """
+        hands a packet read from the camera to whoever is waiting for it,
+        the protocol tells who that is: the owner of a request is
+        (client, seq)
+        """
+        if event.type == TIMEOUT:
+            return
+
+        with self._cond:
+            if event.type == NETWORK_CHANGE:
+                # network change, everybody should know
+                for client in self.clients.values():
+                    self._send(client, viscaip.PAYLOAD_REPLY, 0, event.raw)
+                return
+            if self._owned(event.owner):
+                self._reply(event.owner[0], event.owner[1], event.raw)
+                return
+
+        self.visca.dump(event.raw, "gateway: unrouted")
+
+    def _poll(self):
+        while self.visca.transport.in_waiting():
+            self._route(self.visca.recv_event("gateway"))
+
+    def _snapshot(self):
+        # the caller holds visca.mutex
+        owners = self.visca.protocol.owners()
+        with self._cond:
+            self._pending = owners
+
+    def _execute(self, client, seq, payload_type, packet):
+        self.visca.mutex.acquire()
+        try:
+            self._poll()
+            recipient = packet[0] & 0b111 if packet[0] != 0x88 else -1
+            inquiry = payload_type == viscaip.PAYLOAD_INQUIRY
+            self.visca.protocol.start(recipient, inquiry, (client, seq))
+            sent = time.monotonic()
+            self.visca.write_raw(packet, "sent: gateway")
+            rx_bytes = 0
+            while True:
+                # a timeout ends the request too, the client retransmits
+                event = self.visca.recv_event("gateway")
+                rx_bytes += len(event.raw)
+                self._route(event)
+                if event.final:
+                    break
+            received = time.monotonic()
+            self._snapshot()
+        finally:
+            self.visca.mutex.release()
+        self.visca.finish_request(recipient, inquiry, sent, received, len(packet), rx_bytes, event.raw)
+
+    def _poll_pending(self):
+        self.visca.mutex.acquire()
+        try:
+            self.visca.protocol.expire(self.completion_timeout)
+            self._poll()
+            self._snapshot()
+        finally:
+            self.visca.mutex.release()
+
+    def _schedule_loop(self):
+        while not self._exit:
+            request = self._next_request()
+            if request is None:
+                if self._pending:
+                    self._poll_pending()
+                continue
+            self._execute(*request)
@@ -0,0 +1,302 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# The same call on cameras of several ports at once, e.g. a stereo rig:
+#
+#   rig = ViscaGroup([(left, 1), (right, 1)])   # ViscaControl, device
+#   result = rig.call('cmd_cam_zoom_direct', 12)
+#   result.send_skew, result.completion_skew   # seconds
+#
+# The packets are encoded first (ViscaControl.capturing()). Then one
+# writer thread per port takes the bus lock of its port and waits at a
+# barrier; when every port is ready they all write at once, so calling
+# the cameras one after the other does not add a round trip per camera.
+# Each thread then reads the ACKs and COMPLETIONs of its port, routed to
+# the steps by the protocol.
+#
+# If a port can not be locked within lock_timeout (or, inside a
+# bandwidth.consumer() block, the budget does not admit its packets in
+# that time) the barrier is broken and nothing is sent anywhere. The
+# requests are charged to the consumer of the caller and reported like
+# those of send_packet (ViscaControl.finish_request). An exception in a
+# writer thread breaks the barrier too and ends up in the error of the
+# steps of its port.
+#
+# Devices on the same port (daisy chain) share its writer thread, their
+# packets follow each other as fast as the port takes them.
+#
+
+import threading
+import time
+
+from .packet import ACK, COMPLETION, REPLY, ERROR
+from .protocol import TIMEOUT
+
+
+class GroupError(Exception):
+    pass
+
+
+class GroupStep():
+
+    __slots__ = ('visca', 'device', 'packet', 'inquiry', 'sent', 'acked',
+                 'completed', 'reply', 'error')
+
+    def __init__(self, visca, device, packet, inquiry):
+        self.visca = visca
+        self.device = device
+        self.packet = packet
+        self.inquiry = inquiry
+        # monotonic times
+        self.sent = None
+        self.acked = None
+        self.completed = None
+        self.reply = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self.completed is not None or self.error is not None
+
+    def __repr__(self):
+        return 'GroupStep(%s, %d, error=%s)' % (self.visca.portname, self.device, self.error)
+
+
+def _skew(times):
+    if not times or None in times:
+        return None
+    return max(times) - min(times)
+
+
+class GroupResult():
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    @property
+    def ok(self):
+        return all(s.error is None and s.completed is not None for s in self.steps)
+
+    @property
+    def replies(self):
+        return [s.reply for s in self.steps]
+
+    @property
+    def send_skew(self):
+        """
+        seconds between the first and the last packet written, None if
+        some were not sent
+        """
+        return _skew([s.sent for s in self.steps])
+
+    @property
+    def completion_skew(self):
+        """
+        seconds between the first and the last COMPLETION (inquiry
+        reply), None if some did not come
+        """
+        return _skew([s.completed for s in self.steps])
+
+    def __repr__(self):
+        def ms(value):
+            return '%.3fms' % (value * 1000) if value is not None else None
+        return 'GroupResult(ok=%s, send skew=%s, completion skew=%s)' % (
+            self.ok, ms(self.send_skew), ms(self.completion_skew))
+
+
+class PreparedCall():
+
+    def __init__(self, group, steps):
+        self.group = group
+        self.steps = steps
+        # port -> its steps, in member order
+        self.ports = []
+        for step in steps:
+            for visca, port_steps in self.ports:
+                if visca is step.visca:
+                    port_steps.append(step)
+                    break
+            else:
+                self.ports.append((step.visca, [step]))
+
+    def fire(self):
+        """
+        sends the prepared packets on all ports at once, returns a
+        GroupResult. Can be fired again.
+        """
+        steps = [GroupStep(s.visca, s.device, s.packet, s.inquiry) for s in self.steps]
+        by_port = []
+        for visca, port_steps in self.ports:
+            by_port.append((visca, [steps[self.steps.index(s)] for s in port_steps]))
+
+        barrier = threading.Barrier(len(by_port))
+        # the budget of the caller's thread applies to the writer threads
+        threads = [threading.Thread(target=self.group._port,
+                                    args=(visca, port_steps, barrier, visca.bandwidth.current))
+                   for visca, port_steps in by_port]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return GroupResult(steps)
+
+
+class ViscaGroup():
+
+    def __init__(self, members, lock_timeout=1.0, completion_timeout=None):
+        """
+        members      = [(ViscaControl, device), ...]
+        lock_timeout = seconds a port may take to become free
+        completion_timeout = seconds to wait for the COMPLETIONs after
+                       the ACKs (default: the port timeout)
+        """
+        self.members = list(members)
+        if not self.members:
+            raise GroupError("empty group")
+        self.lock_timeout = lock_timeout
+        self.completion_timeout = completion_timeout
+
+    def prepare(self, name, *args):
+        """
+        encodes visca.<name>(device, *args) for every member
+        """
+        return self.prepare_each(name, [args] * len(self.members))
+
+    def prepare_each(self, name, args):
+        """
+        encodes visca.<name>(device, *args[i]) for member i
+        """
+        if len(args) != len(self.members):
+            raise GroupError("one argument tuple per member")
+        steps = []
+        for (visca, device), member_args in zip(self.members, args):
+            method = getattr(visca, name, None)
+            if method is None or not (name.startswith('cmd_') or name.startswith('inquiry_')):
+                raise GroupError("unknown command '%s'" % name)
+            try:
+                with visca.capturing() as packets:
+                    method(device, *member_args)
+            except (TypeError, ValueError) as e:
+                raise GroupError("'%s%r': %s" % (name, tuple(member_args), e))
+            if len(packets) != 1 or packets[0][0] == -1:
+                raise GroupError("'%s%r' does not send exactly one packet to %s/%d" % (
+                    name, tuple(member_args), visca.portname, device))
+            recipient, packet, inquiry = packets[0]
+            if packet is None:
+                raise GroupError("'%s%r' is not supported by %s/%d" % (
+                    name, tuple(member_args), visca.portname, device))
+            steps.append(GroupStep(visca, recipient, packet, inquiry))
+        return PreparedCall(self, steps)
+
+    def call(self, name, *args):
+        return self.prepare(name, *args).fire()
+
+    def call_each(self, name, args):
+        return self.prepare_each(name, args).fire()
+
+    def _update(self, event):
+        step = event.owner
+        if not isinstance(step, GroupStep):
+            return
+        now = time.monotonic()
+        if event.type == ACK:
+            step.acked = now
+        elif event.type in (COMPLETION, REPLY):
+            step.completed = now
+            step.reply = event.raw
+        elif event.type == ERROR:
+            step.reply = event.raw
+            step.error = event.packet.error_code
+        elif event.type == TIMEOUT:
+            step.error = 'timeout'
+
+    def _port(self, visca, steps, barrier, consumer=None):
+        """
+        writer thread of one port, consumer = bandwidth consumer the
+        traffic is charged to
+        """
+        try:
+            with visca.bandwidth.consumer(consumer):
+                self._write(visca, steps, barrier, consumer)
+        except Exception as e:
+            # the other ports must not wait for this one
+            barrier.abort()
+            for step in steps:
+                if not step.done:
+                    step.error = e
+
+    def _write(self, visca, steps, barrier, consumer):
+        if consumer is not None:
+            nbytes = sum(len(s.packet) + (7 if s.inquiry else 6) for s in steps)
+            if not visca.bandwidth.wait(consumer, nbytes, self.lock_timeout):
+                barrier.abort()
+                for step in steps:
+                    step.error = 'budget'
+                return
+        if not visca.mutex.acquire(timeout=self.lock_timeout):
+            barrier.abort()
+            for step in steps:
+                step.error = 'busy'
+            return
+        try:
+            while visca.transport.in_waiting():
+                visca.recv_packet("ignored")
+            try:
+                barrier.wait(self.lock_timeout)
+            except threading.BrokenBarrierError:
+                for step in steps:
+                    step.error = 'aborted'
+                return
+
+            protocol = visca.protocol
+            for step in steps:
+                protocol.start(step.device, step.inquiry, step)
+                step.sent = time.monotonic()
+                visca.write_raw(step.packet, "sent: group")
+                rx_bytes = 0
+                while True:
+                    event = visca.recv_event("group")
+                    rx_bytes += len(event.raw)
+                    self._update(event)
+                    if event.final:
+                        break
+                visca.finish_request(step.device, step.inquiry, step.sent, time.monotonic(),
+                                     len(step.packet), rx_bytes, event.raw)
+
+            timeout = self.completion_timeout
+            if timeout is None:
+                timeout = visca.timeout
+            deadline = time.monotonic() + timeout
+            while not all(s.done for s in steps) and time.monotonic() < deadline:
+                if visca.transport.in_waiting():
+                    self._update(visca.recv_event("group"))
+                else:
+                    time.sleep(0.0005)
+            for step in steps:
+                if not step.done:
+                    step.error = 'timeout'
+        finally:
+            visca.mutex.release()
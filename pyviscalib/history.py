@@ -0,0 +1,175 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# History of the zoom position of one device, to tag video frames with
+# the zoom at the time they were taken:
+#
+#   history = visca.zoom_history(1)
+#   ... something polls visca.inquiry_precise_zoom_position(1) ...
+#   value, error = history.zoom_at(frame_time)
+#
+# Every zoom reply is stored with the time the inquiry was sent and the
+# time the reply was read (monotonic clock). The camera sampled the lens
+# somewhere in between, so a sample is placed in the middle and is known
+# to +- half the round trip. zoom_at() interpolates linearly between the
+# two samples around t; the error is how far the zoom moves (slope of the
+# segment) during that time uncertainty, in raw zoom units. A lone
+# sample has no slope: its error is max_speed times its age, or None if
+# the top speed of the lens is not known. After the newest sample the
+# error grows at max_speed at least, a resting lens may start moving.
+#
+# The samples live in fixed size arrays used as a ring buffer, nothing is
+# allocated per sample.
+#
+
+import threading
+from array import array
+
+
+class ZoomHistory():
+
+    def __init__(self, size=4096, max_speed=None):
+        """
+        max_speed = fastest zoom travel in raw units per second, bounds
+                    the error while there is only one sample
+        """
+        self.size = size
+        self.max_speed = max_speed
+        self._sent = array('d', bytes(8 * size))
+        self._received = array('d', bytes(8 * size))
+        self._value = array('q', bytes(8 * size))
+        # next slot to write and number of valid samples
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+    def record(self, sent, received, value):
+        """
+        stores a zoom value read by an inquiry sent at `sent` and answered
+        at `received`. Samples must come in time order (one poller).
+        """
+        with self._lock:
+            head = self._head
+            self._sent[head] = sent
+            self._received[head] = received
+            self._value[head] = value
+            self._head = (head + 1) % self.size
+            if self._count < self.size:
+                self._count += 1
+
+    def _slot(self, i):
+        # i-th oldest sample -> array index
+        return (self._head - self._count + i) % self.size
+
+    def _stamp(self, slot):
+        return (self._sent[slot] + self._received[slot]) / 2
+
+    def samples(self):
+        """
+        [(sent, received, value), ...] oldest first
+        """
+        with self._lock:
+            slots = [self._slot(i) for i in range(self._count)]
+            return [(self._sent[s], self._received[s], self._value[s]) for s in slots]
+
+    def latest(self):
+        """
+        (sent, received, value) of the newest sample, None if empty
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            s = (self._head - 1) % self.size
+            return self._sent[s], self._received[s], self._value[s]
+
+    def _find(self, t):
+        """
+        number of samples with a stamp <= t (binary search)
+        """
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._stamp(self._slot(middle)) <= t:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def zoom_at(self, t):
+        """
+        (zoom, error) at monotonic time t, zoom interpolated between the
+        samples around t (a float, in raw zoom units), error the estimated
+        uncertainty in the same units. None before the first sample.
+        After the newest sample the newest value is returned with the
+        error growing with the age of that sample, at max_speed at least
+        when it is known. The error is None when there is only one sample
+        and no max_speed.
+        """
+        with self._lock:
+            count = self._count
+            if not count:
+                return None
+            n = self._find(t)
+            if n == 0:
+                return None
+
+            a = self._slot(n - 1)
+            ta = self._stamp(a)
+            va = self._value[a]
+            half_a = (self._received[a] - self._sent[a]) / 2
+
+            if n == count:
+                # t is after the newest sample
+                if count == 1:
+                    if self.max_speed is None:
+                        return float(va), None
+                    return float(va), self.max_speed * (t - ta + half_a)
+                p = self._slot(n - 2)
+                tp = self._stamp(p)
+                slope = abs(va - self._value[p]) / (ta - tp) if ta > tp else 0.0
+                if self.max_speed is not None:
+                    # the lens may have started moving after the newest
+                    # sample
+                    slope = max(slope, self.max_speed)
+                return float(va), slope * (t - ta + half_a)
+
+            b = self._slot(n)
+            tb = self._stamp(b)
+            vb = self._value[b]
+            half_b = (self._received[b] - self._sent[b]) / 2
+            if tb <= ta:
+                return float(vb), 0.0
+            slope = (vb - va) / (tb - ta)
+            value = va + slope * (t - ta)
+            return value, abs(slope) * max(half_a, half_b)
@@ -0,0 +1,316 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Compiled macros: fixed sequences of cmd_cam_* calls with delays,
+# e.g. a show control cue
+#
+#   m = Macro(visca, device=1)
+#   m.add('cmd_cam_freeze_on')
+#   m.add('cmd_cam_zoom_direct', 12, delay=0.1)
+#   m.add('cmd_cam_picture_effect_bw', delay=0.5)
+#   m.add('cmd_cam_freeze_off', delay=0.2)
+#   cue = m.compile()          # validate + encode once
+#   result = cue.run()         # replay, as often as needed
+#
+# compile() encodes every step with ViscaControl.capturing(), so the
+# bytes are exactly what the cmd_cam_* call would send. run() takes the
+# bus lock once, writes each packet at its time on the monotonic clock
+# (sleep, then spin for the last SPIN seconds) and waits for the ACK.
+# While waiting for the next step the port is read and the protocol
+# routes the COMPLETION of every step back to it by socket. A step the
+# camera refuses with buffer full (all sockets busy) is sent again as
+# soon as a step in flight completes, like sessions do. The result
+# reports how late each step was sent (jitter).
+#
+
+import math
+import time
+
+from .packet import ACK, COMPLETION, REPLY, ERROR
+from .protocol import TIMEOUT
+
+BUFFER_FULL = 0x03
+
+
+class MacroError(Exception):
+    pass
+
+
+class MacroStep():
+
+    __slots__ = ('name', 'args', 'delay', 'offset', 'packet',
+                 'sent', 'acked', 'completed', 'error')
+
+    def __init__(self, name, args, delay):
+        self.name = name
+        self.args = args
+        self.delay = delay
+        # seconds from the start of the macro
+        self.offset = 0.0
+        self.packet = None
+        self.sent = None
+        self.acked = None
+        self.completed = None
+        self.error = None
+
+
+class MacroResult():
+
+    def __init__(self, start, steps):
+        self.start = start
+        # (name, scheduled offset, sent offset, ack offset, completion
+        #  offset, error code), offsets in seconds from start
+        self.steps = []
+        for step in steps:
+            self.steps.append((step.name, step.offset,
+                               None if step.sent is None else step.sent - start,
+                               None if step.acked is None else step.acked - start,
+                               None if step.completed is None else step.completed - start,
+                               step.error))
+
+    @property
+    def ok(self):
+        return all(s[5] is None and s[4] is not None for s in self.steps)
+
+    def jitter(self):
+        """
+        send time - scheduled time of every step, in seconds
+        """
+        return [s[2] - s[1] for s in self.steps if s[2] is not None]
+
+    def jitter_stats(self):
+        """
+        (mean, standard deviation, worst) of the jitter in seconds
+        """
+        values = self.jitter()
+        if not values:
+            return None
+        mean = sum(values) / len(values)
+        stdev = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+        return mean, stdev, max(values, key=abs)
+
+    def __repr__(self):
+        stats = self.jitter_stats()
+        if stats is None:
+            return 'MacroResult(no steps sent)'
+        return 'MacroResult(ok=%s, jitter mean=%.3fms sd=%.3fms worst=%.3fms)' % (
+            self.ok, stats[0] * 1000, stats[1] * 1000, stats[2] * 1000)
+
+
+class Macro():
+
+    def __init__(self, visca, device=1):
+        self.visca = visca
+        self.device = device
+        self.steps = []
+        # wait() time not yet given to a step
+        self._wait = 0.0
+
+    def add(self, name, *args, **kwargs):
+        """
+        appends visca.<name>(device, *args), sent `delay` seconds after
+        the previous step
+        """
+        delay = kwargs.pop('delay', 0.0)
+        if kwargs:
+            raise TypeError('unexpected arguments %s' % ', '.join(kwargs))
+        self.steps.append(MacroStep(name, args, delay + self._wait))
+        self._wait = 0.0
+        return self
+
+    def wait(self, seconds):
+        """
+        adds a pause before the next step
+        """
+        if seconds < 0:
+            raise MacroError('negative wait')
+        self._wait += seconds
+        return self
+
+    def compile(self):
+        """
+        checks every step and encodes it, returns a CompiledMacro
+        """
+        offset = 0.0
+        compiled = []
+        for step in self.steps:
+            if not step.name.startswith('cmd_cam_') and not step.name.startswith('cmd_pt_'):
+                raise MacroError("'%s' is not a camera command" % step.name)
+            if step.name.endswith('_all'):
+                raise MacroError("'%s' is a broadcast, macros address one device" % step.name)
+            method = getattr(self.visca, step.name, None)
+            if method is None:
+                raise MacroError("unknown command '%s'" % step.name)
+            if step.delay < 0:
+                raise MacroError("negative delay for '%s'" % step.name)
+
+            try:
+                with self.visca.capturing() as packets:
+                    method(self.device, *step.args)
+            except (TypeError, ValueError) as e:
+                raise MacroError("'%s%r': %s" % (step.name, step.args, e))
+            if len(packets) != 1:
+                raise MacroError("'%s%r' does not send exactly one packet" % (step.name, step.args))
+            recipient, packet, inquiry = packets[0]
+            if packet is None:
+                raise MacroError("'%s%r' is not supported by device %d" % (step.name, step.args, recipient))
+            if recipient == -1:
+                raise MacroError("'%s' is a broadcast, macros address one device" % step.name)
+
+            offset += step.delay
+            copy = MacroStep(step.name, step.args, step.delay)
+            copy.offset = offset
+            copy.packet = packet
+            compiled.append(copy)
+        return CompiledMacro(self.visca, compiled)
+
+
+class CompiledMacro():
+
+    # the last part of every wait is busy-waiting, sleep() is not precise
+    SPIN = 0.002
+
+    def __init__(self, visca, steps):
+        self.visca = visca
+        self.steps = steps
+
+    @property
+    def duration(self):
+        return self.steps[-1].offset if self.steps else 0.0
+
+    def _wait_until(self, target):
+        """
+        sleeps until target, reading replies meanwhile
+        """
+        transport = self.visca.transport
+        while True:
+            now = time.monotonic()
+            if now >= target:
+                return
+            if transport.in_waiting():
+                self._update(self.visca.recv_event("macro"))
+                continue
+            left = target - now
+            if left > self.SPIN:
+                time.sleep(min(left - self.SPIN, 0.001))
+
+    def _update(self, event):
+        """
+        the protocol routes replies by socket, the owner of a request is
+        its MacroStep
+        """
+        step = event.owner
+        if not isinstance(step, MacroStep):
+            return
+        now = time.monotonic()
+        if event.type == ACK:
+            step.acked = now
+        elif event.type in (COMPLETION, REPLY):
+            step.completed = now
+        elif event.type == ERROR:
+            step.error = event.packet.error_code
+        elif event.type == TIMEOUT:
+            step.error = 'timeout'
+
+    def _send(self, step):
+        visca = self.visca
+        recipient = step.packet[0] & 0b111
+        visca.protocol.start(recipient, False, step)
+        step.sent = time.monotonic()
+        visca.write_raw(step.packet, "sent: macro")
+        rx_bytes = 0
+        while True:
+            event = visca.recv_event("macro")
+            rx_bytes += len(event.raw)
+            self._update(event)
+            if event.final:
+                break
+        visca.finish_request(recipient, False, step.sent, time.monotonic(),
+                             len(step.packet), rx_bytes, event.raw)
+
+    def _in_flight(self, steps):
+        return [s for s in steps if s.acked is not None and s.completed is None and s.error is None]
+
+    def _free_socket(self, steps):
+        """
+        reads until a step in flight is done, False if the port timed
+        out first
+        """
+        busy = len(self._in_flight(steps))
+        while len(self._in_flight(steps)) >= busy:
+            event = self.visca.recv_event("macro")
+            self._update(event)
+            if event.type == TIMEOUT:
+                return False
+        return True
+
+    def run(self, completion_timeout=None, start=None):
+        """
+        plays the macro, returns a MacroResult.
+        completion_timeout = seconds to wait for the last COMPLETIONs after
+        the last step (default: the port timeout)
+        start = monotonic time of offset 0 (e.g. the next frame), None
+        for as soon as the bus lock is taken
+        """
+        if completion_timeout is None:
+            completion_timeout = self.visca.timeout
+
+        steps = [MacroStep(s.name, s.args, s.delay) for s in self.steps]
+        for step, compiled in zip(steps, self.steps):
+            step.offset = compiled.offset
+            step.packet = compiled.packet
+
+        visca = self.visca
+        transport = visca.transport
+        visca.mutex.acquire()
+        try:
+            while transport.in_waiting():
+                visca.recv_packet("ignored")
+
+            if start is None:
+                start = time.monotonic()
+            for step in steps:
+                self._wait_until(start + step.offset)
+                self._send(step)
+                while step.error == BUFFER_FULL and self._in_flight(steps):
+                    # every socket is busy: send it again, late, once
+                    # a step in flight completed
+                    if not self._free_socket(steps):
+                        break
+                    step.error = None
+                    self._send(step)
+
+            deadline = time.monotonic() + completion_timeout
+            while (any(s.acked is not None and s.completed is None and s.error is None for s in steps)
+                   and time.monotonic() < deadline):
+                if transport.in_waiting():
+                    self._update(visca.recv_event("macro"))
+                else:
+                    time.sleep(0.0005)
+        finally:
+            visca.mutex.release()
+
+        return MacroResult(start, steps)
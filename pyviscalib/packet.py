@@ -0,0 +1,262 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# A visca packet decoded on demand.
+#
+# Packet wraps the received bytes without copying them; header fields,
+# the packet type and the payload are only worked out when asked for and
+# the payload is a memoryview into the original bytes.
+#
+#   header:  1 s2 s1 s0 bc r2 r1 r0
+#   replies: y0 4z ff        ACK for socket z
+#            y0 5z ff        COMPLETION for socket z
+#            y0 5z .. ff     COMPLETION with data (inquiry reply)
+#            y0 6z ee ff     ERROR ee on socket z
+#            x0 38 ff        network change
+#
+
+import struct
+
+COMMAND = 'command'
+INQUIRY = 'inquiry'
+ACK = 'ack'
+COMPLETION = 'completion'
+REPLY = 'reply'
+ERROR = 'error'
+NETWORK_CHANGE = 'network change'
+ADDRESS_SET = 'address set'
+IF_CLEAR = 'if clear'
+UNKNOWN = 'unknown'
+
+ERROR_MESSAGES = {
+    0x01: 'Message length error',
+    0x02: 'Syntax Error',
+    0x03: 'Command Buffer Full',
+    0x04: 'Command canceled',
+    0x05: 'Invalid socket selected',
+    0x41: 'Command not executable',
+}
+
+_WORD = struct.Struct('>I')
+
+
+def nibbles_to_int(data, offset=0, count=4, signed=False):
+    """
+    0p 0q 0r 0s ... (count nibbles starting at offset) to an integer
+    """
+    value = 0
+    for i in range(offset, offset + count):
+        value = (value << 4) | (data[i] & 0x0f)
+    if signed and value & (1 << (count * 4 - 1)):
+        value -= 1 << (count * 4)
+    return value
+
+
+def word_from_nibbles(data, offset=0):
+    """
+    fast path of nibbles_to_int for the usual 4 nibble word (the encoding
+    i2v produces), no loop, no copy
+    """
+    return (((data[offset] & 0x0f) << 12) | ((data[offset+1] & 0x0f) << 8)
+            | ((data[offset+2] & 0x0f) << 4) | (data[offset+3] & 0x0f))
+
+
+def int_to_nibbles(value, count=4):
+    """
+    inverse of nibbles_to_int, negative values are two's complement
+    """
+    value &= (1 << (count * 4)) - 1
+    return bytes((value >> (4 * i)) & 0x0f for i in range(count - 1, -1, -1))
+
+
+def raw_word(data, offset=0):
+    """
+    the 4 nibble bytes read as one big endian integer, the representation
+    used by ZOOM_SETTINGS_INT / inquiry_precise_zoom_position
+    """
+    return _WORD.unpack_from(data, offset)[0]
+
+
+class Packet():
+
+    __slots__ = ('raw', 'view', '_type')
+
+    def __init__(self, raw):
+        if isinstance(raw, memoryview):
+            self.view = raw
+            self.raw = raw
+        else:
+            self.raw = raw
+            self.view = memoryview(raw)
+        self._type = None
+
+    def __len__(self):
+        return len(self.view)
+
+    def __bytes__(self):
+        return bytes(self.view)
+
+    def __eq__(self, other):
+        if isinstance(other, Packet):
+            other = other.view
+        return self.view == other
+
+    def __hash__(self):
+        return hash(bytes(self.view))
+
+    def __repr__(self):
+        return 'Packet(%s, %s)' % (bytes(self.view).hex(), self.type)
+
+    @property
+    def header(self):
+        return self.view[0]
+
+    @property
+    def sender(self):
+        return (self.view[0] & 0b01110000) >> 4
+
+    @property
+    def broadcast(self):
+        return bool(self.view[0] & 0b1000)
+
+    @property
+    def recipient(self):
+        """
+        address of the recipient, -1 for broadcasts
+        """
+        if self.view[0] & 0b1000:
+            return -1
+        return self.view[0] & 0b0111
+
+    @property
+    def terminated(self):
+        return len(self.view) > 0 and self.view[-1] == 0xff
+
+    @property
+    def qq(self):
+        return self.view[1] if len(self.view) > 1 else None
+
+    @property
+    def type(self):
+        if self._type is None:
+            self._type = self._classify()
+        return self._type
+
+    def _classify(self):
+        view = self.view
+        length = len(view)
+        if length < 3 or view[-1] != 0xff:
+            return UNKNOWN
+        qq = view[1]
+        if view[0] == 0x88:
+            if qq == 0x30:
+                return ADDRESS_SET
+            if qq == 0x01 and length == 5 and view[2] == 0x00 and view[3] == 0x01:
+                return IF_CLEAR
+            return COMMAND
+        if length == 3 and qq == 0x38:
+            return NETWORK_CHANGE
+        if view[0] & 0b01110000 == 0:
+            # from the controller
+            if qq == 0x01:
+                if length == 5 and view[2] == 0x00 and view[3] == 0x01:
+                    return IF_CLEAR
+                return COMMAND
+            if qq == 0x09:
+                return INQUIRY
+            return UNKNOWN
+        kind = qq >> 4
+        if kind == 4 and length == 3:
+            return ACK
+        if kind == 5:
+            return COMPLETION if length == 3 else REPLY
+        if kind == 6 and length == 4:
+            return ERROR
+        if qq == 0x01 and length == 5 and view[2] == 0x00 and view[3] == 0x01:
+            return IF_CLEAR
+        return UNKNOWN
+
+    @property
+    def socket(self):
+        if self.type in (ACK, COMPLETION, REPLY, ERROR):
+            return self.view[1] & 0x0f
+        return None
+
+    @property
+    def error_code(self):
+        if self.type == ERROR:
+            return self.view[2]
+        return None
+
+    @property
+    def error_message(self):
+        code = self.error_code
+        if code is None:
+            return None
+        return ERROR_MESSAGES.get(code, 'Unknown error %02x' % code)
+
+    @property
+    def is_final(self):
+        """
+        True for packets that end a transaction (COMPLETION, inquiry
+        reply or error)
+        """
+        return self.type in (COMPLETION, REPLY, ERROR)
+
+    @property
+    def payload(self):
+        """
+        what is between QQ and the terminator, as a view (no copy).
+        For inquiry replies this is the value, the same as
+        ViscaControl.get_data_from_inquiry but without copying.
+        """
+        return self.view[2:-1]
+
+    @property
+    def data(self):
+        """
+        command data of packets sent by the controller (after QQ RR)
+        """
+        return self.view[3:-1]
+
+    def word(self, offset=0, signed=False):
+        """
+        4 nibble value at offset of the payload
+        """
+        value = word_from_nibbles(self.view, 2 + offset)
+        if signed and value & 0x8000:
+            value -= 0x10000
+        return value
+
+    def raw_word(self, offset=0):
+        return raw_word(self.view, 2 + offset)
+
+    def byte_from_nibbles(self, offset=0):
+        """
+        0p 0q at offset of the payload to the byte pq (register values,
+        shutter, iris, ...)
+        """
+        return ((self.view[2 + offset] & 0x0f) << 4) | (self.view[3 + offset] & 0x0f)
@@ -0,0 +1,205 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Host side presets.
+#
+# The camera only has a few memory slots and recalling one takes as long
+# as the camera likes. Here a preset is a full settings snapshot stored
+# in a json file; recalling it reads the current state and only sends
+# the settings that differ.
+#
+# Commands are sent in RECALL_ORDER: the zoom goes first because the
+# lens keeps travelling after the ACK while the quick toggles are sent,
+# the exposure mode has to be set before shutter and aperture, registers
+# go last. Shutter and aperture are only sent when the exposure mode of
+# the preset lets them be set (full auto rejects both).
+#
+
+import json
+import os
+
+from .registers import read_registers, write_registers
+
+SETTINGS = ('zoom', 'ae_mode', 'shutter', 'aperture', 'mirror', 'flip',
+            'effect', 'stabilization', 'backlight', 'hires', 'registers')
+
+RECALL_ORDER = SETTINGS
+
+# exposure settings each AE mode takes, modes not listed get all of them
+EXPOSURE = ('shutter', 'aperture')
+AE_SETTINGS = {
+    0x00: (),                       # full auto
+    0x03: EXPOSURE,                 # manual
+    0x0A: ('shutter',),             # shutter priority
+    0x0B: ('aperture',),            # iris priority
+    0x0D: (),                       # bright
+}
+
+
+def capture(visca, device):
+    """
+    reads the current settings of a device into a snapshot dict
+    """
+    ae_mode = visca.inquiry_AEMode(device)
+    values, errors = read_registers(visca, device, [r[0] for r in visca.REGISTER_NAMES.values()])
+    registers = dict(('%02x' % r, value) for r, value in values.items())
+
+    return {
+        'zoom': visca.inquiry_precise_zoom_position(device),
+        'ae_mode': ae_mode[0] if ae_mode and len(ae_mode) == 1 else None,
+        'shutter': visca.inquiry_shutter_speed(device),
+        'aperture': visca.inquiry_aperture(device),
+        'mirror': visca.inquiry_mirror_mode(device),
+        'flip': visca.inquiry_flip_mode(device),
+        'effect': visca.inquiry_picture_effect(device),
+        'stabilization': visca.inquiry_image_stabilization(device),
+        'backlight': visca.inquiry_backlight_mode(device),
+        'hires': visca.inquiry_hires_mode(device),
+        'registers': registers,
+    }
+
+
+def diff(current, target):
+    """
+    returns {setting: target value} for everything in target that is
+    known and differs from current
+    """
+    changes = {}
+    for name in SETTINGS:
+        wanted = target.get(name)
+        if wanted is None:
+            continue
+        if name == 'registers':
+            have = current.get('registers') or {}
+            registers = dict((r, v) for r, v in wanted.items() if have.get(r) != v)
+            if registers:
+                changes[name] = registers
+        elif current.get(name) != wanted:
+            changes[name] = wanted
+    return changes
+
+
+def _onoff(on, off):
+    def apply(visca, device, value):
+        if value:
+            return on(visca, device)
+        return off(visca, device)
+    return apply
+
+
+def _stabilization(visca, device, value):
+    if value == 'Hold':
+        return visca.cmd_cam_stabilization(device, 0x00)
+    if value:
+        return visca.cmd_cam_stabilization_on(device)
+    return visca.cmd_cam_stabilization_off(device)
+
+
+def _registers(visca, device, registers):
+    return write_registers(visca, device, dict((int(r, 16), v) for r, v in registers.items()))
+
+
+APPLY = {
+    'zoom': lambda v, d, x: v.cmd_cam_zoom_position(d, x),
+    'ae_mode': lambda v, d, x: v.cmd_cam_ae_mode(d, x),
+    'shutter': lambda v, d, x: v.cmd_cam_shutter_speed(d, bytes([x])),
+    'aperture': lambda v, d, x: v.cmd_cam_aperture_direct(d, x),
+    'mirror': _onoff(lambda v, d: v.cmd_cam_lr_reverse_on(d), lambda v, d: v.cmd_cam_lr_reverse_off(d)),
+    'flip': _onoff(lambda v, d: v.cmd_cam_ud_reverse_on(d), lambda v, d: v.cmd_cam_ud_reverse_off(d)),
+    'effect': lambda v, d, x: v.cmd_cam_picture_effect(d, x),
+    'stabilization': _stabilization,
+    'backlight': _onoff(lambda v, d: v.cmd_cam_backlight_on(d), lambda v, d: v.cmd_cam_backlight_off(d)),
+    'hires': _onoff(lambda v, d: v.cmd_cam_hires_on(d), lambda v, d: v.cmd_cam_hires_off(d)),
+    'registers': _registers,
+}
+
+
+def apply(visca, device, changes, ae_mode=None):
+    """
+    sends the changes in RECALL_ORDER, returns the names of the settings sent.
+    ae_mode = exposure mode the device is in when it is not in changes,
+    shutter and aperture are skipped if that mode does not take them
+    """
+    ae_mode = changes.get('ae_mode', ae_mode)
+    allowed = AE_SETTINGS.get(ae_mode, EXPOSURE)
+    sent = []
+    for name in RECALL_ORDER:
+        if name in changes:
+            if name in EXPOSURE and name not in allowed:
+                continue
+            APPLY[name](visca, device, changes[name])
+            sent.append(name)
+    return sent
+
+
+class PresetLibrary():
+
+    def __init__(self, path):
+        self.path = path
+        self.presets = {}
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path) as f:
+            self.presets = json.load(f)
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.presets, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def names(self):
+        return sorted(self.presets)
+
+    def get(self, name):
+        return self.presets[name]
+
+    def delete(self, name):
+        del self.presets[name]
+        self.save()
+
+    def store(self, visca, device, name):
+        """
+        captures the current settings of the device as preset `name`
+        """
+        snapshot = capture(visca, device)
+        self.presets[name] = snapshot
+        self.save()
+        return snapshot
+
+    def recall(self, visca, device, name, current=None):
+        """
+        brings the device to preset `name` sending only what differs.
+        current = an already known snapshot of the device, read from the
+        camera if None.
+        returns the names of the settings that were sent
+        """
+        target = self.presets[name]
+        if current is None:
+            current = capture(visca, device)
+        return apply(visca, device, diff(current, target), current.get('ae_mode'))
@@ -0,0 +1,343 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Camera model profiles: what a model understands, checked before a
+# packet goes on the bus.
+#
+#   visca.inquiry_version(1)          # picks the profile of the model
+#   visca.profile(1).name             # 'FCB-EV7500'
+#   visca.cmd_cam_digital_effect_still(1)
+#                                     # -> y0 60 02 ff right away, the
+#                                     #    camera would answer the same
+#
+# A profile lists the opcodes of every command and inquiry category the
+# model supports, the allowed values of the first parameter of some
+# opcodes, numeric ranges of method parameters, the zoom tables and the
+# register map. A call the profile rejects returns the syntax error reply
+# the camera would have sent, without the round trip.
+#
+# Profiles are picked by the exact (vendor, model) of the version
+# inquiry. Devices of any other model have no profile and are not
+# checked. More profiles are loaded from json files:
+#
+#   {"name": "FCB-EV7520", "vendor": "0020", "models": ["0713"],
+#    "base": "FCB-EV7500",
+#    "commands": {"04": ["00", "07", "47", ...]},
+#    "values": {"04 63": ["00", "02", "04"]},
+#    "ranges": {"shutter_speed": [0, 21]},
+#    "optical_zoom": ["00000000", "01060a01", ...],
+#    "registers": {"mode": "72"},
+#    "register_values": {"72": {"01": "1080i/59.94"}}}
+#
+# Every key but name is optional, missing ones come from `base`. Opcodes,
+# values and zoom positions are hex.
+#
+
+import json
+import struct
+
+
+class ProfileError(Exception):
+    pass
+
+
+def _hex(value):
+    return bytes.fromhex(value)
+
+
+def _categories(d):
+    return dict((int(category, 16), set(_hex(''.join(opcodes))))
+                for category, opcodes in d.items())
+
+
+class CameraProfile():
+
+    def __init__(self, name, vendor=None, models=(), commands=None, inquiries=None,
+                 values=None, ranges=None, optical_zoom=None, digital_zoom=None,
+                 registers=None, register_values=None):
+        """
+        commands / inquiries = {category: set of opcodes}, None = anything
+        values          = {(category, opcode): set of first parameter bytes}
+        ranges          = {name: (low, high)} checked by the methods taking
+                          a number (shutter_speed, aperture, ...)
+        optical_zoom    = zoom positions 1x..Nx, 4 nibble bytes each
+        digital_zoom    = digital zoom positions, starting at the optical
+                          tele end
+        registers       = {name: register byte}
+        register_values = {register: {value byte: meaning}}
+        """
+        self.name = name
+        self.vendor = vendor
+        self.models = tuple(models)
+        self.commands = commands
+        self.inquiries = inquiries
+        self.values = values or {}
+        self.ranges = ranges or {}
+        self.optical_zoom = optical_zoom
+        self.digital_zoom = digital_zoom
+        self.registers = registers or {}
+        self.register_values = register_values or {}
+        self._zoom_int = None
+        self._zoom_index = None
+
+    def __repr__(self):
+        return 'CameraProfile(%s)' % self.name
+
+    def matches(self, vendor, model):
+        return vendor == self.vendor and model in self.models
+
+    def check(self, data):
+        """
+        None if the profile allows the message data (01 cc oo .. for a
+        command, 09 cc oo .. for an inquiry), else why not
+        """
+        if len(data) < 3:
+            return None
+        if data[0] == 0x01:
+            table = self.commands
+        elif data[0] == 0x09:
+            table = self.inquiries
+        else:
+            return None
+        category = data[1]
+        opcode = data[2]
+        if table is not None:
+            opcodes = table.get(category)
+            if opcodes is None or opcode not in opcodes:
+                return "%s: opcode %02x %02x not supported" % (self.name, category, opcode)
+        if data[0] == 0x01 and len(data) > 3:
+            allowed = self.values.get((category, opcode))
+            if allowed is not None and data[3] not in allowed:
+                return "%s: value %02x not supported by %02x %02x" % (self.name, data[3], category, opcode)
+        return None
+
+    def in_range(self, name, value):
+        limits = self.ranges.get(name)
+        return limits is None or limits[0] <= value <= limits[1]
+
+    @property
+    def zoom_settings(self):
+        """
+        the zoom positions of cmd_cam_zoom_direct 1, 2, ...; None if the
+        profile has no zoom table
+        """
+        if self.optical_zoom is None:
+            return None
+        return self.optical_zoom + (self.digital_zoom or [])[1:]
+
+    def zoom_tables(self):
+        """
+        (positions as integers, {integer: index}) for zoom_index
+        """
+        if self._zoom_int is None and self.zoom_settings is not None:
+            self._zoom_int = [struct.unpack('>I', a)[0] for a in self.zoom_settings]
+            index = {}
+            for i, a in enumerate(self._zoom_int):
+                index.setdefault(a, i)
+            self._zoom_index = index
+        return self._zoom_int, self._zoom_index
+
+    @classmethod
+    def from_dict(cls, d, base=None):
+        """
+        d as in a json profile file, the missing keys come from base
+        """
+        if 'name' not in d:
+            raise ProfileError("profile without a name")
+        if base is None and d.get('base'):
+            base = find_name(d['base'])
+            if base is None:
+                raise ProfileError("%s: unknown base profile %s" % (d['name'], d['base']))
+        inherited = base.__dict__ if base is not None else {}
+
+        def get(key, convert):
+            if key in d:
+                return convert(d[key]) if d[key] is not None else None
+            return inherited.get(key)
+
+        try:
+            return cls(d['name'],
+                       get('vendor', lambda v: int(v, 16)),
+                       get('models', lambda m: [int(v, 16) for v in m]) or (),
+                       get('commands', _categories),
+                       get('inquiries', _categories),
+                       get('values', lambda v: dict(
+                           (tuple(_hex(k)), set(_hex(''.join(b)))) for k, b in v.items())),
+                       get('ranges', lambda r: dict((k, tuple(v)) for k, v in r.items())),
+                       get('optical_zoom', lambda z: [_hex(p) for p in z]),
+                       get('digital_zoom', lambda z: [_hex(p) for p in z]),
+                       get('registers', lambda r: dict((k, _hex(v)) for k, v in r.items())),
+                       get('register_values', lambda r: dict(
+                           (_hex(k), dict((_hex(b), m) for b, m in v.items())) for k, v in r.items())))
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ProfileError("%s: %s" % (d['name'], e))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+# FCB-EV7500 video modes and zoom positions
+
+EV7500_REGISTER_NAMES = {'mode': b'\x72'}
+
+EV7500_REGISTER_VALUES = { b'\x72':
+    { b'\x01' : '1080i/59.94',
+      #b'\x02' : 'Reserved',
+      b'\x03' : 'NTSC Analog',
+      b'\x04' : '1080i/50',
+      b'\x05' : 'PAL Analog',
+      b'\x06' : '1080p/29.97',
+      #b'\x07' : 'Reserved',
+      b'\x08' : '1080p/25',
+      b'\x09' : '720p/59.94',
+      #b'\x0A' : 'Reserved',
+      #b'\x0B' : 'Reserved',
+      b'\x0C' : '720p/50',
+      #b'\x0D' : 'Reserved',
+      b'\x0E' : '720p/29.97',
+      #b'\x0F' : 'Reserved',
+      #b'\x10' : 'Reserved',
+      b'\x11' : '720p/25',
+      #b'\x12' : 'Reserved',
+      b'\x13' : '1080p/59.94',
+      b'\x14' : '1080p/50',
+    }
+    }
+
+EV7500_OPTICAL_ZOOM = [
+    b'\x00\x00\x00\x00',
+    b'\x01\x06\x0A\x01',
+    b'\x02\x00\x06\x03',
+    b'\x02\x06\x02\x08',
+    b'\x02\x0A\x01\x0D',
+    b'\x02\x0D\x01\x03',
+    b'\x02\x0F\x06\x0D',
+    b'\x03\x01\x06\x01',
+    b'\x03\x03\x00\x0D',
+    b'\x03\x04\x08\x06',
+    b'\x03\x05\x0D\x07',
+    b'\x03\x07\x00\x09',
+    b'\x03\x08\x02\x00',
+    b'\x03\x09\x02\x00',
+    b'\x03\x0A\x00\x0A',
+    b'\x03\x0A\x0D\x0D',
+    b'\x03\x0B\x09\x0C',
+    b'\x03\x0C\x04\x06',
+    b'\x03\x0C\x0D\x0C',
+    b'\x03\x0D\x06\x00',
+    b'\x03\x0D\x0D\x04',
+    b'\x03\x0E\x03\x09',
+    b'\x03\x0E\x09\x00',
+    b'\x03\x0E\x0D\x0C',
+    b'\x03\x0F\x01\x0E',
+    b'\x03\x0F\x05\x07',
+    b'\x03\x0F\x08\x0A',
+    b'\x03\x0F\x0B\x06',
+    b'\x03\x0F\x0D\x0C',
+    b'\x04\x00\x00\x00'
+    ]
+
+EV7500_DIGITAL_ZOOM = [
+    b'\x04\x00\x00\x00',
+    b'\x06\x00\x00\x00',
+    b'\x06\x0A\x08\x00',
+    b'\x07\x00\x00\x00',
+    b'\x07\x03\x00\x00',
+    b'\x07\x05\x04\x00',
+    b'\x07\x06\x0C\x00',
+    b'\x07\x08\x00\x00',
+    b'\x07\x08\x0C\x00',
+    b'\x07\x09\x08\x00',
+    b'\x07\x0A\x00\x00',
+    b'\x07\x0A\x0C\x00',
+    ]
+
+
+# what the methods of ViscaControl were written and tested against. Not on
+# the FCB-EV7500: auto power off (04 40), the digital effects (04 64/65)
+# and the old picture effects (pastel, sepia, solarize, mosaic, slim,
+# stretch); no pan/tilt either, only the datascreen of category 06.
+FCB_EV7500 = CameraProfile(
+    'FCB-EV7500', vendor=0x0020, models=(0x0712,),
+    commands={
+        0x00: {0x01},
+        0x04: {0x00, 0x06, 0x07, 0x1f, 0x24, 0x33, 0x34, 0x39, 0x3f,
+               0x42, 0x47, 0x4a, 0x4b, 0x4c, 0x52, 0x61, 0x62, 0x63, 0x66},
+        0x06: {0x06},
+    },
+    inquiries={
+        0x00: {0x02},
+        0x04: {0x00, 0x06, 0x24, 0x33, 0x34, 0x39, 0x42, 0x47, 0x4a,
+               0x52, 0x61, 0x62, 0x63, 0x66},
+    },
+    values={
+        (0x04, 0x63): {0x00, 0x02, 0x04},
+    },
+    ranges={
+        'shutter_speed': (0x00, 0x15),
+        'aperture': (0x00, 0x0f),
+        'iris': (0x00, 0x11),
+        'gain': (0x00, 0x0f),
+    },
+    optical_zoom=EV7500_OPTICAL_ZOOM,
+    digital_zoom=EV7500_DIGITAL_ZOOM,
+    registers=EV7500_REGISTER_NAMES,
+    register_values=EV7500_REGISTER_VALUES)
+
+# every profile known, the last registered wins
+PROFILES = [FCB_EV7500]
+
+
+def register(profile):
+    PROFILES.append(profile)
+    return profile
+
+
+def load(path):
+    """
+    reads a json profile and makes it known to find()
+    """
+    return register(CameraProfile.load(path))
+
+
+def find_name(name):
+    for profile in reversed(PROFILES):
+        if profile.name == name:
+            return profile
+    return None
+
+
+def find(vendor, model):
+    """
+    the profile of a model as reported by the version inquiry, None if
+    no profile lists that model: its calls are not checked
+    """
+    for profile in reversed(PROFILES):
+        if profile.matches(vendor, model):
+            return profile
+    return None
@@ -0,0 +1,351 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# The visca protocol without any I/O: bytes in, events out.
+#
+#   protocol = ViscaProtocol()
+#   packet = protocol.encode(1, b'\x01\x04\x62\x02')
+#   protocol.start(1)                      # now waiting for device 1
+#   <write packet to the port>
+#   for event in protocol.receive_data(<bytes read from the port>):
+#       ...                                # event.final ends the request
+#   protocol.timeout()                     # nothing came back
+#
+# ViscaControl (blocking), the gateway, the macros and the simulator all
+# drive this, so framing, reply classification and the decision of which
+# reply belongs to whom live in one place and can be benchmarked without
+# a port (see benchmark.py).
+#
+# One request is outstanding at a time, like on the serial link. The ACK
+# of a command binds the camera socket to the owner of the request so the
+# COMPLETION arriving later (maybe while another request is outstanding)
+# still goes to the right owner.
+#
+
+import time
+
+from .packet import Packet, ACK, COMPLETION, REPLY, ERROR, NETWORK_CHANGE
+
+# event type of protocol.timeout()
+TIMEOUT = 'timeout'
+
+# visca packets are at most 16 bytes
+MAX_PACKET = 16
+
+TERMINATOR = 0xff
+
+
+def encode(sender, recipient, data):
+    """
+    header + data + terminator, recipient -1 is a broadcast (header 0x88)
+    """
+    if recipient == -1:
+        header = 0x88
+    else:
+        header = 0x80 | ((sender & 0b111) << 4) | (recipient & 0b111)
+    return bytes((header,)) + data + b'\xff'
+
+
+def encode_reply(device, data):
+    """
+    a packet from `device` to the controller (address 0)
+    """
+    return bytes((0x80 | ((device & 0b111) << 4),)) + data + b'\xff'
+
+
+class Framer():
+    """
+    cuts a byte stream into packets at the terminator. More than
+    MAX_PACKET bytes without terminator are returned as they are (an
+    unterminated packet), so garbage on the line can not grow the buffer.
+    """
+
+    __slots__ = ('buffer', 'max_size')
+
+    def __init__(self, max_size=MAX_PACKET):
+        self.buffer = bytearray()
+        self.max_size = max_size
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def feed(self, data):
+        """
+        returns the list of complete packets (bytes)
+        """
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        while buffer:
+            end = buffer.find(TERMINATOR)
+            if end < 0 or end >= self.max_size:
+                if len(buffer) < self.max_size:
+                    break
+                end = self.max_size - 1
+            frames.append(bytes(buffer[:end + 1]))
+            del buffer[:end + 1]
+        return frames
+
+    def flush(self):
+        """
+        drops and returns what is left of an incomplete packet
+        """
+        rest = bytes(self.buffer)
+        self.buffer.clear()
+        return rest
+
+
+class Event():
+    """
+    type   = packet type (see packet.py) or TIMEOUT
+    raw    = the bytes received (what is left on a timeout)
+    packet = raw as Packet, None on a timeout
+    owner  = owner of the request the packet belongs to, None if unrouted
+    final  = the packet ends the outstanding request
+    """
+
+    __slots__ = ('type', 'raw', 'packet', 'owner', 'final')
+
+    def __init__(self, type, raw, packet, owner, final):
+        self.type = type
+        self.raw = raw
+        self.packet = packet
+        self.owner = owner
+        self.final = final
+
+    def __repr__(self):
+        return 'Event(%s, %s, owner=%r, final=%s)' % (self.type, self.raw.hex(),
+                                                     self.owner, self.final)
+
+
+class Request():
+
+    __slots__ = ('recipient', 'inquiry', 'owner', 'packets')
+
+    def __init__(self, recipient, inquiry, owner):
+        self.recipient = recipient
+        self.inquiry = inquiry
+        self.owner = owner
+        # packets seen while waiting
+        self.packets = 0
+
+
+class ViscaProtocol():
+
+    # give up on a request after this many packets that are not its
+    # answer. Inquiries may be ACKed before the reply comes.
+    INQUIRY_PACKETS = 5
+    COMMAND_PACKETS = 16
+
+    def __init__(self, sender=0, clock=time.monotonic):
+        self.sender = sender
+        self.clock = clock
+        self.framer = Framer()
+        self.pending = None
+        # (device, socket) -> (owner, time of the ACK)
+        self.sockets = {}
+
+    def encode(self, recipient, data):
+        return encode(self.sender, recipient, data)
+
+    def start(self, recipient, inquiry=False, owner=None):
+        """
+        a request to recipient was (is about to be) written, the replies
+        fed from now on are matched against it
+        """
+        self.pending = Request(recipient, inquiry, owner)
+
+    def cancel(self):
+        self.pending = None
+
+    def receive_data(self, data):
+        """
+        feeds bytes read from the port, returns the list of Events
+        """
+        return [self.handle(raw) for raw in self.framer.feed(data)]
+
+    def timeout(self):
+        """
+        the port timed out: ends the outstanding request, returns the
+        TIMEOUT event carrying whatever partial packet was read
+        """
+        request = self.pending
+        self.pending = None
+        return Event(TIMEOUT, self.framer.flush(), None,
+                     request.owner if request is not None else None,
+                     request is not None)
+
+    def handle(self, raw):
+        """
+        classifies one complete packet and decides who it belongs to
+        """
+        packet = Packet(raw)
+        kind = packet.type
+        request = self.pending
+        owner = None
+        final = False
+
+        if kind == ACK or kind == COMPLETION or kind == REPLY or kind == ERROR:
+            sender = (raw[0] >> 4) & 0b111
+            socket = raw[1] & 0x0f
+            mine = request is not None and request.recipient == sender
+            if kind == ACK:
+                if mine:
+                    owner = request.owner
+                    if not request.inquiry:
+                        self.sockets[(sender, socket)] = (owner, self.clock())
+                        final = True
+            else:
+                entry = self.sockets.pop((sender, socket), None) if socket else None
+                if entry is not None:
+                    # completion of an earlier command
+                    owner = entry[0]
+                elif mine and not (kind == COMPLETION and request.inquiry):
+                    owner = request.owner
+                    final = True
+        elif kind == NETWORK_CHANGE:
+            pass
+        elif request is not None and (packet.broadcast or not packet.terminated):
+            # a broadcast coming back around the chain answers a broadcast;
+            # a packet without terminator ends the request as an error
+            owner = request.owner
+            final = True
+
+        if request is not None and not final:
+            request.packets += 1
+            limit = self.INQUIRY_PACKETS if request.inquiry else self.COMMAND_PACKETS
+            if request.packets >= limit:
+                final = True
+        if final:
+            self.pending = None
+        return Event(kind, raw, packet, owner, final)
+
+    def owners(self):
+        """
+        owners still waiting for a COMPLETION
+        """
+        return [owner for owner, stamp in list(self.sockets.values()) if owner is not None]
+
+    def expire(self, max_age, now=None):
+        """
+        forgets sockets whose COMPLETION did not come within max_age
+        seconds, returns their owners
+        """
+        if now is None:
+            now = self.clock()
+        expired = []
+        for key, (owner, stamp) in list(self.sockets.items()):
+            if now - stamp > max_age:
+                del self.sockets[key]
+                expired.append(owner)
+        return expired
+
+    def forget(self, device):
+        """
+        forgets the sockets of one device (after an interface clear their
+        COMPLETIONs never come), returns their owners
+        """
+        forgotten = []
+        for key, (owner, stamp) in list(self.sockets.items()):
+            if key[0] == device:
+                del self.sockets[key]
+                forgotten.append(owner)
+        return forgotten
+
+
+def describe(packet, title=None):
+    """
+    human readable lines about a packet, what ViscaControl.dump() prints
+    """
+    p = Packet(packet)
+    qq = p.qq
+    lines = ["-----"]
+
+    if p.broadcast:
+        recipient_s = "*"
+    else:
+        recipient_s = str(p.recipient)
+
+    if title:
+        lines.append("packet (%s) [%d => %s] len=%d: %s" % (title, p.sender, recipient_s, len(packet), packet))
+    else:
+        lines.append("packet [%d => %s] len=%d: %s" % (p.sender, recipient_s, len(packet), packet))
+
+    if qq is None:
+        return lines
+    lines.append(" QQ.........: %02x" % qq)
+
+    if qq == 0x01:
+        lines.append("              (Command)")
+    if qq == 0x09:
+        lines.append("              (Inquiry)")
+
+    if len(packet) > 3:
+        rr = packet[2]
+        lines.append(" RR.........: %02x" % rr)
+
+        if rr == 0x00:
+            lines.append("              (Interface)")
+        if rr == 0x04:
+            lines.append("              (Camera [1])")
+        if rr == 0x06:
+            lines.append("              (Pan/Tilter)")
+
+    if len(packet) > 4:
+        lines.append(" Data.......: %s" % bytes(p.data))
+    else:
+        lines.append(" Data.......: None")
+
+    if not p.terminated:
+        lines.append("ERROR: Packet not terminated correctly")
+        return lines
+
+    kind = p.type
+    if kind == ACK:
+        lines.append(" packet: ACK for socket %02x" % p.socket)
+
+    if kind == COMPLETION:
+        lines.append(" packet: COMPLETION for socket %02x" % p.socket)
+
+    if kind == REPLY:
+        lines.append(" packet: COMPLETION for socket %02x, data=%s" % (p.socket, bytes(p.payload)))
+
+    if kind == ERROR:
+        lines.append(" packet: ERROR!")
+
+        socketno = p.socket
+        errcode = p.error_code
+
+        # these two are special, socket is zero and has no meaning:
+        if errcode in (0x02, 0x03) and socketno == 0:
+            lines.append("        : %s" % p.error_message)
+
+        if errcode in (0x04, 0x05, 0x41):
+            lines.append("        : Socket %i: %s" % (socketno, p.error_message))
+
+    if kind == NETWORK_CHANGE:
+        lines.append("Network Change - we should immedeately issue a renumbering!")
+    return lines
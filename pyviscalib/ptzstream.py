@@ -0,0 +1,184 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Combined PTZ state stream.
+#
+# Pan/tilt position and zoom are polled in turns, one inquiry per slot,
+# `rate` slots per second. After every slot a sample with the latest
+# pan, tilt and zoom is published to the subscribers. With the default
+# schedule ('pt', 'zoom') every value is refreshed every 2/rate seconds,
+# so a sample is never older than max_staleness() (plus one round trip).
+#
+
+import threading
+import time
+
+
+class PTZSample():
+
+    __slots__ = ('time', 'pan', 'tilt', 'zoom', 'pt_time', 'zoom_time')
+
+    def __init__(self, time, pan, tilt, zoom, pt_time, zoom_time):
+        self.time = time
+        self.pan = pan
+        self.tilt = tilt
+        self.zoom = zoom
+        # when each value was read (monotonic, middle of the round trip)
+        self.pt_time = pt_time
+        self.zoom_time = zoom_time
+
+    def staleness(self, now=None):
+        """
+        age of the oldest value in the sample
+        """
+        if now is None:
+            now = self.time
+        stamps = [t for t in (self.pt_time, self.zoom_time) if t is not None]
+        if not stamps:
+            return None
+        return now - min(stamps)
+
+    def __repr__(self):
+        return 'PTZSample(time=%.6f, pan=%s, tilt=%s, zoom=%s)' % (self.time, self.pan, self.tilt, self.zoom)
+
+
+class PTZStream():
+
+    def __init__(self, visca, device, rate=10, schedule=('pt', 'zoom'), consumer='ptz'):
+        """
+        rate     = inquiries per second
+        schedule = order of the inquiries, e.g. ('pt', 'pt', 'zoom') to
+                   read the head twice as often as the lens
+        consumer = name of the polling on visca.bandwidth, slots over its
+                   budget are skipped
+        """
+        self.visca = visca
+        self.device = device
+        self.rate = float(rate)
+        self.schedule = tuple(schedule)
+        for name in self.schedule:
+            if name not in ('pt', 'zoom'):
+                raise ValueError("unknown PTZ poll '%s'" % name)
+
+        self.consumer = consumer
+        self.latest = None
+        self.missed = 0
+        # slots skipped because of the bandwidth budget
+        self.thinned = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._exit = False
+        self._thread = None
+
+        self._pan = self._tilt = self._zoom = None
+        self._pt_time = self._zoom_time = None
+
+    def subscribe(self, callback):
+        """
+        callback(sample) is called from the stream thread for every sample
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def max_staleness(self):
+        """
+        the longest time between two reads of the same value
+        """
+        longest = 0
+        for name in set(self.schedule):
+            slots = [i for i, n in enumerate(self.schedule) if n == name]
+            gaps = [(b - a) % len(self.schedule) or len(self.schedule)
+                    for a, b in zip(slots, slots[1:] + slots[:1])]
+            longest = max(longest, max(gaps))
+        return longest / self.rate
+
+    def start(self):
+        self._exit = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._exit = True
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self, name):
+        """
+        runs one inquiry of the schedule and returns the new sample
+        """
+        sent = time.monotonic()
+        if name == 'pt':
+            position = self.visca.inquiry_pt_position(self.device)
+            stamp = (sent + time.monotonic()) / 2
+            if position is not None:
+                self._pan, self._tilt = position
+                self._pt_time = stamp
+        else:
+            zoom = self.visca.inquiry_precise_zoom_position(self.device)
+            stamp = (sent + time.monotonic()) / 2
+            if zoom is not None:
+                self._zoom = zoom
+                self._zoom_time = stamp
+
+        sample = PTZSample(time.monotonic(), self._pan, self._tilt, self._zoom,
+                           self._pt_time, self._zoom_time)
+        self.latest = sample
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(sample)
+            except Exception as e:
+                print("PTZ subscriber failed: %s" % e)
+        return sample
+
+    def _run(self):
+        period = 1.0 / self.rate
+        deadline = time.monotonic()
+        slot = 0
+        bandwidth = self.visca.bandwidth
+        while not self._exit:
+            if bandwidth.admit(self.consumer):
+                with bandwidth.consumer(self.consumer):
+                    self.poll(self.schedule[slot % len(self.schedule)])
+                slot += 1
+            else:
+                self.thinned += 1
+
+            deadline += period
+            now = time.monotonic()
+            if now > deadline:
+                # the bus was too slow, skip the slots we missed instead
+                # of bursting to catch up
+                missed = int((now - deadline) / period) + 1
+                self.missed += missed
+                deadline += missed * period
+            time.sleep(max(0, deadline - time.monotonic()))
@@ -0,0 +1,275 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Bulk register dump, restore and verify.
+#
+#   image = registers.dump(visca, 1)           # whole register space
+#   image.save('camera1.json')
+#   ...
+#   golden = RegisterImage.load('golden.json')
+#   sent, mismatches = registers.restore(visca, 2, golden)
+#
+# dump() pipelines the register inquiries: up to `window` of them are on
+# the wire at once, so the camera works on one while the next is being
+# transmitted. Inquiry replies carry no socket number; they come back in
+# the order the inquiries were sent, except a buffer full error, which
+# the camera sends right away for the inquiry it could not take (the
+# newest one). That inquiry is sent again and the window shrinks to 1:
+# the camera does not queue inquiries.
+#
+# restore() writes only the registers that differ, pipelined as a
+# session (see session.py), and reads them back. Register values take
+# effect after the next power cycle on most models.
+#
+
+import json
+import os
+import time
+from collections import deque
+
+from .packet import REPLY, ERROR
+from .protocol import TIMEOUT
+
+# register numbers are 00..7f
+REGISTERS = range(0x80)
+
+DEFAULT_WINDOW = 2
+
+BUFFER_FULL = 0x03
+
+
+class RegisterImage():
+
+    def __init__(self, values=None, errors=None, vendor=None, model=None,
+                 rom_version=None, taken=None):
+        # register -> value (0..255)
+        self.values = dict(values or {})
+        # register -> error code of the registers the camera did not
+        # answer ('timeout' if it said nothing)
+        self.errors = dict(errors or {})
+        self.vendor = vendor
+        self.model = model
+        self.rom_version = rom_version
+        # time.time() of the dump
+        self.taken = taken
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(sorted(self.values))
+
+    def __contains__(self, register):
+        return register in self.values
+
+    def __getitem__(self, register):
+        return self.values[register]
+
+    def get(self, register, default=None):
+        return self.values.get(register, default)
+
+    def diff(self, other):
+        """
+        {register: (value here, value in other)} of every register that
+        differs, None where one image has no value
+        """
+        changes = {}
+        for register in set(self.values) | set(other.values):
+            mine = self.values.get(register)
+            theirs = other.values.get(register)
+            if mine != theirs:
+                changes[register] = (mine, theirs)
+        return changes
+
+    def describe(self, profile):
+        """
+        {register name: meaning} of the registers the profile knows
+        (the raw value when the meaning is not known)
+        """
+        described = {}
+        for name, register in profile.registers.items():
+            number = register[0]
+            if number not in self.values:
+                continue
+            value = bytes([self.values[number]])
+            described[name] = profile.register_values.get(register, {}).get(value, self.values[number])
+        return described
+
+    def to_dict(self):
+        return {'vendor': self.vendor, 'model': self.model,
+                'rom_version': self.rom_version, 'taken': self.taken,
+                'values': dict(('%02x' % r, v) for r, v in sorted(self.values.items())),
+                'errors': dict(('%02x' % r, e) for r, e in sorted(self.errors.items()))}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(dict((int(r, 16), v) for r, v in d.get('values', {}).items()),
+                   dict((int(r, 16), e) for r, e in d.get('errors', {}).items()),
+                   d.get('vendor'), d.get('model'), d.get('rom_version'),
+                   d.get('taken'))
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def __repr__(self):
+        return 'RegisterImage(%d registers, %d errors)' % (len(self.values), len(self.errors))
+
+
+def read_registers(visca, device, registers=REGISTERS, window=DEFAULT_WINDOW):
+    """
+    reads registers with pipelined inquiries under one hold of the bus
+    lock, returns ({register: value}, {register: error code}). Every
+    inquiry is reported like those of send_packet (finish_request).
+    """
+    packets = dict((r, visca.encode_packet(device, b'\x09\x04\x24' + bytes([r])))
+                   for r in registers)
+    queue = deque(packets)
+    in_flight = deque()
+    values = {}
+    errors = {}
+    # register -> time its inquiry was written
+    sent = {}
+    # (register, sent, received, reply) of every finished inquiry
+    finished = []
+
+    visca.mutex.acquire()
+    try:
+        while visca.transport.in_waiting():
+            visca.recv_packet("ignored")
+
+        while queue or in_flight:
+            while queue and len(in_flight) < window:
+                register = queue.popleft()
+                sent[register] = time.monotonic()
+                visca.write_raw(packets[register], "sent: registers")
+                in_flight.append(register)
+
+            event = visca.recv_event("registers")
+            now = time.monotonic()
+            if event.type == TIMEOUT:
+                # nothing more is coming for what is in flight
+                for register in in_flight:
+                    errors[register] = 'timeout'
+                    finished.append((register, sent[register], now, None))
+                in_flight.clear()
+                continue
+            packet = event.packet
+            if event.type not in (REPLY, ERROR) or packet.sender != device or packet.socket:
+                # not an inquiry reply of this device
+                continue
+
+            if event.type == ERROR and packet.error_code == BUFFER_FULL and len(in_flight) > 1:
+                queue.appendleft(in_flight.pop())
+                window = 1
+                continue
+            register = in_flight.popleft()
+            finished.append((register, sent[register], now, event.raw))
+            if event.type == ERROR:
+                errors[register] = packet.error_code
+            elif len(packet) == 5:
+                values[register] = packet.byte_from_nibbles()
+            else:
+                errors[register] = 'bad reply'
+    finally:
+        visca.mutex.release()
+
+    for register, started, received, reply in finished:
+        visca.finish_request(device, True, started, received, len(packets[register]),
+                             len(reply) if reply else 0, reply)
+    return values, errors
+
+
+def dump(visca, device, registers=REGISTERS, window=DEFAULT_WINDOW):
+    """
+    RegisterImage of device: the registers (all by default) and what
+    the version inquiry says about the model
+    """
+    version = visca.inquiry_version(device)
+    vendor, model, rom_version = version[:3] if version is not None else (None, None, None)
+    taken = time.time()
+    values, errors = read_registers(visca, device, registers, window)
+    return RegisterImage(values, errors, vendor, model, rom_version, taken)
+
+
+def diff(current, target):
+    """
+    {register: target value} of the registers target has and current
+    has not, or has with another value
+    """
+    return dict((r, theirs) for r, (mine, theirs) in current.diff(target).items()
+                if theirs is not None)
+
+
+def write_registers(visca, device, values):
+    """
+    sets {register: value} in one session, returns {register: error}
+    of the writes the camera refused
+    """
+    order = sorted(values)
+    with visca.session(device) as s:
+        for register in order:
+            value = values[register]
+            s.cmd_cam(b'\x24' + bytes([register, value >> 4, value & 0x0f]))
+    return dict((order[i], error) for i, error in s.errors.items())
+
+
+def verify(visca, device, image, registers=None, window=DEFAULT_WINDOW):
+    """
+    reads registers (those of image by default) back, returns
+    {register: (wanted, read)} of those that differ
+    """
+    if registers is None:
+        registers = list(image)
+    values, errors = read_registers(visca, device, registers, window)
+    return dict((r, (image.get(r), values.get(r))) for r in registers
+                if values.get(r) != image.get(r))
+
+
+def restore(visca, device, image, current=None, check=True, window=DEFAULT_WINDOW):
+    """
+    brings the registers of device to image writing only those that
+    differ. current = an image of the device, read if None.
+    returns ({register: value sent}, mismatches of verify() or None
+    if check is False)
+    """
+    if current is None:
+        values, errors = read_registers(visca, device, list(image), window)
+        current = RegisterImage(values, errors)
+    changes = diff(current, image)
+    if changes:
+        write_registers(visca, device, changes)
+    mismatches = None
+    if check:
+        mismatches = verify(visca, device, image, sorted(changes), window) if changes else {}
+    return changes, mismatches
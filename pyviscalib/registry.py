@@ -0,0 +1,200 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Devices found on the daisy chain.
+#
+# The registry is filled once by enumerate() (address set + a version
+# inquiry per device) and can be saved to a json bus map. On the next
+# start one version inquiry per known device tells if the chain is still
+# the same, see probe().
+#
+
+import json
+import os
+import queue
+import threading
+
+
+class DeviceStats():
+
+    def __init__(self):
+        self.commands = 0
+        self.inquiries = 0
+        self.errors = 0
+        self.timeouts = 0
+        # seconds spent waiting for this device
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, inquiry, elapsed, reply):
+        with self.lock:
+            if inquiry:
+                self.inquiries += 1
+            else:
+                self.commands += 1
+            self.busy += elapsed
+            if not reply:
+                self.timeouts += 1
+            elif len(reply) > 1 and (reply[1] & 0b11110000) == 0x60:
+                self.errors += 1
+
+    def as_dict(self):
+        return {'commands': self.commands, 'inquiries': self.inquiries,
+                'errors': self.errors, 'timeouts': self.timeouts,
+                'busy': self.busy}
+
+
+class ViscaDevice():
+
+    def __init__(self, address, vendor=None, model=None, rom_version=None,
+                 sockets=None, capabilities=()):
+        self.address = address
+        self.vendor = vendor
+        self.model = model
+        self.rom_version = rom_version
+        self.sockets = sockets
+        self.capabilities = set(capabilities)
+        # work waiting for this device, for schedulers spreading load
+        # over the chain
+        self.queue = queue.Queue()
+        self.stats = DeviceStats()
+
+    def load(self):
+        """
+        how busy the device is: queued work plus time spent on the bus
+        """
+        return self.queue.qsize(), self.stats.busy
+
+    def to_dict(self):
+        return {'address': self.address, 'vendor': self.vendor,
+                'model': self.model, 'rom_version': self.rom_version,
+                'sockets': self.sockets,
+                'capabilities': sorted(self.capabilities)}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['address'], d.get('vendor'), d.get('model'),
+                   d.get('rom_version'), d.get('sockets'),
+                   d.get('capabilities', ()))
+
+    def __repr__(self):
+        return 'ViscaDevice(%d, vendor=%s, model=%s, rom=%s)' % (
+            self.address,
+            '%04x' % self.vendor if self.vendor is not None else None,
+            '%04x' % self.model if self.model is not None else None,
+            '%04x' % self.rom_version if self.rom_version is not None else None)
+
+
+class DeviceRegistry():
+
+    def __init__(self, devices=()):
+        self.devices = dict((d.address, d) for d in devices)
+
+    def __iter__(self):
+        return iter([self.devices[a] for a in sorted(self.devices)])
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __getitem__(self, address):
+        return self.devices[address]
+
+    def get(self, address):
+        return self.devices.get(address)
+
+    def record(self, address, inquiry, elapsed, reply):
+        device = self.devices.get(address)
+        if device is not None:
+            device.stats.record(inquiry, elapsed, reply)
+
+    def least_busy(self, capability=None):
+        """
+        the device with the shortest queue (then least bus time),
+        optionally only among devices with `capability`
+        """
+        candidates = [d for d in self if capability is None or capability in d.capabilities]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda d: d.load())
+
+    @staticmethod
+    def describe(visca, address):
+        """
+        asks one device who it is and what it can do
+        """
+        version = visca.inquiry_version(address)
+        if version is None:
+            return None
+        vendor, model, rom_version, sockets = version
+        capabilities = set()
+        if visca.inquiry_power(address) is not None:
+            capabilities.add('camera')
+        if visca.inquiry_pt_position(address) is not None:
+            capabilities.add('pan_tilt')
+        return ViscaDevice(address, vendor, model, rom_version, sockets, capabilities)
+
+    def enumerate(self, visca, count=None):
+        """
+        numbers the chain (unless count says it was done already) and
+        describes every device on it
+        """
+        if count is None:
+            count = visca.cmd_adress_set()
+        self.devices = {}
+        for address in range(1, count + 1):
+            device = self.describe(visca, address)
+            if device is None:
+                device = ViscaDevice(address)
+            self.devices[address] = device
+        return self
+
+    def probe(self, visca):
+        """
+        one version inquiry to every device, in chain order: the bus map
+        is still good if each answers with the model we know (and those
+        that did not answer at enumeration still do not). A device added
+        after the last one is not noticed.
+        """
+        if not self.devices:
+            return False
+        for device in self:
+            version = visca.inquiry_version(device.address)
+            found = version[:2] if version is not None else (None, None)
+            if found != (device.vendor, device.model):
+                return False
+        return True
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'devices': [d.to_dict() for d in self]}, f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(ViscaDevice.from_dict(d) for d in data.get('devices', []))
@@ -0,0 +1,233 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Sessions: several calls sent as one batch.
+#
+#   with visca.session(1) as s:
+#       s.cmd_cam_lr_reverse_on()
+#       s.cmd_cam_hires_on()
+#       visca.cmd_cam_backlight_on(1)      # direct calls are batched too
+#   s.ok, s.replies, s.errors
+#
+# A call the profile of the device rejects (see profiles.py) is not sent,
+# its reply is the syntax error the camera would have sent, so replies
+# and errors still line up with the calls.
+#
+# Inside the block the calls are only encoded (ViscaControl.capturing())
+# and return None. When the block ends the bus lock is taken and the
+# commands are pipelined: the next one is written as soon as the camera
+# ACKed the previous one, up to one command per camera socket in flight,
+# and the protocol routes every COMPLETION back to its command by socket.
+#
+# The lock is held at most max_hold seconds: after that no new command is
+# started, the lock is released once the commands in flight completed and
+# the rest of the batch goes on after whoever was waiting (telemetry
+# polling, ...) had its turn.
+#
+
+import time
+
+from .packet import ACK, COMPLETION, REPLY, ERROR
+from .protocol import TIMEOUT, encode_reply
+
+# camera command sockets, when the registry does not know better
+DEFAULT_SOCKETS = 2
+
+SYNTAX_ERROR = 0x02
+BUFFER_FULL = 0x03
+
+
+class SessionStep():
+
+    __slots__ = ('recipient', 'packet', 'inquiry', 'acked', 'reply', 'error')
+
+    def __init__(self, recipient, packet, inquiry):
+        self.recipient = recipient
+        self.packet = packet
+        self.inquiry = inquiry
+        self.acked = False
+        self.reply = None
+        self.error = None
+        if packet is None:
+            # rejected before going on the bus
+            self.reply = encode_reply(recipient, b'\x60\x02')
+            self.error = SYNTAX_ERROR
+
+    @property
+    def done(self):
+        return self.reply is not None or self.error is not None
+
+
+class Session():
+
+    # pause between two holds of the lock, so the threads waiting for it
+    # can actually get it
+    YIELD = 0.001
+
+    def __init__(self, visca, device=1, max_hold=0.25):
+        self.visca = visca
+        self.device = device
+        self.max_hold = max_hold
+        self.steps = []
+        # COMPLETION / inquiry reply / error packet of every call, in order
+        self.replies = []
+        # index of the call -> error code ('timeout' if it never finished)
+        self.errors = {}
+        # seconds the lock was held each time
+        self.holds = []
+        self.elapsed = None
+        self._capture = None
+
+    def __getattr__(self, name):
+        """
+        s.cmd_cam_xxx(args) is visca.cmd_cam_xxx(device, args)
+        """
+        if not (name.startswith('cmd_') or name.startswith('inquiry_')):
+            raise AttributeError(name)
+        method = getattr(self.visca, name)
+
+        def call(*args):
+            return method(self.device, *args)
+        call.__name__ = name
+        return call
+
+    def __enter__(self):
+        self._capture = self.visca.capturing()
+        self._packets = self._capture.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._capture.__exit__(exc_type, exc, tb)
+        self._capture = None
+        if exc_type is None:
+            self.steps = [SessionStep(*p) for p in self._packets]
+            self.run()
+        return False
+
+    @property
+    def ok(self):
+        return not self.errors and all(r is not None for r in self.replies)
+
+    def _window(self, recipient):
+        registry = self.visca.registry
+        device = registry.get(recipient) if registry is not None else None
+        if device is not None and device.sockets:
+            return device.sockets
+        return DEFAULT_SOCKETS
+
+    def _update(self, event):
+        step = event.owner
+        if not isinstance(step, SessionStep):
+            return
+        if event.type == ACK:
+            step.acked = True
+        elif event.type in (COMPLETION, REPLY):
+            step.reply = event.raw
+        elif event.type == ERROR:
+            step.reply = event.raw
+            step.error = event.packet.error_code
+        elif event.type == TIMEOUT:
+            step.error = 'timeout'
+
+    def _read(self):
+        """
+        one packet from the port, False on timeout
+        """
+        event = self.visca.recv_event("session")
+        self._update(event)
+        return event.type != TIMEOUT
+
+    def _send(self, step):
+        visca = self.visca
+        visca.protocol.start(step.recipient, step.inquiry, step)
+        sent = time.monotonic()
+        visca.write_raw(step.packet, "sent: session")
+        rx_bytes = 0
+        while True:
+            event = visca.recv_event("session")
+            rx_bytes += len(event.raw)
+            self._update(event)
+            if event.final:
+                break
+        visca.finish_request(step.recipient, step.inquiry, sent, time.monotonic(),
+                             len(step.packet), rx_bytes, event.raw)
+
+    def run(self):
+        visca = self.visca
+        queue = [s for s in self.steps if s.packet is not None]
+        started = time.monotonic()
+
+        while queue:
+            visca.mutex.acquire()
+            held = time.monotonic()
+            try:
+                while visca.transport.in_waiting():
+                    visca.recv_packet("ignored")
+
+                in_flight = []
+                sent = 0
+                # at least one call per hold, whatever max_hold says
+                while queue and (not sent or time.monotonic() - held < self.max_hold):
+                    step = queue[0]
+                    if not step.inquiry and len(in_flight) >= self._window(step.recipient):
+                        if not self._read():
+                            break
+                        in_flight = [s for s in in_flight if not s.done]
+                        continue
+                    del queue[0]
+                    self._send(step)
+                    sent += 1
+                    if step.error == BUFFER_FULL and in_flight:
+                        # the camera has less sockets than we thought,
+                        # wait for a completion and send it again
+                        step.error = None
+                        step.reply = None
+                        queue.insert(0, step)
+                        self._read()
+                    elif step.acked and not step.done:
+                        in_flight.append(step)
+                    in_flight = [s for s in in_flight if not s.done]
+
+                # collect the completions before letting anybody else in
+                while any(not s.done for s in in_flight):
+                    if not self._read():
+                        break
+            finally:
+                visca.mutex.release()
+                self.holds.append(time.monotonic() - held)
+
+            if queue:
+                time.sleep(self.YIELD)
+
+        self.elapsed = time.monotonic() - started
+        self.replies = [s.reply for s in self.steps]
+        self.errors = {}
+        for i, step in enumerate(self.steps):
+            if step.error is not None:
+                self.errors[i] = step.error
+            elif not step.done:
+                self.errors[i] = 'timeout'
+        return self.replies
@@ -0,0 +1,165 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# A very small daisy chain of cameras living in memory.
+#
+# Setters are remembered per device and opcode and the matching inquiry
+# returns what was set last, which is how the FCB cameras behave for
+# most of the commands implemented in ViscaControl.
+#
+# Packets are framed and built with the same protocol code ViscaControl
+# uses, see protocol.py.
+#
+
+from .packet import Packet, ADDRESS_SET, COMMAND, INQUIRY
+from .protocol import Framer, encode_reply
+
+
+class ViscaSimulator():
+
+    # inquiry replies before anything was set, by category/opcode
+    DEFAULTS = {
+        (0x00, 0x02): b'\x00\x20\x04\x65\x01\x00\x02',  # version
+        (0x04, 0x00): b'\x02',              # power on
+        (0x04, 0x47): b'\x00\x00\x00\x00',  # zoom wide end
+        (0x04, 0x61): b'\x03',              # mirror off
+        (0x04, 0x66): b'\x03',              # flip off
+        (0x04, 0x63): b'\x00',              # picture effect off
+        (0x04, 0x64): b'\x00',              # digital effect off
+        (0x04, 0x33): b'\x03',              # backlight off
+        (0x04, 0x52): b'\x03',              # hires off
+        (0x04, 0x34): b'\x03',              # stabilization off
+        (0x04, 0x39): b'\x00',              # full auto
+        (0x04, 0x4a): b'\x00\x00\x00\x00',  # shutter
+        (0x04, 0x42): b'\x00\x00\x00\x00',  # iris
+        (0x04, 0x62): b'\x03',              # freeze off
+        (0x06, 0x10): b'\x00\x10',          # pan/tilt mode
+        (0x06, 0x11): b'\x18\x17',          # pan/tilt max speed
+    }
+
+    def __init__(self, devices=1):
+        self.devices = devices
+        self.state = [dict(self.DEFAULTS) for i in range(devices + 1)]
+        self.registers = [{} for i in range(devices + 1)]
+        self.pan_tilt = [[0, 0] for i in range(devices + 1)]
+        # every packet received, for tests
+        self.received = []
+        self.framer = Framer()
+
+    def _nibbles(self, value):
+        value &= 0xffff
+        return bytes([(value >> 12) & 0xf, (value >> 8) & 0xf, (value >> 4) & 0xf, value & 0xf])
+
+    def _word(self, data, signed=True):
+        value = (data[0] << 12) | (data[1] << 8) | (data[2] << 4) | data[3]
+        if signed and value & 0x8000:
+            value -= 0x10000
+        return value
+
+    def _pan_tilt(self, device, data):
+        position = self.pan_tilt[device]
+        opcode = data[0]
+        if opcode == 0x02 and len(data) == 11:
+            position[:] = [self._word(data[3:7]), self._word(data[7:11])]
+        elif opcode == 0x03 and len(data) == 11:
+            position[0] += self._word(data[3:7])
+            position[1] += self._word(data[7:11])
+        elif opcode in (0x04, 0x05):
+            position[:] = [0, 0]
+
+    def _reply(self, device, data):
+        return encode_reply(device, data)
+
+    def receive_data(self, data):
+        """
+        stream version of handle(): takes any chunk of bytes, returns the
+        replies to the packets completed by it
+        """
+        replies = []
+        for packet in self.framer.feed(data):
+            replies += self.handle(packet)
+        return replies
+
+    def handle(self, packet):
+        """
+        returns the list of packets the chain sends back for `packet`
+        """
+        self.received.append(packet)
+        p = Packet(packet)
+
+        if p.broadcast:
+            if p.type == ADDRESS_SET:
+                # address set: every device takes one, the rest comes back
+                return [bytes([0x88, 0x30, packet[2] + self.devices, 0xff])]
+            # any other broadcast just goes around the chain
+            replies = []
+            if p.type == COMMAND:
+                for device in range(1, self.devices + 1):
+                    replies += self._execute(device, p)
+            return [packet] + replies
+
+        device = p.recipient
+        if device < 1 or device > self.devices:
+            # nobody there, the packet is lost
+            return []
+        return self._execute(device, p)
+
+    def _execute(self, device, p):
+        if len(p) < 4 or not p.terminated:
+            return [self._reply(device, b'\x60\x02')]
+
+        kind = p.type
+        category = p.view[2]
+        data = bytes(p.data)
+        if not data:
+            return [self._reply(device, b'\x60\x02')]
+        opcode = data[0]
+
+        if kind == COMMAND:
+            if category == 0x04 and opcode == 0x24 and len(data) == 4:
+                self.registers[device][data[1]] = data[2:4]
+            elif category == 0x06 and opcode in (0x02, 0x03, 0x04, 0x05):
+                self._pan_tilt(device, data)
+            elif category == 0x04 and opcode == 0x07:
+                # variable speed zoom has no inquiry of its own
+                pass
+            else:
+                self.state[device][(category, opcode)] = data[1:]
+            return [self._reply(device, b'\x41'), self._reply(device, b'\x51')]
+
+        if kind == INQUIRY:
+            if category == 0x04 and opcode == 0x24 and len(data) == 2:
+                value = self.registers[device].get(data[1], b'\x00\x00')
+            elif category == 0x06 and opcode == 0x12:
+                pan, tilt = self.pan_tilt[device]
+                value = self._nibbles(pan) + self._nibbles(tilt)
+            else:
+                value = self.state[device].get((category, opcode))
+            if value is None:
+                return [self._reply(device, b'\x60\x02')]
+            return [self._reply(device, b'\x50' + value)]
+
+        return [self._reply(device, b'\x60\x02')]
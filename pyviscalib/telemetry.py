@@ -0,0 +1,323 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Camera state in shared memory.
+#
+# The process owning the port runs a TelemetryPublisher: it polls the
+# zoom position (every slot) and the mode inquiries (one every
+# `modes_every` slots) and writes the latest values to a small memory
+# mapped file. Any number of local processes open it with a
+# TelemetryReader and read it without locks, system calls or bus traffic.
+#
+# Layout (little endian, 64 bytes):
+#
+#    0  magic 'VTLM', version (2), reserved (2)
+#    8  sequence (8)            odd while the publisher is writing
+#   16  state, see STATE        updated, updates, zoom raw, zoom index,
+#                               power, mirror, flip, backlight, hires,
+#                               stabilization, picture effect, ae mode
+#
+# A reader copies the state between two reads of the sequence and keeps
+# the copy only if the sequence was even and did not change (seqlock).
+# Flags are 1 / 0, -1 when not known (yet); stabilization is 2 on hold.
+#
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+MAGIC = b'VTLM'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHH')
+SEQUENCE = struct.Struct('<Q')
+STATE = struct.Struct('<dQIhbbbbbbhh')
+
+SEQUENCE_OFFSET = HEADER.size
+STATE_OFFSET = SEQUENCE_OFFSET + SEQUENCE.size
+SIZE = 64
+
+FIELDS = ('updated', 'updates', 'zoom_raw', 'zoom_index', 'power', 'mirror',
+          'flip', 'backlight', 'hires', 'stabilization', 'picture_effect',
+          'ae_mode')
+
+UNKNOWN_ZOOM = 0xffffffff
+UNKNOWN = -1
+
+
+class TelemetryError(Exception):
+    pass
+
+
+def default_path(device=1):
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'pyvisca-telemetry-%d' % device)
+
+
+def _flag(value):
+    if value is None:
+        return UNKNOWN
+    if value == 'Hold':
+        return 2
+    return 1 if value else 0
+
+
+def _byte(value):
+    if value is None:
+        return UNKNOWN
+    if isinstance(value, (bytes, bytearray)):
+        return value[0] if len(value) == 1 else UNKNOWN
+    return value
+
+
+class TelemetryState():
+
+    __slots__ = FIELDS + ('sequence',)
+
+    def __init__(self, sequence, values):
+        self.sequence = sequence
+        for name, value in zip(FIELDS, values):
+            setattr(self, name, value)
+
+    def age(self, now=None):
+        """
+        seconds since the publisher last wrote (monotonic clock, the same
+        for every process on the machine)
+        """
+        if now is None:
+            now = time.monotonic()
+        return now - self.updated
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in FIELDS)
+
+    def __repr__(self):
+        return 'TelemetryState(%s)' % ', '.join('%s=%s' % (n, getattr(self, n)) for n in FIELDS)
+
+
+class TelemetryPublisher():
+
+    # field -> inquiry, polled round robin
+    MODES = (
+        ('power', 'inquiry_power', _flag),
+        ('mirror', 'inquiry_mirror_mode', _flag),
+        ('flip', 'inquiry_flip_mode', _flag),
+        ('backlight', 'inquiry_backlight_mode', _flag),
+        ('hires', 'inquiry_hires_mode', _flag),
+        ('stabilization', 'inquiry_image_stabilization', _flag),
+        ('picture_effect', 'inquiry_picture_effect', _byte),
+        ('ae_mode', 'inquiry_AEMode', _byte),
+    )
+
+    def __init__(self, visca, device=1, path=None, rate=25, modes_every=5, log=None,
+                 consumer='telemetry'):
+        """
+        rate        = inquiries per second (slots)
+        modes_every = one mode inquiry after this many zoom slots
+        log         = a telemetrylog.TelemetryLog the mode flags are
+                      appended to (zoom positions are logged by
+                      visca.telemetry_log)
+        consumer    = name of the polling on visca.bandwidth, slots over
+                      its budget are skipped
+        """
+        self.visca = visca
+        self.device = device
+        self.path = path or default_path(device)
+        self.rate = float(rate)
+        self.modes_every = modes_every
+        self.log = log
+        self.consumer = consumer
+        # slots skipped because of the bandwidth budget
+        self.thinned = 0
+
+        self.values = dict((name, UNKNOWN) for name in FIELDS)
+        self.values['updated'] = 0.0
+        self.values['updates'] = 0
+        self.values['zoom_raw'] = UNKNOWN_ZOOM
+        self._sequence = 0
+        # publish() may be called from other threads than the poller,
+        # the seqlock takes one writer at a time
+        self._lock = threading.Lock()
+        self._mode = 0
+        self._exit = False
+        self._thread = None
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self._mm = mmap.mmap(fd, SIZE, access=mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, 0)
+        self._write()
+
+    def close(self):
+        self.stop()
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def unlink(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _write(self):
+        mm = self._mm
+        self._sequence += 1
+        SEQUENCE.pack_into(mm, SEQUENCE_OFFSET, self._sequence)
+        values = self.values
+        STATE.pack_into(mm, STATE_OFFSET, *[values[name] for name in FIELDS])
+        self._sequence += 1
+        SEQUENCE.pack_into(mm, SEQUENCE_OFFSET, self._sequence)
+
+    def publish(self, **values):
+        """
+        writes new values, e.g. publish(zoom_raw=..., zoom_index=...)
+        for a process that polls the camera on its own. Safe to call
+        from any thread, returns the time written as `updated`
+        """
+        for name in values:
+            if name not in FIELDS:
+                raise TelemetryError("unknown telemetry field '%s'" % name)
+        with self._lock:
+            self.values.update(values)
+            updated = self.values['updated'] = time.monotonic()
+            self.values['updates'] += 1
+            self._write()
+        return updated
+
+    def poll_zoom(self):
+        raw = self.visca.inquiry_precise_zoom_position(self.device)
+        if raw is None:
+            return False
+        self.publish(zoom_raw=raw, zoom_index=self.visca.zoom_index(raw, self.device))
+        return True
+
+    def poll_mode(self):
+        name, inquiry, convert = self.MODES[self._mode % len(self.MODES)]
+        self._mode += 1
+        value = convert(getattr(self.visca, inquiry)(self.device))
+        updated = self.publish(**{name: value})
+        if self.log is not None:
+            self.log.record(self.device, name, updated, value)
+
+    def start(self):
+        self._exit = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._exit = True
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        period = 1.0 / self.rate
+        deadline = time.monotonic()
+        slot = 0
+        bandwidth = self.visca.bandwidth
+        while not self._exit:
+            if not bandwidth.admit(self.consumer):
+                self.thinned += 1
+            else:
+                with bandwidth.consumer(self.consumer):
+                    if self.modes_every and slot % (self.modes_every + 1) == self.modes_every:
+                        self.poll_mode()
+                    else:
+                        self.poll_zoom()
+                slot += 1
+            deadline += period
+            now = time.monotonic()
+            if now > deadline:
+                # too slow for the rate, don't burst to catch up
+                deadline = now
+            time.sleep(max(0, deadline - time.monotonic()))
+
+
+class TelemetryReader():
+
+    def __init__(self, path=None, device=1):
+        self.path = path or default_path(device)
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            self._mm = mmap.mmap(fd, SIZE, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        magic, version, reserved = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise TelemetryError("%s is not a telemetry file" % self.path)
+        if version != VERSION:
+            self._mm.close()
+            raise TelemetryError("%s is telemetry version %d, not %d" % (self.path, version, VERSION))
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_values(self, spins=10000):
+        """
+        (sequence, values tuple in FIELDS order), None if the publisher
+        kept writing (or died while writing) for `spins` tries
+        """
+        mm = self._mm
+        for i in range(spins):
+            before = SEQUENCE.unpack_from(mm, SEQUENCE_OFFSET)[0]
+            if before & 1:
+                continue
+            values = STATE.unpack_from(mm, STATE_OFFSET)
+            if SEQUENCE.unpack_from(mm, SEQUENCE_OFFSET)[0] == before:
+                return before, values
+        return None
+
+    def read(self):
+        """
+        the latest TelemetryState, None if no consistent copy was read
+        """
+        result = self.read_values()
+        if result is None:
+            return None
+        return TelemetryState(*result)
+
+    def zoom(self):
+        """
+        (raw zoom position, zoom index), the fast path for overlays
+        """
+        result = self.read_values()
+        if result is None:
+            return None
+        values = result[1]
+        return values[2], values[3]
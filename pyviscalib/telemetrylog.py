@@ -0,0 +1,302 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Long running logs of zoom positions and mode flags.
+#
+#   log = TelemetryLog('zoom.vlog')
+#   visca.telemetry_log = log        # every zoom inquiry is logged
+#   ...
+#   log.close()
+#
+#   columns = load('zoom.vlog')       # NumPy arrays when available
+#   time, raw, step, magnification = decode_zoom('zoom.vlog', device=1)
+#
+# The file is append only and columnar: rows are buffered and written as
+# blocks, every block holds its rows column by column so a reader maps a
+# whole column with one frombuffer():
+#
+#   header: 'VTLG' version (2) reserved (2)
+#   block:  rows (4) reserved (4)
+#           time    float64 * rows     monotonic clock
+#           value   int32 * rows       raw value (zoom: the 4 nibbles
+#                                      as one big endian integer)
+#           device  uint8 * rows
+#           field   uint8 * rows       ZOOM, POWER, ...
+#
+# A block cut short by a crash is ignored by the reader.
+#
+# The zoom decoder maps raw positions to the closest ZOOM_SETTINGS step
+# (the same answer as ViscaControl.zoom_index) with searchsorted over the
+# whole column, and the step to the magnification: optical steps 0..29
+# are 1x..30x, the digital steps after them 2x..12x of 30x.
+#
+
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = b'VTLG'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHH')
+BLOCK = struct.Struct('<II')
+# time + value + device + field
+ROW_SIZE = 8 + 4 + 1 + 1
+
+# field column values
+ZOOM = 0
+POWER = 1
+MIRROR = 2
+FLIP = 3
+BACKLIGHT = 4
+HIRES = 5
+STABILIZATION = 6
+PICTURE_EFFECT = 7
+AE_MODE = 8
+
+FIELD_NAMES = {ZOOM: 'zoom', POWER: 'power', MIRROR: 'mirror', FLIP: 'flip',
+               BACKLIGHT: 'backlight', HIRES: 'hires',
+               STABILIZATION: 'stabilization', PICTURE_EFFECT: 'picture_effect',
+               AE_MODE: 'ae_mode'}
+FIELDS = dict((name, field) for field, name in FIELD_NAMES.items())
+
+OPTICAL_STEPS = 30
+
+
+class TelemetryLogError(Exception):
+    pass
+
+
+def zoom_table(profile=None):
+    """
+    ZOOM_SETTINGS (or the zoom table of a profiles.CameraProfile) as
+    sorted integers, like ViscaControl.ZOOM_SETTINGS_INT
+    """
+    if profile is not None and profile.zoom_settings is not None:
+        return profile.zoom_tables()[0]
+    from .visca import ViscaControl
+    return [struct.unpack('>I', a)[0] for a in ViscaControl.ZOOM_SETTINGS]
+
+
+class TelemetryLog():
+
+    def __init__(self, path, block_size=4096):
+        """
+        rows are written in blocks of block_size (and by flush()/close())
+        """
+        self.path = path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._new_columns()
+
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'ab')
+        if new:
+            self._file.write(HEADER.pack(MAGIC, VERSION, 0))
+            self._file.flush()
+        else:
+            with open(path, 'rb') as f:
+                magic, version, reserved = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                self._file.close()
+                raise TelemetryLogError("%s is not a telemetry log" % path)
+
+    def _new_columns(self):
+        self._time = array('d')
+        self._value = array('i')
+        self._device = array('B')
+        self._field = array('B')
+
+    def record(self, device, field, t, value):
+        """
+        field = ZOOM, POWER, ... or its name
+        """
+        if not isinstance(field, int):
+            field = FIELDS[field]
+        with self._lock:
+            self._time.append(t)
+            self._value.append(value)
+            self._device.append(device)
+            self._field.append(field)
+            if len(self._time) >= self.block_size:
+                self._write_block()
+
+    def record_zoom(self, device, t, raw):
+        self.record(device, ZOOM, t, raw)
+
+    def _write_block(self):
+        rows = len(self._time)
+        if not rows:
+            return
+        columns = [self._time, self._value, self._device, self._field]
+        if sys.byteorder == 'big':
+            for column in columns:
+                column.byteswap()
+        self._file.write(BLOCK.pack(rows, 0) + b''.join(c.tobytes() for c in columns))
+        self._file.flush()
+        self._new_columns()
+
+    def flush(self):
+        with self._lock:
+            self._write_block()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._write_block()
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _blocks(data):
+    """
+    (offset, rows) of every complete block
+    """
+    magic, version, reserved = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise TelemetryLogError("not a telemetry log")
+    pos = HEADER.size
+    while pos + BLOCK.size <= len(data):
+        rows = BLOCK.unpack_from(data, pos)[0]
+        end = pos + BLOCK.size + rows * ROW_SIZE
+        if end > len(data):
+            break
+        yield pos + BLOCK.size, rows
+        pos = end
+
+
+def load(path):
+    """
+    the columns of a log: {'time', 'value', 'device', 'field'}, NumPy
+    arrays if NumPy is installed, array.array otherwise
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if numpy is not None:
+        parts = dict((name, []) for name in ('time', 'value', 'device', 'field'))
+        for offset, rows in _blocks(data):
+            for name, dtype, size in (('time', '<f8', 8), ('value', '<i4', 4),
+                                      ('device', 'u1', 1), ('field', 'u1', 1)):
+                parts[name].append(numpy.frombuffer(data, dtype, rows, offset))
+                offset += rows * size
+        return dict((name, numpy.concatenate(p) if p else numpy.zeros(0, dtype))
+                    for (name, p), dtype in zip(parts.items(), ('<f8', '<i4', 'u1', 'u1')))
+
+    columns = {'time': array('d'), 'value': array('i'), 'device': array('B'), 'field': array('B')}
+    swap = sys.byteorder == 'big'
+    for offset, rows in _blocks(data):
+        for name in ('time', 'value', 'device', 'field'):
+            column = array(columns[name].typecode)
+            size = column.itemsize * rows
+            column.frombytes(data[offset:offset + size])
+            if swap:
+                column.byteswap()
+            columns[name].extend(column)
+            offset += size
+    return columns
+
+
+def zoom_steps(raw, table=None):
+    """
+    ZOOM_SETTINGS index of every raw zoom position (closest step, ties
+    to the lower one)
+    """
+    if table is None:
+        table = zoom_table()
+
+    if numpy is None:
+        steps = array('i')
+        last = len(table) - 1
+        for value in raw:
+            pos = bisect_left(table, value)
+            if pos == 0:
+                steps.append(0)
+            elif pos > last:
+                steps.append(last)
+            elif table[pos] - value < value - table[pos - 1]:
+                steps.append(pos)
+            else:
+                steps.append(pos - 1)
+        return steps
+
+    table = numpy.asarray(table, dtype=numpy.int64)
+    raw = numpy.asarray(raw, dtype=numpy.int64)
+    pos = numpy.searchsorted(table, raw, side='left')
+    pos = numpy.clip(pos, 1, len(table) - 1)
+    before = table[pos - 1]
+    after = table[pos]
+    steps = numpy.where(after - raw < raw - before, pos, pos - 1)
+    # below the first / above the last setting
+    steps = numpy.where(raw <= table[0], 0, steps)
+    steps = numpy.where(raw >= table[-1], len(table) - 1, steps)
+    return steps
+
+
+def magnification(steps):
+    """
+    zoom factor of ZOOM_SETTINGS steps: 1x..30x optical, then 60x..360x
+    """
+    if numpy is None:
+        return array('i', [s + 1 if s < OPTICAL_STEPS else OPTICAL_STEPS * (s - OPTICAL_STEPS + 2)
+                           for s in steps])
+    steps = numpy.asarray(steps)
+    return numpy.where(steps < OPTICAL_STEPS, steps + 1, OPTICAL_STEPS * (steps - OPTICAL_STEPS + 2))
+
+
+def decode_zoom(path, device=None, profile=None):
+    """
+    (time, raw, step, magnification) of the zoom rows of a log,
+    optionally of one device only, steps of the zoom table of profile
+    """
+    columns = load(path)
+    if numpy is not None:
+        mask = columns['field'] == ZOOM
+        if device is not None:
+            mask &= columns['device'] == device
+        times = columns['time'][mask]
+        raw = columns['value'][mask]
+    else:
+        rows = [i for i in range(len(columns['field']))
+                if columns['field'][i] == ZOOM and (device is None or columns['device'][i] == device)]
+        times = array('d', (columns['time'][i] for i in rows))
+        raw = array('i', (columns['value'][i] for i in rows))
+    steps = zoom_steps(raw, zoom_table(profile))
+    return times, raw, steps, magnification(steps)
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Timing of one request/reply exchange with a device.
+#
+# At 9600 baud every byte takes 10 bits (start + 8 + stop) on the wire,
+# so wire_time is what the bytes cost no matter how fast the camera is;
+# the rest of the round trip is the camera thinking (camera_time).
+#
+
+class Transaction():
+
+    __slots__ = ('recipient', 'inquiry', 'sent', 'received',
+                 'tx_bytes', 'rx_bytes', 'wire_time')
+
+    def __init__(self, recipient, inquiry, sent, received, tx_bytes, rx_bytes, wire_time):
+        self.recipient = recipient
+        self.inquiry = inquiry
+        # time.monotonic() when the request was written / the reply read
+        self.sent = sent
+        self.received = received
+        self.tx_bytes = tx_bytes
+        self.rx_bytes = rx_bytes
+        self.wire_time = wire_time
+
+    @property
+    def total(self):
+        return self.received - self.sent
+
+    @property
+    def camera_time(self):
+        return max(0.0, self.total - self.wire_time)
+
+    def __repr__(self):
+        return 'Transaction(total=%.1fms, wire=%.1fms, camera=%.1fms)' % (
+            self.total * 1000, self.wire_time * 1000, self.camera_time * 1000)
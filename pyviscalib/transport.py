@@ -0,0 +1,339 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Transports move framed visca packets between ViscaControl and the
+# camera(s). They all look like a (very small) serial port:
+#
+#   open(), close(), is_open(), read(size), write(packet),
+#   in_waiting(), reset()
+#
+# read() blocks up to `timeout` seconds and returns b'' on timeout,
+# exactly like pyserial does.
+#
+
+import socket
+import time
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+from . import viscaip
+
+
+def transport_for(portname, timeout=1):
+    """
+    picks a transport from the port name:
+
+        /dev/ttyUSB0               serial port
+        udp://192.168.0.100:52381  VISCA over IP
+        loop://                    in memory camera simulator
+    """
+    if portname.startswith('udp://'):
+        host, _, port = portname[len('udp://'):].partition(':')
+        return UDPTransport(host, int(port) if port else viscaip.VISCA_IP_PORT, timeout=timeout)
+    if portname.startswith('loop://'):
+        return LoopbackTransport(name=portname, timeout=timeout)
+    return SerialTransport(portname, timeout=timeout)
+
+
+class Transport():
+
+    # True if the devices behind the transport have to be numbered with
+    # an address set broadcast before use (daisy chained serial bus)
+    enumerate_bus = True
+
+    # bits per second on the wire, None if the link is not the bottleneck
+    baudrate = None
+    # start + 8 data + stop bit
+    BITS_PER_BYTE = 10
+
+    def __init__(self, name, timeout=1):
+        self.name = name
+        self.timeout = timeout
+
+    def wire_time(self, nbytes):
+        """
+        seconds `nbytes` occupy the link
+        """
+        if not self.baudrate:
+            return 0.0
+        return nbytes * self.BITS_PER_BYTE / float(self.baudrate)
+
+    def open(self):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def is_open(self):
+        raise NotImplementedError
+
+    def read(self, size=1):
+        raise NotImplementedError
+
+    def write(self, packet):
+        raise NotImplementedError
+
+    def in_waiting(self):
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        drops everything still buffered in both directions
+        """
+        pass
+
+
+class SerialTransport(Transport):
+
+    baudrate = 9600
+
+    def __init__(self, portname, baudrate=9600, timeout=1):
+        Transport.__init__(self, portname, timeout)
+        self.baudrate = baudrate
+        self.serialport = None
+
+    def open(self):
+        if self.serialport is not None:
+            return
+        if serial is None:
+            raise ImportError("pyserial is needed to open '%s'" % self.name)
+        try:
+            self.serialport = serial.Serial(self.name,self.baudrate,timeout=self.timeout,stopbits=1,bytesize=8,rtscts=False, dsrdtr=False)
+            self.serialport.flushInput()
+        except Exception as e:
+            print ("Exception opening serial port '%s' for display: %s\n" % (self.name,e))
+            self.serialport = None
+            raise e
+
+    def close(self):
+        if self.serialport is not None:
+            self.serialport.close()
+            self.serialport = None
+
+    def is_open(self):
+        return self.serialport is not None and self.serialport.isOpen()
+
+    def read(self, size=1):
+        return self.serialport.read(size)
+
+    def write(self, packet):
+        return self.serialport.write(packet)
+
+    def in_waiting(self):
+        return self.serialport.inWaiting()
+
+    def reset(self):
+        self.serialport.reset_input_buffer()
+        self.serialport.reset_output_buffer()
+
+
+class UDPTransport(Transport):
+    """
+    VISCA over IP. Every packet is wrapped with payload type, length and
+    sequence number. The last packet is sent again if nothing at all
+    came back for it after `retransmit` seconds (UDP may lose it), up to
+    `retries` times.
+
+    enumerate_bus=True is needed when talking to a gateway in front of a
+    daisy chain instead of a network camera.
+    """
+
+    enumerate_bus = False
+
+    def __init__(self, host, port=viscaip.VISCA_IP_PORT, timeout=1,
+                 retransmit=0.1, retries=3, enumerate_bus=False):
+        Transport.__init__(self, 'udp://%s:%d' % (host, port), timeout)
+        self.address = (host, port)
+        self.retransmit = retransmit
+        self.retries = retries
+        self.enumerate_bus = enumerate_bus
+        self.sock = None
+        self.seq = 0
+        self._buffer = bytearray()
+        # (seq, datagram, time sent, tries) of the packet waiting for
+        # its first reply
+        self._outstanding = None
+        self._last_packet = None
+        self.retransmits = 0
+
+    def open(self):
+        if self.sock is not None:
+            return
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect(self.address)
+        self.seq = 0
+        self._control(viscaip.CONTROL_RESET)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def is_open(self):
+        return self.sock is not None
+
+    def _control(self, payload):
+        """
+        sends a control command and waits (best effort) for the reply
+        """
+        self.sock.send(viscaip.pack(viscaip.PAYLOAD_CONTROL, self.seq, payload))
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            frame = self._receive(deadline - time.monotonic())
+            if frame and frame[0] == viscaip.PAYLOAD_CONTROL_REPLY:
+                return frame[2]
+        return None
+
+    def _receive(self, timeout):
+        """
+        returns one (payload_type, seq, payload) or None on timeout
+        """
+        self.sock.settimeout(max(timeout, 0))
+        try:
+            datagram = self.sock.recv(1024)
+        except (socket.timeout, BlockingIOError):
+            return None
+        except ConnectionRefusedError:
+            # nobody listening (yet), don't spin
+            time.sleep(min(max(timeout, 0), 0.01))
+            return None
+        return viscaip.unpack(datagram)
+
+    def _handle(self, frame):
+        payload_type, seq, payload = frame
+        if payload_type == viscaip.PAYLOAD_REPLY:
+            if self._outstanding and self._outstanding[0] == seq:
+                self._outstanding = None
+            self._buffer += payload
+        elif payload_type == viscaip.PAYLOAD_CONTROL_REPLY:
+            if payload == viscaip.CONTROL_ERROR_SEQUENCE:
+                # camera lost track of our numbering, start over and resend
+                self.seq = 0
+                self._control(viscaip.CONTROL_RESET)
+                if self._outstanding:
+                    self._send_packet(self._last_packet)
+
+    def _send_packet(self, packet):
+        self.seq = viscaip.next_sequence(self.seq)
+        datagram = viscaip.pack(viscaip.payload_type_for(packet), self.seq, packet)
+        self._last_packet = packet
+        self._outstanding = (self.seq, datagram, time.monotonic(), 0)
+        self.sock.send(datagram)
+
+    def _retransmit_due(self, now):
+        if not self._outstanding:
+            return None
+        seq, datagram, sent, tries = self._outstanding
+        if tries >= self.retries:
+            return None
+        return sent + self.retransmit
+
+    def read(self, size=1):
+        deadline = time.monotonic() + self.timeout
+        while len(self._buffer) < size:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wait = deadline - now
+            due = self._retransmit_due(now)
+            if due is not None:
+                if due <= now:
+                    seq, datagram, sent, tries = self._outstanding
+                    self._outstanding = (seq, datagram, now, tries + 1)
+                    self.retransmits += 1
+                    self.sock.send(datagram)
+                    continue
+                wait = min(wait, due - now)
+            frame = self._receive(wait)
+            if frame:
+                self._handle(frame)
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def write(self, packet):
+        self._send_packet(packet)
+        return len(packet)
+
+    def in_waiting(self):
+        while True:
+            frame = self._receive(0)
+            if not frame:
+                break
+            self._handle(frame)
+        return len(self._buffer)
+
+    def reset(self):
+        if self.sock is not None:
+            self.in_waiting()
+        self._buffer = bytearray()
+        self._outstanding = None
+
+
+class LoopbackTransport(Transport):
+    """
+    in memory transport, every packet written is handed to `responder`
+    (by default a ViscaSimulator) and its replies can be read back
+    immediately. Handy for tests and for trying out code without a camera.
+    """
+
+    def __init__(self, responder=None, name='loop://', timeout=1):
+        Transport.__init__(self, name, timeout)
+        if responder is None:
+            from .simulator import ViscaSimulator
+            responder = ViscaSimulator()
+        self.responder = responder
+        self._buffer = bytearray()
+        self._open = False
+
+    def open(self):
+        self._open = True
+
+    def close(self):
+        self._open = False
+
+    def is_open(self):
+        return self._open
+
+    def read(self, size=1):
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def write(self, packet):
+        for reply in self.responder.handle(bytes(packet)):
+            self._buffer += reply
+        return len(packet)
+
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def reset(self):
+        self._buffer = bytearray()
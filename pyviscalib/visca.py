@@ -23,117 +23,132 @@
 
 """PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
 
-import serial,sys
+import sys
 from _thread import allocate_lock
 import struct
 import time
+import os
+import threading
+from contextlib import contextmanager
+
+from .transport import transport_for
+from .registry import DeviceRegistry
+from .packet import Packet, word_from_nibbles, raw_word
+from .history import ZoomHistory
+from .protocol import ViscaProtocol, describe, encode_reply
+from .timing import Transaction
+from .session import Session
+from .bandwidth import BandwidthManager
+from .profiles import FCB_EV7500
+from . import profiles
 
 class ViscaControl():
     
     DEBUG = False
+
+    # device number addressing every device on the chain
+    BROADCAST = -1
     
-    REGISTER_NAMES = {'mode': b'\x72'}
-    
-    REGISTER_VALUES = { b'\x72':
-        { b'\x01' : '1080i/59.94',
-          #b'\x02' : 'Reserved',
-          b'\x03' : 'NTSC Analog',
-          b'\x04' : '1080i/50',
-          b'\x05' : 'PAL Analog',
-          b'\x06' : '1080p/29.97',
-          #b'\x07' : 'Reserved',
-          b'\x08' : '1080p/25',
-          b'\x09' : '720p/59.94',
-          #b'\x0A' : 'Reserved',
-          #b'\x0B' : 'Reserved',
-          b'\x0C' : '720p/50',
-          #b'\x0D' : 'Reserved',
-          b'\x0E' : '720p/29.97',
-          #b'\x0F' : 'Reserved',
-          #b'\x10' : 'Reserved',
-          b'\x11' : '720p/25',
-          #b'\x12' : 'Reserved',
-          b'\x13' : '1080p/59.94',
-          b'\x14' : '1080p/50',
-        }
-        }
-    
-    OPTICAL_ZOOM_SETTINGS = [
-        b'\x00\x00\x00\x00',
-        b'\x01\x06\x0A\x01',
-        b'\x02\x00\x06\x03',
-        b'\x02\x06\x02\x08',
-        b'\x02\x0A\x01\x0D',
-        b'\x02\x0D\x01\x03',
-        b'\x02\x0F\x06\x0D',
-        b'\x03\x01\x06\x01',
-        b'\x03\x03\x00\x0D',
-        b'\x03\x04\x08\x06',
-        b'\x03\x05\x0D\x07',
-        b'\x03\x07\x00\x09',
-        b'\x03\x08\x02\x00',
-        b'\x03\x09\x02\x00',
-        b'\x03\x0A\x00\x0A',
-        b'\x03\x0A\x0D\x0D',
-        b'\x03\x0B\x09\x0C',
-        b'\x03\x0C\x04\x06',
-        b'\x03\x0C\x0D\x0C',
-        b'\x03\x0D\x06\x00',
-        b'\x03\x0D\x0D\x04',
-        b'\x03\x0E\x03\x09',
-        b'\x03\x0E\x09\x00',
-        b'\x03\x0E\x0D\x0C',
-        b'\x03\x0F\x01\x0E',
-        b'\x03\x0F\x05\x07',
-        b'\x03\x0F\x08\x0A',
-        b'\x03\x0F\x0B\x06',
-        b'\x03\x0F\x0D\x0C',
-        b'\x04\x00\x00\x00'
-        ]
-
-    DIGITAL_ZOOM_SETTINGS = [
-        b'\x04\x00\x00\x00',
-        b'\x06\x00\x00\x00',
-        b'\x06\x0A\x08\x00',
-        b'\x07\x00\x00\x00',
-        b'\x07\x03\x00\x00',
-        b'\x07\x05\x04\x00',
-        b'\x07\x06\x0C\x00',
-        b'\x07\x08\x00\x00',
-        b'\x07\x08\x0C\x00',
-        b'\x07\x09\x08\x00',
-        b'\x07\x0A\x00\x00',
-        b'\x07\x0A\x0C\x00',
-        ]
-        
+    # the FCB-EV7500 tables, profiles.py has them per model
+    REGISTER_NAMES = FCB_EV7500.registers
+    REGISTER_VALUES = FCB_EV7500.register_values
+    OPTICAL_ZOOM_SETTINGS = FCB_EV7500.optical_zoom
+    DIGITAL_ZOOM_SETTINGS = FCB_EV7500.digital_zoom
+
     ZOOM_SETTINGS = OPTICAL_ZOOM_SETTINGS + DIGITAL_ZOOM_SETTINGS[1:]
     ZOOM_SETTINGS_INT = None
+    ZOOM_SETTINGS_INDEX = None
 
-    __instance = None
+    # one instance per port: two ViscaControl for the same port would
+    # fight over it, different ports (or transports) are fine. A
+    # transport object is its own port: two UDP clients of the same
+    # gateway have the same name but are two links.
+    __instances = {}
     started = False
     def __new__(cls, *args, **kwargs):
-        if ViscaControl.__instance is None:
-            ViscaControl.__instance = object.__new__(cls)
-        return ViscaControl.__instance
+        transport = kwargs.get('transport')
+        if transport is not None:
+            for instance in ViscaControl.__instances.values():
+                if instance.__dict__.get('transport') is transport:
+                    return instance
+            key = ('transport', id(transport))
+        elif args:
+            key = args[0]
+        else:
+            key = kwargs.get('portname', "/dev/ttyUSB0")
+        if key not in ViscaControl.__instances:
+            ViscaControl.__instances[key] = object.__new__(cls)
+        return ViscaControl.__instances[key]
 
 
-    def __init__(self,portname="/dev/ttyUSB0", timeout=1):
+    def __init__(self,portname="/dev/ttyUSB0", timeout=1, transport=None):
+        """
+        portname selects the transport: a serial device, 
+        udp://host[:port] for VISCA over IP or loop:// for the in memory
+        simulator. An already built transport can be passed instead.
+        """
         if self.started:
             return
 
+        if transport is not None:
+            portname = transport.name
+        else:
+            transport = transport_for(portname, timeout)
         self.portname = portname
         self.timeout = timeout
+        self.transport = transport
+        self.protocol = ViscaProtocol()
+        # device -> ZoomHistory
+        self.zoom_histories = {}
+        # a telemetrylog.TelemetryLog to append the zoom positions to
+        self.telemetry_log = None
+        # wire time of everything sent and received, budgets
+        self.bandwidth = BandwidthManager(transport)
+        # a watchdog.HealthWatchdog seeing every transaction
+        self.watchdog = None
+        # device -> profiles.CameraProfile, set by inquiry_version
+        self.profiles = {}
+        # calls rejected by a profile without going on the bus
+        self.rejected = 0
+        # per thread: timing of the last transaction, timed() collector
+        self._local = threading.local()
         
-    def start(self):
+    def start(self, bus_map=None):
+        """
+        bus_map = path of a json file with the devices found last time
+        (see registry.py). If the chain still matches it, the enumeration
+        is skipped; otherwise the bus is enumerated and the file rewritten.
+        """
         if self.started:
             return
 
         self.ZOOM_SETTINGS_INT = [ struct.unpack('>I', a)[0] for a in self.ZOOM_SETTINGS]
+        self.ZOOM_SETTINGS_INDEX = {}
+        for i, a in enumerate(self.ZOOM_SETTINGS_INT):
+            self.ZOOM_SETTINGS_INDEX.setdefault(a, i)
             
-        self.serialport=None
         self.mutex = allocate_lock()
-        self.portname=self.portname
         self.open_port(self.timeout)
+        # number of devices on the bus, updated by cmd_adress_set
+        self.devices = 1
+        self.registry = None
+
+        if not self.transport.enumerate_bus:
+            # network cameras have a fixed address, nothing to number
+            self.started = True
+            if bus_map:
+                self._load_bus_map(bus_map)
+            return
+
+        if bus_map and os.path.exists(bus_map):
+            registry = DeviceRegistry.load(bus_map)
+            if registry.probe(self):
+                print ("debug: bus map %s still valid, %i devices" % (bus_map, len(registry)))
+                self.registry = registry
+                self.devices = len(registry)
+                self._select_profiles()
+                self.started = True
+                return
             
         while True:
             try:
@@ -144,12 +159,81 @@ class ViscaControl():
                 print ("exception during serial init %s. Retrying..." %e)
                 #self.mutex.release()
                 pass
+
+        if bus_map:
+            self.enumerate_devices(bus_map, count=self.devices)
+
+    def _load_bus_map(self, bus_map):
+        if os.path.exists(bus_map):
+            self.registry = DeviceRegistry.load(bus_map)
+            self._select_profiles()
+        else:
+            self.enumerate_devices(bus_map, count=self.devices)
+
+    def enumerate_devices(self, bus_map=None, count=None):
+        """
+        fills self.registry with model/version/capabilities of every
+        device on the bus and saves it to bus_map if given.
+        count = devices already numbered, None sends an address set
+        """
+        registry = DeviceRegistry().enumerate(self, count)
+        self.devices = len(registry)
+        if bus_map:
+            registry.save(bus_map)
+        self.registry = registry
+        self._select_profiles()
+        return registry
+
+    def _select_profiles(self):
+        for device in self.registry:
+            if device.vendor is not None:
+                self.set_profile(device.address, profiles.find(device.vendor, device.model))
+
+    def profile(self, device):
+        """
+        the CameraProfile of device, None if its model is not known
+        """
+        return self.profiles.get(device)
+
+    def set_profile(self, device, profile):
+        """
+        profile = a CameraProfile, the name of a known one or None to
+        stop checking the calls to device
+        """
+        if isinstance(profile, str):
+            name = profile
+            profile = profiles.find_name(name)
+            if profile is None:
+                raise profiles.ProfileError("unknown profile %s" % name)
+        if profile is None:
+            self.profiles.pop(device, None)
+        else:
+            self.profiles[device] = profile
+
+    def _reject(self, device, reason):
+        """
+        the syntax error reply the camera would send, without asking it
+        """
+        self.rejected += 1
+        if self.DEBUG:
+            print ("rejected: %s" % reason)
+        capture = getattr(self._local, 'capture', None)
+        if capture is not None:
+            # keeps the captured packets in step with the calls
+            capture.append((device, None, False))
+        return encode_reply(device, b'\x60\x02')
+
+    def _out_of_range(self, device, name, value):
+        profile = self.profiles.get(device)
+        if profile is not None and not profile.in_range(name, value):
+            return self._reject(device, "%s: %s %s out of range" % (profile.name, name, value))
+        return None
                 
     #TO BE TESTED
     def reset_and_reopen(self):
-        self.serialport.close()
+        self.transport.close()
         #This is already called inside a lock
-        self.open_port(lock = False)
+        self.open_port(self.timeout, lock = False)
         
 
     def open_port(self, timeout, lock = True):
@@ -157,147 +241,104 @@ class ViscaControl():
         if lock :
             self.mutex.acquire()
 
-        if (self.serialport == None):
-            try:
-                self.serialport = serial.Serial(self.portname,9600,timeout=timeout,stopbits=1,bytesize=8,rtscts=False, dsrdtr=False)
-                self.serialport.flushInput()
-            except Exception as e:
-                print ("Exception opening serial port '%s' for display: %s\n" % (self.portname,e))
-                raise e
-                self.serialport = None
-        
-        self.serialport.reset_input_buffer()
-        self.serialport.reset_output_buffer()
-        
-        if lock :
-            self.mutex.release()
+        try:
+            if not self.transport.is_open():
+                self.transport.timeout = timeout
+                self.transport.open()
+            self.transport.reset()
+        finally:
+            if lock :
+                self.mutex.release()
 
     def dump(self,packet,title=None):
         if not packet or len(packet)==0 or not self.DEBUG:
             return
+        print ("\n".join(describe(packet,title)))
 
-        header=packet[0]
-        term=packet[-1]
-        qq=packet[1]
-
-        sender = (header&0b01110000)>>4
-        broadcast = (header&0b1000)>>3
-        recipient = (header&0b0111)
-
-        if broadcast:
-            recipient_s="*"
-        else:
-            recipient_s=str(recipient)
-
-        print ("-----")
-        
-        if title:
-            print ("packet (%s) [%d => %s] len=%d: %s" % (title,sender,recipient_s,len(packet),packet))
-        else:
-            print ("packet [%d => %s] len=%d: %s" % (sender,recipient_s,len(packet),packet))
-
-        print (" QQ.........: %02x" % qq)
-
-        if qq==0x01:
-            print ("              (Command)")
-        if qq==0x09:
-            print ("              (Inquiry)")
-
-        if len(packet)>3:
-            rr=(packet[2])
-            print (" RR.........: %02x" % rr)
-
-            if rr==0x00:
-                print ("              (Interface)")
-            if rr==0x04:
-                print ("              (Camera [1])")
-            if rr==0x06:
-                print ("              (Pan/Tilter)")
+    def recv_event(self,extra_title=None):
+        """
+        reads one packet and runs it through the protocol, returns the
+        protocol Event (TIMEOUT if nothing complete arrived in time)
+        """
+        read=self.transport.read
+        protocol=self.protocol
+        while True:
+            s=read(1)
+            if not s:
+                print ("ERROR: Timeout waiting for reply")
+                event=protocol.timeout()
+                break
+            events=protocol.receive_data(s)
+            if events:
+                event=events[0]
+                break
+        if event.raw:
+            self.bandwidth.account(len(event.raw))
 
-        if len(packet)>4:
-            data=packet[3:-1]
-            print (" Data.......: %s" % data)
+        if extra_title:
+            self.dump(event.raw,"recv: %s" % extra_title)
         else:
-            print (" Data.......: None")
-
-        if not term==0xff:
-            print ("ERROR: Packet not terminated correctly")
-            return
-
-        if len(packet)==3 and ((qq & 0b11110000)>>4)==4:
-            socketno = (qq & 0b1111)
-            print (" packet: ACK for socket %02x" % socketno)
-
-        if len(packet)==3 and ((qq & 0b11110000)>>4)==5:
-            socketno = (qq & 0b1111)
-            print (" packet: COMPLETION for socket %02x" % socketno)
-
-        if len(packet)>3 and ((qq & 0b11110000)>>4)==5:
-            socketno = (qq & 0b1111)
-            ret=packet[2:-1]
-            print (" packet: COMPLETION for socket %02x, data=%s" % (socketno,ret))
-
-        if len(packet)==4 and ((qq & 0b11110000)>>4)==6:
-            print (" packet: ERROR!")
-
-            socketno = (qq & 0b00001111)
-            errcode  = packet[2]
-
-            #these two are special, socket is zero and has no meaning:
-            if errcode==0x02 and socketno==0:
-                print ("        : Syntax Error")
-            if errcode==0x03 and socketno==0:
-                print ("        : Command Buffer Full")
-
-
-            if errcode==0x04:
-                print ("        : Socket %i: Command canceled" % socketno)
-
-            if errcode==0x05:
-                print ("        : Socket %i: Invalid socket selected" % socketno)
-
-            if errcode==0x41:
-                print ("        : Socket %i: Command not executable" % socketno)
-
-        if len(packet)==3 and qq==0x38:
-            print ("Network Change - we should immedeately issue a renumbering!")
+            self.dump(event.raw,"recv")
 
+        return event
 
     def recv_packet(self,extra_title=None):
         # read up to 16 bytes until 0xff
-        packet=b''
-        count=0
-        while count<16:
-            s=self.serialport.read(1)
-            if s:
-                count+=1
-                packet=packet+bytes(s)
-            else:
-                print ("ERROR: Timeout waiting for reply")
-                return packet
-            if s==b'\xff':
-                break
-
-        if extra_title:
-            self.dump(packet,"recv: %s" % extra_title)
-        else:
-            self.dump(packet,"recv")
-        
-        return packet
+        return self.recv_event(extra_title).raw
 
-    def _write_packet(self,packet):
+    def _write_packet(self,packet,recipient=None,inquiry=False):
+        """
+        recipient = the device whose reply is waited for through the
+        protocol, None if the caller reads the replies itself
+        """
 
-        if not self.serialport.isOpen():
+        if not self.transport.is_open():
             sys.exit(1)
 
         # lets see if a completion message or someting
         # else waits in the buffer. If yes dump it.
-        if self.serialport.inWaiting():
+        if self.transport.in_waiting():
             self.recv_packet("ignored")
 
-        self.serialport.write(packet)
-        self.dump(packet,"sent")
+        if recipient is not None:
+            self.protocol.start(recipient,inquiry)
+        self.write_raw(packet)
+
+    def write_raw(self,packet,title="sent"):
+        """
+        writes an encoded packet as it is, accounting its wire time.
+        The caller holds the mutex and reads the replies. Nothing waits
+        for the bandwidth budget here (see bandwidth.py).
+        """
+        self.transport.write(packet)
+        self.bandwidth.account(len(packet))
+        self.dump(packet,title)
         
+    def encode_packet(self,recipient,data):
+        """
+        frames data for recipient (-1 = broadcast), see send_packet
+        """
+        # we are the controller with id=0
+        return self.protocol.encode(recipient,data)
+
+    @contextmanager
+    def capturing(self):
+        """
+        with visca.capturing() as packets:
+            visca.cmd_cam_freeze_on(1)
+        encodes what the calls in the block would send without sending
+        it: packets is a list of (recipient, packet, inquiry). The calls
+        themselves return None. A call the profile of the device rejects
+        is there as (device, None, False).
+        """
+        previous = getattr(self._local, 'capture', None)
+        packets = []
+        self._local.capture = packets
+        try:
+            yield packets
+        finally:
+            self._local.capture = previous
+
     def send_packet(self,recipient,data, inquiry = False):
         """
         according to the documentation:
@@ -321,59 +362,181 @@ class ViscaControl():
         """
         reply = b''
 
-        # we are the controller with id=0
-        sender = 0
-
-        if recipient==-1:
-            #broadcast:
-            rbits=0x8
-        else:
-            # the recipient (address = 3 bits)
-            rbits=recipient & 0b111
-
-        sbits=(sender & 0b111)<<4
+        profile = self.profiles.get(recipient)
+        if profile is not None:
+            reason = profile.check(data)
+            if reason is not None:
+                return self._reject(recipient, reason)
 
-        header=0b10000000 | sbits | rbits
+        packet=self.encode_packet(recipient,data)
 
-        terminator=0xff
+        capture = getattr(self._local, 'capture', None)
+        if capture is not None:
+            # capturing() block: remember the packet, don't send it
+            capture.append((recipient, packet, inquiry))
+            return None
 
-        #import pdb;pdb.set_trace()
-        packet=bytes([header])+data+bytes([terminator])
+        if self.bandwidth.current is not None:
+            # inside bandwidth.consumer(): wait for the budget. An ACK and
+            # a COMPLETION or an inquiry reply come back.
+            self.bandwidth.wait(nbytes=len(packet) + (7 if inquiry else 6))
 
         self.mutex.acquire()
-
-        self._write_packet(packet)
-        
-        if not inquiry:
-            reply = self.recv_packet()
-        else:
-            #In case of inquiries, sometimes ACK is returned immediately 
-            # and the response is send when command has been executed. 
-            #So, in case of inquiry, we block until we get a full response
-            max_retries = 5
-            tries = 0
-            while tries < max_retries:
-                tries += 1
-                reply = self.recv_packet()
-                if (len(reply) > 3):
+        try:
+            sent = time.monotonic()
+            self._write_packet(packet,recipient,inquiry)
+            rx_bytes = 0
+
+            # the protocol decides which packet answers the request: the
+            # ACK (or error) of a command, the reply of an inquiry, which
+            # may be ACKed first
+            while True:
+                event = self.recv_event()
+                rx_bytes += len(event.raw)
+                if event.final:
                     break
-                #else:
-                    #print('After inquiry, got packet with len %d at retry%d' % (len(reply), tries))
-                time.sleep(0.001)
+            reply = event.raw
 
-        if reply and reply[-1] != 0xff:
-            print ("received packet not terminated correctly: %s" % reply)
-            reply=None
+            if reply and reply[-1] != 0xff:
+                print ("received packet not terminated correctly: %s" % reply)
+                reply=None
 
-        self.mutex.release()
+            received = time.monotonic()
+        finally:
+            # also when _write_packet exits (port not open): whoever
+            # catches that must still find the bus free
+            self.mutex.release()
 
+        self.finish_request(recipient, inquiry, sent, received, len(packet), rx_bytes, reply)
         return reply
 
+    def finish_request(self, recipient, inquiry, sent, received, tx_bytes, rx_bytes, reply):
+        """
+        timing, registry and watchdog bookkeeping of one request, from
+        the packet written at `sent` to the answer ending it (ACK or
+        error of a command, reply of an inquiry, None/b'' on timeout) read
+        at `received`. send_packet calls it; sessions, macros, groups and
+        the gateway, which write with write_raw, call it for each of their
+        requests. Returns the Transaction.
+        """
+        transaction = Transaction(recipient, inquiry, sent, received, tx_bytes, rx_bytes,
+                                  self.transport.wire_time(tx_bytes + rx_bytes))
+        self._local.last = transaction
+        timings = getattr(self._local, 'timings', None)
+        if timings is not None:
+            timings.append(transaction)
+
+        if self.registry is not None:
+            self.registry.record(recipient, inquiry, received-sent, reply)
+        if self.watchdog is not None:
+            self.watchdog.observe(transaction, reply)
+        return transaction
+
+
+    @property
+    def last_transaction(self):
+        """
+        Transaction (timing) of the last send_packet of this thread
+        """
+        return getattr(self._local, 'last', None)
+
+    @contextmanager
+    def timed(self):
+        """
+        with visca.timed() as transactions:
+            ...
+        collects the Transaction of every packet sent by this thread
+        inside the block
+        """
+        previous = getattr(self._local, 'timings', None)
+        transactions = []
+        self._local.timings = transactions
+        try:
+            yield transactions
+        finally:
+            self._local.timings = previous
+
+    def session(self,device=1,max_hold=0.25):
+        """
+        with visca.session(1) as s:
+            s.cmd_cam_lr_reverse_on()
+            s.cmd_cam_hires_on()
+        batches the calls of the block under one lock and pipelines
+        them, see session.py. max_hold = seconds the lock may be held
+        before other threads get a turn.
+        """
+        return Session(self,device,max_hold)
 
     def send_broadcast(self,data):
         # shortcut
         return self.send_packet(-1,data)
 
+    def send_broadcast_command(self,data,timeout=None):
+        """
+        sends a command to every device on the chain with a single
+        broadcast packet and collects the replies of each of them.
+
+        returns {device: reply} for devices 1..self.devices where reply is
+        the COMPLETION (or error) packet of that device, or None if it did
+        not answer before timeout (seconds, default the port timeout).
+        Note that some cameras execute broadcast commands without replying.
+        A device whose profile does not allow the command gets the syntax
+        error reply without waiting for it; nothing is sent if that is
+        every device. Each reply is a transaction of its device (timed(),
+        watchdog, registry), devices that did not answer are not.
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        packet=self.encode_packet(-1,data)
+        capture = getattr(self._local, 'capture', None)
+        if capture is not None:
+            capture.append((-1, packet, False))
+            return None
+
+        results = dict((device, None) for device in range(1, self.devices+1))
+        waiting = set(results)
+        for device in results:
+            profile = self.profiles.get(device)
+            reason = profile.check(data) if profile is not None else None
+            if reason is not None:
+                results[device] = self._reject(device, reason)
+                waiting.discard(device)
+        if not waiting:
+            return results
+
+        if self.bandwidth.current is not None:
+            # the packet comes back around the chain, plus an ACK and a
+            # COMPLETION of every device
+            self.bandwidth.wait(nbytes=2 * len(packet) + 6 * len(waiting))
+
+        answered = []
+        self.mutex.acquire()
+        try:
+            sent = time.monotonic()
+            self._write_packet(packet)
+            deadline = sent + timeout
+            while waiting and time.monotonic() < deadline:
+                reply = self.recv_packet("broadcast")
+                if not reply:
+                    break
+                if reply[0] == 0x88 or len(reply) < 3:
+                    # our own packet coming back around the chain
+                    continue
+                device = (reply[0] & 0b01110000) >> 4
+                kind = (reply[1] & 0b11110000) >> 4
+                if device in waiting and kind in (5, 6):
+                    results[device] = reply
+                    waiting.discard(device)
+                    answered.append((device, time.monotonic()))
+        finally:
+            self.mutex.release()
+
+        for device, received in answered:
+            self.finish_request(device, False, sent, received, len(packet),
+                                len(results[device]), results[device])
+        return results
+
 
 
     def i2v(self,value):
@@ -392,6 +555,16 @@ class ViscaControl():
 
         return bytes([p,q,r,s])
 
+    def v2i(self,data,signed=False):
+        """
+        inverse of i2v: 4 visca nibbles (0p 0q 0r 0s) back to a word,
+        signed=True for positions that can be negative (pan/tilt)
+        """
+        value = word_from_nibbles(data)
+        if signed and value & 0x8000:
+            value -= 0x10000
+        return value
+
 
 
     def cmd_adress_set(self):
@@ -410,8 +583,7 @@ class ViscaControl():
         if not reply:
             print ("No reply from the bus.")
             #sys.exit(1)
-            self.mutex.release()
-            raise "Timeout on write"
+            raise IOError("Timeout on write")
 
         if len(reply)!=4 or reply[-1]!=0xff:
             print ("ERROR enumerating devices")
@@ -427,6 +599,9 @@ class ViscaControl():
         if d==0:
             sys.exit(1)
 
+        self.devices = d
+        return d
+
 
     def cmd_if_clear_all(self):
         reply=self.send_broadcast( b'\x01\x00\x01') # interface clear all
@@ -438,7 +613,13 @@ class ViscaControl():
 
 
     def cmd_cam(self,device,subcmd):
+        """
+        device = BROADCAST sends the command to every camera at once and
+        returns {device: reply} (see send_broadcast_command)
+        """
         packet=b'\x01\x04'+subcmd
+        if device == self.BROADCAST:
+            return self.send_broadcast_command(packet)
         reply = self.send_packet(device,packet)
         #FIXME: check returned data here and retransmit?
 
@@ -452,8 +633,18 @@ class ViscaControl():
         return reply
 
     def get_data_from_inquiry(self, packet):
+        if not packet or len(packet) < 3 or (packet[1] & 0xf0) == 0x60:
+            # nothing, or an error (y0 6z ee ff) whose code is no value
+            return b''
         return packet[2:-1]
 
+    def inquiry_reply(self, device, subcmd):
+        """
+        like cmd_inquiry but returns the reply as a Packet, so the value
+        can be decoded from packet.payload without copying
+        """
+        return Packet(self.cmd_inquiry(device, subcmd) or b'')
+
     # ----------------------- Setters -------------------------------------
 
 
@@ -487,15 +678,15 @@ class ViscaControl():
         return self.cmd_cam(device,subcmd)
 
 
-    #FIXME
     def cmd_cam_auto_power_off(self,device,time=0):
         """
         time = minutes without command until standby
         0: disable
         0xffff: 65535 minutes
+        not on the FCB-EV7500, its profile rejects it
         """
         subcmd=b"\x40"+self.i2v(time)
-        return #self.cmd_cam(device,subcmd)
+        return self.cmd_cam(device,subcmd)
 
 
     # ZOOM control
@@ -530,10 +721,28 @@ class ViscaControl():
         subcmd=b"\x07"+bytes([sbyte])
         return self.cmd_cam(device,subcmd)
         
+    def cmd_cam_zoom_position(self,device,position):
+        """
+        zoom to a raw lens position as returned by
+        inquiry_precise_zoom_position
+        """
+        subcmd=b"\x47"+struct.pack('>I', position)
+        return self.cmd_cam(device,subcmd)
+
+    def zoom_settings(self,device=None):
+        """
+        zoom positions of cmd_cam_zoom_direct 1, 2, ... for device
+        """
+        profile = self.profiles.get(device)
+        if profile is not None and profile.zoom_settings is not None:
+            return profile.zoom_settings
+        return self.ZOOM_SETTINGS
+
     def cmd_cam_zoom_direct(self,device,zoom):
         zoom_index=zoom-1
-        if zoom_index in range(len(self.ZOOM_SETTINGS)):
-            subcmd=b"\x47"+self.ZOOM_SETTINGS[zoom_index]
+        settings=self.zoom_settings(device)
+        if zoom_index in range(len(settings)):
+            subcmd=b"\x47"+settings[zoom_index]
             return self.cmd_cam(device,subcmd)
         else:
             print('something wrong in direct zoom values')
@@ -630,6 +839,14 @@ class ViscaControl():
         pass
         
     #Exposure mode
+    def cmd_cam_ae_mode(self, device, mode):
+        """
+        mode as returned by inquiry_AEMode: 0x00 full auto, 0x03 manual,
+        0x0A shutter priority, 0x0B iris priority, 0x0D bright
+        """
+        subcmd=b'\x39'+bytes([mode])
+        return self.cmd_cam(device,subcmd)
+
     def cmd_cam_shutter_priority(self, device):
         #self.DEBUG=True
         subcmd=b'\x39\x0A'
@@ -642,6 +859,9 @@ class ViscaControl():
         
     def cmd_cam_shutter_speed(self, device, value):
         #self.DEBUG=True
+        rejected = self._out_of_range(device, 'shutter_speed', value[0])
+        if rejected:
+            return rejected
         value01 = ( value[0] & 0b11110000 ) >> 4
         value02 = value[0] & 0b00001111
         subcmd=b'\x4A\x00\x00'+bytes([value01])+bytes([value02])
@@ -672,6 +892,39 @@ class ViscaControl():
         subcmd=b'\x1F\x42\x00\x00'+level_01+level_02
         return self.cmd_cam(device,subcmd)
         
+    def cmd_cam_aperture_direct(self, device, value):
+        """
+        aperture gain 0x00..0x0f as returned by inquiry_aperture
+        """
+        rejected = self._out_of_range(device, 'aperture', value)
+        if rejected:
+            return rejected
+        value01 = ( value & 0b11110000 ) >> 4
+        value02 = value & 0b00001111
+        subcmd=b'\x42\x00\x00'+bytes([value01])+bytes([value02])
+        return self.cmd_cam(device,subcmd)
+
+    def cmd_cam_iris_direct(self, device, value):
+        """
+        iris position 0x00 (closed) .. 0x11 (open), manual or iris
+        priority exposure only
+        """
+        rejected = self._out_of_range(device, 'iris', value)
+        if rejected:
+            return rejected
+        subcmd=b'\x4B\x00\x00'+bytes([(value & 0xf0) >> 4, value & 0x0f])
+        return self.cmd_cam(device,subcmd)
+
+    def cmd_cam_gain_direct(self, device, value):
+        """
+        gain position 0x00 .. 0x0f, manual exposure only
+        """
+        rejected = self._out_of_range(device, 'gain', value)
+        if rejected:
+            return rejected
+        subcmd=b'\x4C\x00\x00'+bytes([(value & 0xf0) >> 4, value & 0x0f])
+        return self.cmd_cam(device,subcmd)
+
     def cmd_cam_aperture_control_reset(self,device):
         subcmd=b"\x1F\x02\x00\x00"
         return self.cmd_cam(device,subcmd)
@@ -684,6 +937,34 @@ class ViscaControl():
         return self.cmd_cam(device,subcmd)
         
         
+    # Broadcast: same setting on every camera of the chain in one packet,
+    # these return {device: reply}
+
+    def cmd_cam_power_all(self,onoff):
+        return self.cmd_cam_power(self.BROADCAST,onoff)
+
+    def cmd_cam_zoom_direct_all(self,zoom):
+        return self.cmd_cam_zoom_direct(self.BROADCAST,zoom)
+
+    def cmd_cam_lr_reverse_all(self,onoff):
+        if onoff:
+            return self.cmd_cam_lr_reverse_on(self.BROADCAST)
+        return self.cmd_cam_lr_reverse_off(self.BROADCAST)
+
+    def cmd_cam_ud_reverse_all(self,onoff):
+        if onoff:
+            return self.cmd_cam_ud_reverse_on(self.BROADCAST)
+        return self.cmd_cam_ud_reverse_off(self.BROADCAST)
+
+    def cmd_cam_picture_effect_all(self,mode):
+        return self.cmd_cam_picture_effect(self.BROADCAST,mode)
+
+    def cmd_cam_freeze_all(self,onoff):
+        if onoff:
+            return self.cmd_cam_freeze_on(self.BROADCAST)
+        return self.cmd_cam_freeze_off(self.BROADCAST)
+
+
     # --------------------- Getters --------------------------------------
 
     def cmd_inquiry(self,device,subcmd):
@@ -696,7 +977,27 @@ class ViscaControl():
         subcmd=b'\x47'
         reply = self.cmd_inquiry(device, subcmd)
         position = self.get_data_from_inquiry(reply)    
+        if len(position) == 4:
+            self._record_zoom(device, raw_word(position))
         return position
+
+    def zoom_history(self, device, size=4096, max_speed=None):
+        """
+        ZoomHistory of device (see history.py): every zoom position read
+        with get_zoom_position / inquiry_precise_zoom_position and when.
+        size and max_speed are used when the history is created.
+        """
+        history = self.zoom_histories.get(device)
+        if history is None:
+            history = self.zoom_histories.setdefault(device, ZoomHistory(size, max_speed))
+        return history
+
+    def _record_zoom(self, device, value):
+        transaction = self.last_transaction
+        if transaction is not None:
+            self.zoom_history(device).record(transaction.sent, transaction.received, value)
+            if self.telemetry_log is not None:
+                self.telemetry_log.record_zoom(device, (transaction.sent + transaction.received) / 2, value)
         
     def keep_trying_to_get_zoom_position(self, device):
         reply = b''
@@ -726,42 +1027,40 @@ class ViscaControl():
             retries += 1
             
         #print('Returing posistion %s' % position)
+        if len(position) == 4:
+            self._record_zoom(device, raw_word(position))
         return position
         
     def inquiry_precise_zoom_position(self, device):
-        #print('Inquiry zoom precise position')
-        position = self.get_zoom_position(device)
-        #print('Got position %s' % position)
-        if len(position) != 4:
+        packet = self.inquiry_reply(device, b'\x47')
+        if len(packet) != 7:
             return None
 
         #number between 0x00000000 and 0x40000000
-        pos_int = struct.unpack('>I', position)[0]
-        return pos_int
+        value = packet.raw_word()
+        self._record_zoom(device, value)
+        return value
+
+    def zoom_index(self, pos_int, device=None):
+        """
+        index in ZOOM_SETTINGS (in the zoom table of the profile of
+        device) of a raw zoom position, or of the closest setting if
+        someone used the tele/wide commands
+        """
+        settings_int, settings_index = self.ZOOM_SETTINGS_INT, self.ZOOM_SETTINGS_INDEX
+        profile = self.profiles.get(device)
+        if profile is not None and profile.zoom_settings is not None:
+            settings_int, settings_index = profile.zoom_tables()
+        pos = settings_index.get(pos_int)
+        if pos is None:
+            pos = settings_index[takeClosest(settings_int, pos_int)]
+        return pos
 
     def inquiry_combined_zoom_pos(self, device):
-        #self.DEBUG = True
-        position = self.get_zoom_position(device)
-        if len(position) != 4:
+        pos_int = self.inquiry_precise_zoom_position(device)
+        if pos_int is None:
             return None
-            
-        try:
-            pos = self.ZOOM_SETTINGS.index(position)
-        except:
-            #print('Zoom position is not in the 1-41x range, getting %s' % (position))
-            #in this case we have to convert everything to an integer
-            # perform comparisons and then return the closest value
-            #This can happen if someone uses tele/wide zoom commands
-            #import pdb;pdb.set_trace()
-            pos_int = struct.unpack('>I', position)[0]
-
-            pos = self.ZOOM_SETTINGS.index(struct.pack('>I',takeClosest(self.ZOOM_SETTINGS_INT, pos_int)))
-
-            #print('Returning approximate position %d for position %s' % ((pos+1), position))
-            #self.cmd_cam_zoom_direct(device, pos+1)
-            
-        #self.DEBUG = True
-        return pos
+        return self.zoom_index(pos_int, device)
         
     def inquiry_mirror_mode(self, device):
         subcmd=b'\x61'
@@ -823,6 +1122,29 @@ class ViscaControl():
         mode = self.get_data_from_inquiry(reply)
         return mode
             
+    def inquiry_shutter_speed(self,device):
+        """
+        returns the shutter position (the byte cmd_cam_shutter_speed takes)
+        """
+        packet = self.inquiry_reply(device, b'\x4A')
+        if len(packet) != 7:
+            return None
+        return packet.byte_from_nibbles(2)
+
+    def inquiry_aperture(self,device):
+        packet = self.inquiry_reply(device, b'\x42')
+        if len(packet) != 7:
+            return None
+        return packet.byte_from_nibbles(2)
+
+    def inquiry_picture_effect(self,device):
+        subcmd=b'\x63'
+        reply = self.cmd_inquiry(device, subcmd)
+        mode = self.get_data_from_inquiry(reply)
+        if len(mode) != 1:
+            return None
+        return mode[0]
+
     def inquiry_shutter_mode(self,device):
         mode = self.inquiry_AEMode(device)
         if mode == b'\x0A':
@@ -869,15 +1191,53 @@ class ViscaControl():
         elif mode == b'\x00':
             return 'Hold'
             
+    def inquiry_power(self,device):
+        subcmd=b'\x00'
+        reply = self.cmd_inquiry(device, subcmd)
+        mode = self.get_data_from_inquiry(reply)
+        if mode == b'\x02':
+            return True
+        elif mode == b'\x03':
+            return False
+
+    def inquiry_version(self,device):
+        """
+        returns (vendor id, model id, rom version, max socket)
+        """
+        reply = self.send_packet(device, b'\x09\x00\x02', inquiry = True)
+        version = self.get_data_from_inquiry(reply)
+        if len(version) != 7:
+            return None
+        vendor, model, rom = struct.unpack('>HHH', version[0:6])
+        profile = profiles.find(vendor, model)
+        if profile is not None:
+            self.profiles[device] = profile
+        return vendor, model, rom, version[6]
+
     def inquiry_stablezoom(self,device):
         return False
         
     def inquiry_register(self, device, register):
-        subcmd=b'\x24'+register
-        reply = self.cmd_inquiry(device, subcmd)
-        mode = self.get_data_from_inquiry(reply)
-        value = bytes([(mode[0]&0b00001111)<<4 | mode[1]&0b00001111])
-        return self.REGISTER_VALUES[register][value]
+        """
+        meaning of the register value from REGISTER_VALUES (or the
+        register map of the profile), the value byte itself when it has
+        no meaning there, None if the camera did not answer
+        """
+        value = self.inquiry_register_raw(device, register)
+        if value is None:
+            return None
+        profile = self.profiles.get(device)
+        values = profile.register_values if profile is not None else self.REGISTER_VALUES
+        return values.get(register, {}).get(value, value)
+
+    def inquiry_register_raw(self, device, register):
+        """
+        register value as a single byte, without the REGISTER_VALUES lookup
+        """
+        packet = self.inquiry_reply(device, b'\x24'+register)
+        if len(packet) != 5:
+            return None
+        return bytes([packet.byte_from_nibbles()])
         
         
         
@@ -994,6 +1354,124 @@ class ViscaControl():
     def cmd_datascreen_toggle(self,device):
         return self.cmd_datascreen(device,0x10)
 
+
+    # --------------------- Pan/Tilt --------------------------------------
+
+    PAN_SPEED_MAX = 0x18
+    TILT_SPEED_MAX = 0x18
+
+    PT_STOP = 0x03
+    PT_LEFT = 0x01
+    PT_RIGHT = 0x02
+    PT_UP = 0x01
+    PT_DOWN = 0x02
+
+    def pt_speeds(self,pan_speed,tilt_speed):
+        if pan_speed is None:
+            pan_speed = self.PAN_SPEED_MAX
+        if tilt_speed is None:
+            tilt_speed = self.TILT_SPEED_MAX
+        pan_speed = min(max(pan_speed,1),self.PAN_SPEED_MAX)
+        tilt_speed = min(max(tilt_speed,1),self.TILT_SPEED_MAX)
+        return bytes([pan_speed,tilt_speed])
+
+    def cmd_pt_drive(self,device,pan_dir,tilt_dir,pan_speed=None,tilt_speed=None):
+        """
+        pan_dir  = PT_LEFT, PT_RIGHT or PT_STOP
+        tilt_dir = PT_UP, PT_DOWN or PT_STOP
+        speeds: 1..0x18, None = fastest
+        """
+        subcmd=b'\x01'+self.pt_speeds(pan_speed,tilt_speed)+bytes([pan_dir,tilt_dir])
+        return self.cmd_pt(device,subcmd)
+
+    def cmd_pt_up(self,device,pan_speed=None,tilt_speed=None):
+        return self.cmd_pt_drive(device,self.PT_STOP,self.PT_UP,pan_speed,tilt_speed)
+
+    def cmd_pt_down(self,device,pan_speed=None,tilt_speed=None):
+        return self.cmd_pt_drive(device,self.PT_STOP,self.PT_DOWN,pan_speed,tilt_speed)
+
+    def cmd_pt_left(self,device,pan_speed=None,tilt_speed=None):
+        return self.cmd_pt_drive(device,self.PT_LEFT,self.PT_STOP,pan_speed,tilt_speed)
+
+    def cmd_pt_right(self,device,pan_speed=None,tilt_speed=None):
+        return self.cmd_pt_drive(device,self.PT_RIGHT,self.PT_STOP,pan_speed,tilt_speed)
+
+    def cmd_pt_upleft(self,device,pan_speed=None,tilt_speed=None):
+        return self.cmd_pt_drive(device,self.PT_LEFT,self.PT_UP,pan_speed,tilt_speed)
+
+    def cmd_pt_upright(self,device,pan_speed=None,tilt_speed=None):
+        return self.cmd_pt_drive(device,self.PT_RIGHT,self.PT_UP,pan_speed,tilt_speed)
+
+    def cmd_pt_downleft(self,device,pan_speed=None,tilt_speed=None):
+        return self.cmd_pt_drive(device,self.PT_LEFT,self.PT_DOWN,pan_speed,tilt_speed)
+
+    def cmd_pt_downright(self,device,pan_speed=None,tilt_speed=None):
+        return self.cmd_pt_drive(device,self.PT_RIGHT,self.PT_DOWN,pan_speed,tilt_speed)
+
+    def cmd_pt_stop(self,device):
+        return self.cmd_pt_drive(device,self.PT_STOP,self.PT_STOP)
+
+    def cmd_pt_absolute(self,device,pan,tilt,pan_speed=None,tilt_speed=None):
+        """
+        move to pan/tilt position, positions are signed (left/down < 0)
+        """
+        subcmd=b'\x02'+self.pt_speeds(pan_speed,tilt_speed)+self.i2v(pan)+self.i2v(tilt)
+        return self.cmd_pt(device,subcmd)
+
+    def cmd_pt_relative(self,device,pan,tilt,pan_speed=None,tilt_speed=None):
+        """
+        move by pan/tilt steps from the current position
+        """
+        subcmd=b'\x03'+self.pt_speeds(pan_speed,tilt_speed)+self.i2v(pan)+self.i2v(tilt)
+        return self.cmd_pt(device,subcmd)
+
+    def cmd_pt_home(self,device):
+        return self.cmd_pt(device,b'\x04')
+
+    def cmd_pt_reset(self,device):
+        return self.cmd_pt(device,b'\x05')
+
+    def cmd_pt_limit_set(self,device,corner,pan,tilt):
+        """
+        corner: 0x00 = down left, 0x01 = up right
+        """
+        subcmd=b'\x07\x00'+bytes([corner&0b1])+self.i2v(pan)+self.i2v(tilt)
+        return self.cmd_pt(device,subcmd)
+
+    def cmd_pt_limit_clear(self,device,corner):
+        subcmd=b'\x07\x01'+bytes([corner&0b1])+b'\x07\x0f\x0f\x0f\x07\x0f\x0f\x0f'
+        return self.cmd_pt(device,subcmd)
+
+    def cmd_pt_inquiry(self,device,subcmd):
+        packet=b'\x09\x06'+subcmd
+        return self.send_packet(device,packet, inquiry = True)
+
+    def inquiry_pt_mode(self,device):
+        reply = self.cmd_pt_inquiry(device,b'\x10')
+        mode = self.get_data_from_inquiry(reply)
+        if len(mode) != 2:
+            return None
+        return struct.unpack('>H', mode)[0]
+
+    def inquiry_pt_max_speed(self,device):
+        """
+        returns (pan max speed, tilt max speed)
+        """
+        reply = self.cmd_pt_inquiry(device,b'\x11')
+        speeds = self.get_data_from_inquiry(reply)
+        if len(speeds) != 2:
+            return None
+        return speeds[0], speeds[1]
+
+    def inquiry_pt_position(self,device):
+        """
+        returns (pan, tilt) as signed integers
+        """
+        packet = Packet(self.cmd_pt_inquiry(device,b'\x12') or b'')
+        if len(packet) != 11:
+            return None
+        return packet.word(0,signed=True), packet.word(4,signed=True)
+
 from bisect import bisect_left
 
 def takeClosest(myList, myNumber):
@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# VISCA over IP framing.
+#
+# Every UDP datagram carries an 8 byte header in front of the usual
+# VISCA packet:
+#
+# | payload type | payload length | sequence number | payload ... |
+#     2 bytes         2 bytes          4 bytes        1-16 bytes
+#
+# all fields are big endian.
+#
+
+import struct
+
+VISCA_IP_PORT = 52381
+
+PAYLOAD_COMMAND = 0x0100
+PAYLOAD_INQUIRY = 0x0110
+PAYLOAD_REPLY = 0x0111
+PAYLOAD_DEVICE_SETTING = 0x0120
+PAYLOAD_CONTROL = 0x0200
+PAYLOAD_CONTROL_REPLY = 0x0201
+
+# payload of control commands / replies
+CONTROL_RESET = b'\x01'
+CONTROL_ERROR_SEQUENCE = b'\x0f\x01'
+CONTROL_ERROR_MESSAGE = b'\x0f\x02'
+
+HEADER = struct.Struct('>HHI')
+HEADER_LEN = HEADER.size
+
+MAX_SEQUENCE = 0xffffffff
+
+
+def pack(payload_type, seq, payload):
+    """
+    returns a datagram for the given visca payload
+    """
+    return HEADER.pack(payload_type, len(payload), seq & MAX_SEQUENCE) + payload
+
+
+def unpack(datagram):
+    """
+    splits a datagram into (payload_type, seq, payload)
+    returns None if the datagram is malformed
+    """
+    if len(datagram) < HEADER_LEN:
+        return None
+    payload_type, length, seq = HEADER.unpack_from(datagram)
+    payload = datagram[HEADER_LEN:]
+    if length != len(payload):
+        return None
+    return payload_type, seq, payload
+
+
+def payload_type_for(packet):
+    """
+    picks the payload type matching a framed visca packet
+    (0x01 = command, 0x09 = inquiry)
+    """
+    if len(packet) > 1 and packet[1] == 0x09:
+        return PAYLOAD_INQUIRY
+    return PAYLOAD_COMMAND
+
+
+def next_sequence(seq):
+    return (seq + 1) & MAX_SEQUENCE
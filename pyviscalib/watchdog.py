@@ -0,0 +1,311 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyVisca-3 Implementation of the Visca serial protocol in python3
+#    based on PyVisca (Copyright (C) 2013  Florian Streibelt
+#    pyvisca@f-streibelt.de).
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyVisca-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+#
+# Health of the cameras on the bus.
+#
+#   watchdog = HealthWatchdog(visca, devices=[1, 2]).start()
+#   if watchdog.healthy(2):
+#       visca.cmd_cam_zoom_direct(2, 12)
+#
+# Every transaction of ViscaControl (of any thread, also those of
+# sessions, macros, groups and the gateway, see
+# ViscaControl.finish_request) is reported to the watchdog, which keeps
+# per device a moving average of the camera time (round trip minus wire
+# time) and of its deviation, like TCP does for its retransmission timer
+# (RFC 6298). When a device was quiet for `interval` seconds and nobody
+# holds the bus, the watchdog sends a power inquiry (5 bytes out, 4 back)
+# as heartbeat.
+#
+# States:
+#   ok        answers, average camera time within degraded_factor times
+#             the best seen (plus `margin`) and the last answer within
+#             the usual spread: average + K * deviation (plus `margin`)
+#   degraded  slower than either, or the last request timed out
+#   down      down_after timeouts in a row
+#
+# Going down triggers a recovery (unless recover=False): the port is
+# closed and reopened and the device gets an interface clear. The
+# recovery needs the bus lock, which the thread reporting the timeout
+# may hold, so it is queued to the watchdog thread (or to a thread of its
+# own when the watchdog was not started). A down device keeps getting
+# heartbeats, every down_interval seconds, and is ok again as soon as it
+# answers.
+#
+
+import threading
+import time
+
+OK = 'ok'
+DEGRADED = 'degraded'
+DOWN = 'down'
+UNKNOWN = 'unknown'
+
+# power inquiry
+HEARTBEAT = b'\x00'
+
+# interface clear, to one device
+IF_CLEAR = b'\x01\x00\x01'
+
+
+class DeviceHealth():
+
+    __slots__ = ('device', 'state', 'srtt', 'rttvar', 'best', 'samples',
+                 'timeouts', 'failures', 'last_seen', 'last_try',
+                 'recoveries', 'last_recovery', 'changed')
+
+    def __init__(self, device):
+        self.device = device
+        self.state = UNKNOWN
+        # moving average / mean deviation of the camera time (seconds)
+        self.srtt = None
+        self.rttvar = None
+        self.best = None
+        self.samples = 0
+        # timeouts in a row / in total
+        self.timeouts = 0
+        self.failures = 0
+        # monotonic time of the last reply / of the last request
+        self.last_seen = None
+        self.last_try = None
+        self.recoveries = 0
+        self.last_recovery = None
+        self.changed = None
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __repr__(self):
+        return 'DeviceHealth(%d, %s, rtt=%s)' % (
+            self.device, self.state,
+            '%.1fms' % (self.srtt * 1000) if self.srtt is not None else None)
+
+
+class HealthWatchdog():
+
+    # weights of the moving averages and deviations allowed (RFC 6298)
+    ALPHA = 0.125
+    BETA = 0.25
+    K = 4
+
+    def __init__(self, visca, devices=None, interval=1.0, down_interval=5.0,
+                 degraded_factor=2.0, margin=0.005, down_after=3, recover=True,
+                 on_change=None, consumer='watchdog'):
+        """
+        devices         = addresses to watch, by default every device of
+                          the registry (or 1..visca.devices)
+        interval        = heartbeat after this many quiet seconds
+        down_interval   = heartbeat period of a device that is down
+        degraded_factor = degraded when the average camera time is above
+        margin            best * degraded_factor + margin, or the last one
+                          above average + K * deviation + margin
+        down_after      = timeouts in a row before a device is down
+        recover         = reopen the port and clear the interface of a
+                          device going down
+        on_change       = called as on_change(device, old, new) from the
+                          thread that saw the change
+        consumer        = name of the heartbeats on visca.bandwidth
+        """
+        self.visca = visca
+        if devices is None:
+            if visca.registry is not None:
+                devices = [d.address for d in visca.registry]
+            else:
+                devices = range(1, visca.devices + 1)
+        self.devices = dict((d, DeviceHealth(d)) for d in devices)
+        self.interval = interval
+        self.down_interval = down_interval
+        self.degraded_factor = degraded_factor
+        self.margin = margin
+        self.down_after = down_after
+        self.recover = recover
+        self.on_change = on_change
+        self.consumer = consumer
+        self.heartbeats = 0
+        # devices gone down, recovered by the watchdog thread
+        self._recover = set()
+        self._lock = threading.Lock()
+        self._exit = False
+        self._thread = None
+
+    def __getitem__(self, device):
+        return self.devices[device]
+
+    def state(self, device):
+        health = self.devices.get(device)
+        return health.state if health is not None else UNKNOWN
+
+    def healthy(self, device):
+        """
+        False if the device is degraded or down: callers with a choice
+        send their work elsewhere
+        """
+        return self.state(device) in (OK, UNKNOWN)
+
+    def usable(self):
+        """
+        the watched devices that are not down, healthy ones first
+        """
+        order = {OK: 0, UNKNOWN: 0, DEGRADED: 1}
+        devices = [h for h in self.devices.values() if h.state != DOWN]
+        devices.sort(key=lambda h: (order[h.state], h.srtt or 0.0))
+        return [h.device for h in devices]
+
+    def stats(self):
+        return dict((d, h.as_dict()) for d, h in self.devices.items())
+
+    def _threshold(self, health):
+        return health.best * self.degraded_factor + self.margin
+
+    def _spread(self, health):
+        # no answer later than this is expected
+        return health.srtt + self.K * health.rttvar + self.margin
+
+    def observe(self, transaction, reply):
+        """
+        called by ViscaControl.send_packet after every transaction
+        """
+        health = self.devices.get(transaction.recipient)
+        if health is None:
+            return
+        with self._lock:
+            old = health.state
+            health.last_try = transaction.received
+            if not reply:
+                health.timeouts += 1
+                health.failures += 1
+                new = DOWN if health.timeouts >= self.down_after else DEGRADED
+                if old == DOWN:
+                    new = DOWN
+            else:
+                sample = transaction.camera_time
+                if health.srtt is None:
+                    late = False
+                    health.srtt = sample
+                    health.rttvar = sample / 2
+                else:
+                    late = sample > self._spread(health)
+                    health.rttvar += self.BETA * (abs(health.srtt - sample) - health.rttvar)
+                    health.srtt += self.ALPHA * (sample - health.srtt)
+                if health.best is None or sample < health.best:
+                    health.best = sample
+                health.samples += 1
+                health.timeouts = 0
+                health.last_seen = transaction.received
+                slow = late or health.srtt > self._threshold(health)
+                new = DEGRADED if slow else OK
+            if new != old:
+                health.state = new
+                health.changed = transaction.received
+
+        if new != old:
+            if self.on_change is not None:
+                self.on_change(health.device, old, new)
+            if new == DOWN and self.recover:
+                # never in the caller's thread: it may hold the bus lock
+                # (a session, the gateway, ...) and already waited long
+                # enough
+                with self._lock:
+                    self._recover.add(health.device)
+                if self._thread is None:
+                    threading.Thread(target=self._recover_all, daemon=True).start()
+
+    def _recover_all(self):
+        while True:
+            with self._lock:
+                if not self._recover:
+                    return
+                device = self._recover.pop()
+            self.recover_device(device)
+
+    def recover_device(self, device):
+        """
+        reopens the port and sends an interface clear to device, so the
+        commands stuck in its sockets are dropped
+        """
+        visca = self.visca
+        health = self.devices[device]
+        health.recoveries += 1
+        health.last_recovery = time.monotonic()
+        visca.mutex.acquire()
+        try:
+            visca.reset_and_reopen()
+            visca.protocol.cancel()
+            visca.protocol.forget(device)
+        finally:
+            visca.mutex.release()
+        visca.send_packet(device, IF_CLEAR)
+
+    def _due(self, health, now):
+        last = health.last_try if health.last_try is not None else health.last_seen
+        if last is None:
+            return True
+        if health.state == DOWN:
+            return now - last >= self.down_interval
+        return now - last >= self.interval
+
+    def heartbeat(self, device):
+        """
+        one power inquiry to device, the answer (or its absence) is seen
+        by observe()
+        """
+        self.heartbeats += 1
+        with self.visca.bandwidth.consumer(self.consumer):
+            return self.visca.cmd_inquiry(device, HEARTBEAT)
+
+    def start(self):
+        self.visca.watchdog = self
+        self._exit = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._exit = True
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self.visca.watchdog is self:
+            self.visca.watchdog = None
+
+    def _run(self):
+        visca = self.visca
+        # a quarter of the interval is often enough to catch the gaps
+        tick = min(self.interval, self.down_interval) / 4
+        while not self._exit:
+            self._recover_all()
+            now = time.monotonic()
+            for health in list(self.devices.values()):
+                if self._exit:
+                    break
+                if not self._due(health, now):
+                    continue
+                # only in idle gaps: nobody on the bus and no budget
+                # exceeded
+                if visca.mutex.locked() or not visca.bandwidth.admit(self.consumer):
+                    break
+                self.heartbeat(health.device)
+                now = time.monotonic()
+            time.sleep(tick)
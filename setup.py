@@ -0,0 +1,18 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+from setuptools import setup
+
+setup(
+    name='pyvisca3',
+    version='0.1',
+    description='Implementation of the Visca serial protocol in python3',
+    author='Giacomo Benelli',
+    author_email='benelli.giacomo@gmail.com',
+    license='GPLv2',
+    packages=['pyviscalib'],
+    install_requires=['pyserial'],
+    entry_points={
+        'console_scripts': ['pyvisca = pyviscalib.cli:main'],
+    },
+)
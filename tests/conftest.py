@@ -0,0 +1,25 @@
+import pytest
+
+from pyviscalib.visca import ViscaControl
+from pyviscalib.simulator import ViscaSimulator
+from pyviscalib.transport import LoopbackTransport
+
+
+@pytest.fixture
+def make_visca():
+    """
+    make_visca(devices=1, responder=None, timeout=0.2): a started
+    ViscaControl on a loopback transport of its own
+    """
+    def make(devices=1, responder=None, timeout=0.2):
+        if responder is None:
+            responder = ViscaSimulator(devices)
+        visca = ViscaControl(transport=LoopbackTransport(responder, timeout=timeout))
+        visca.start()
+        return visca
+    return make
+
+
+@pytest.fixture
+def visca(make_visca):
+    return make_visca()
@@ -0,0 +1,46 @@
+import pytest
+
+from pyviscalib.bandwidth import BandwidthManager
+from pyviscalib.transport import SerialTransport
+
+
+@pytest.fixture
+def bus():
+    # 9600 baud: 1 ms per byte
+    return BandwidthManager(SerialTransport('/dev/null'))
+
+
+def test_utilization_per_consumer(bus):
+    with bus.consumer('zoom'):
+        bus.account(96, now=10.0)
+    bus.account(48, now=10.0)
+    assert bus.utilization(now=10.5) == pytest.approx(0.15)
+    assert bus.utilization('zoom', now=10.5) == pytest.approx(0.1)
+    assert bus.utilization(now=11.5) == 0.0
+
+
+def test_admission(bus):
+    bus.set_budget('zoom', max_share=0.1)
+    bus.set_budget('registers', only_below=0.05)
+    with bus.consumer('zoom'):
+        bus.account(90)
+    assert not bus.admit('zoom')
+    assert not bus.admit('registers')
+    assert bus.admit('other')
+    assert bus.wait('zoom', timeout=0.05) is False
+    assert bus.stats()['rejected'] == 1
+
+
+def test_budget_below_one_request_is_refused(bus):
+    with pytest.raises(ValueError):
+        bus.set_budget('zoom', max_share=0.01)
+    with pytest.raises(ValueError):
+        bus.set_budget('zoom', only_below=0)
+    assert 'zoom' not in bus.budgets
+
+
+def test_send_packet_is_charged_to_the_consumer(visca):
+    before = visca.bandwidth.bytes
+    with visca.bandwidth.consumer('poll'):
+        visca.inquiry_power(1)
+    assert visca.bandwidth.bytes - before == 5 + 4
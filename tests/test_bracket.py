@@ -0,0 +1,53 @@
+import pytest
+
+from pyviscalib.bracket import Bracket, MANUAL, SHUTTER_PRIORITY, IRIS_PRIORITY
+from pyviscalib.macro import MacroError
+
+
+def test_steps_on_cadence(visca):
+    bracket = Bracket(visca, 1, shutter=[0x0a, 0x0d, 0x10], cadence=0.02, lead=0.01, priority=0)
+    assert bracket.ae_mode == SHUTTER_PRIORITY
+    result = bracket.run()
+    assert result.ok
+    assert result.realtime is False
+    assert [s.values for s in result.steps] == [{'shutter': 0x0a}, {'shutter': 0x0d}, {'shutter': 0x10}]
+    assert all(s.jitter >= 0 for s in result.steps)
+    assert len(result.intervals()) == 2
+    assert all(i == pytest.approx(0.02, abs=0.01) for i in result.intervals())
+    assert visca.inquiry_AEMode(1) == bytes([SHUTTER_PRIORITY])
+
+
+def test_exposure_mode_follows_the_settings(visca):
+    assert Bracket(visca, 1, iris=[1, 2]).ae_mode == IRIS_PRIORITY
+    assert Bracket(visca, 1, iris=[1, 2], gain=[0, 3]).ae_mode == MANUAL
+    assert Bracket(visca, 1, shutter=[1], ae_mode=False).lead == 0.0
+
+
+def test_several_settings_per_step(visca):
+    result = Bracket(visca, 1, shutter=[0x0a, 0x10], gain=[0, 4], cadence=0.01,
+                     lead=0.0, priority=0).run()
+    assert result.ok
+    assert len(result.macro.steps) == 5
+    assert all(s.completed >= s.sent for s in result.steps)
+
+
+def test_bad_brackets(visca):
+    with pytest.raises(MacroError):
+        Bracket(visca, 1)
+    with pytest.raises(MacroError):
+        Bracket(visca, 1, shutter=[1, 2], iris=[1])
+
+
+def test_error_of_the_sending_thread_is_raised_by_join(visca, monkeypatch):
+    bracket = Bracket(visca, 1, shutter=[0x0a, 0x0d], cadence=0.01, lead=0.0, priority=0)
+
+    def broken(packet):
+        raise OSError('port gone')
+
+    monkeypatch.setattr(visca.transport, 'write', broken)
+    bracket.start()
+    with pytest.raises(OSError, match='port gone'):
+        bracket.join()
+    assert bracket.join() is None
+    monkeypatch.undo()
+    assert bracket.run().ok
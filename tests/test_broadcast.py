@@ -0,0 +1,27 @@
+from pyviscalib.watchdog import HealthWatchdog
+
+
+def test_timed_sees_a_broadcast(make_visca):
+    visca = make_visca(devices=2)
+    assert visca.devices == 2
+    with visca.timed() as transactions:
+        replies = visca.cmd_cam_power_all(0x02)
+    assert replies == {1: b'\x90\x51\xff', 2: b'\xa0\x51\xff'}
+    assert sorted(t.recipient for t in transactions) == [1, 2]
+
+
+def test_broadcast_replies_reach_the_watchdog(make_visca):
+    visca = make_visca(devices=2)
+    watchdog = HealthWatchdog(visca, devices=[1, 2], recover=False)
+    visca.watchdog = watchdog
+    visca.cmd_cam_zoom_direct_all(3)
+    assert watchdog[1].samples == watchdog[2].samples == 1
+
+
+def test_device_whose_profile_refuses_is_not_waited_for(make_visca):
+    visca = make_visca(devices=2)
+    visca.set_profile(2, 'FCB-EV7500')
+    replies = visca.send_broadcast_command(b'\x01\x06\x04')
+    assert replies[2] == b'\xa0\x60\x02\xff'
+    assert replies[1] == b'\x90\x51\xff'
+    assert visca.rejected == 1
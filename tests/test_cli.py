@@ -0,0 +1,54 @@
+import io
+
+from pyviscalib import cli
+
+
+def run(capfd, *argv):
+    status = cli.main(['--port', 'loop://', '--no-timing'] + list(argv))
+    out, err = capfd.readouterr()
+    return status, out.splitlines()[-1] if out.strip() else '', err
+
+
+def test_register_arguments_are_bytes(capfd):
+    assert run(capfd, 'register-set', '0x72', '0x01')[0] == 0
+    status, out, err = run(capfd, 'get', 'register-raw', '0x72')
+    assert (status, out) == (0, '01')
+
+
+def test_bad_arguments_are_a_usage_error(capfd):
+    status, out, err = run(capfd, 'zoom', '1', '2', '3')
+    assert status == 2
+    assert err.startswith('error: ')
+    status, out, err = run(capfd, 'zoom', 'wide')
+    assert status == 2
+    assert err.startswith('error: ')
+
+
+def test_unknown_command(capfd):
+    status, out, err = run(capfd, 'no-such-thing')
+    assert status == 2
+    assert 'unknown command' in err
+
+
+def shell(visca, *lines):
+    out = io.StringIO()
+    sh = cli.Shell(cli.Runner(visca, timing=False, out=out))
+    for line in lines:
+        sh.onecmd(line)
+    return out.getvalue().splitlines()
+
+
+def test_shell_reports_errors_and_goes_on(visca, capfd):
+    lines = shell(visca, 'zoom "12', 'get "power', 'watch power "rate=2',
+                  'no-such-thing', 'get no-such-inquiry', 'watch power rate=fast',
+                  'get register-raw 0x72')
+    assert [l.split(':')[0] for l in lines[:-1]] == ['error'] * 6
+    assert lines[-1] == '00'
+    assert capfd.readouterr().out == ''
+
+
+def test_shell_usage_goes_to_runner_out(visca, capfd):
+    lines = shell(visca, 'get', 'watch rate=5', 'device x')
+    assert lines == ['usage: get <inquiry>', 'usage: watch <inquiry> [...] [rate=Hz]',
+                     'usage: device <n>']
+    assert capfd.readouterr().out == ''
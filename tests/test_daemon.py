@@ -0,0 +1,73 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from pyviscalib.daemon import ViscaClient, ViscaDaemon, RPCError
+
+
+@pytest.fixture
+def daemon(visca, tmp_path):
+    daemon = ViscaDaemon(visca, str(tmp_path / 'visca.sock'), cache_ttl=10)
+    daemon.start()
+    yield daemon
+    daemon.stop()
+
+
+def test_socket_is_private(daemon):
+    assert stat.S_IMODE(os.stat(daemon.path).st_mode) == 0o600
+
+
+def test_round_trip_and_cache(daemon):
+    with ViscaClient(daemon.path) as client:
+        assert client.inquiry_mirror_mode(1) is False
+        assert client.inquiry_mirror_mode(1) is False
+        assert daemon.hits == 1
+        client.cmd_cam_lr_reverse_on(1)
+        assert client.inquiry_mirror_mode(1) is True
+
+
+def test_inquiry_in_flight_during_a_command_is_not_cached(daemon, visca):
+    started = threading.Event()
+    proceed = threading.Event()
+    inquiry = visca.inquiry_mirror_mode
+
+    def slow_inquiry(device):
+        value = inquiry(device)
+        started.set()
+        proceed.wait(2)
+        return value
+    visca.inquiry_mirror_mode = slow_inquiry
+    try:
+        result = []
+        reader = threading.Thread(target=lambda: result.append(
+            daemon.call('inquiry_mirror_mode', [1])))
+        reader.start()
+        assert started.wait(2)
+        daemon.call('cmd_cam_lr_reverse_on', [1])
+        proceed.set()
+        reader.join()
+    finally:
+        del visca.inquiry_mirror_mode
+    assert result == [False]
+    assert daemon.call('inquiry_mirror_mode', [1]) is True
+
+
+def test_bus_level_calls_are_not_served(daemon):
+    with ViscaClient(daemon.path) as client:
+        with pytest.raises(AttributeError):
+            client.cmd_adress_set
+        with pytest.raises(RPCError, match='not allowed'):
+            client.call('cmd_if_clear_all')
+        assert client.inquiry_mirror_mode(1) is False
+
+
+def test_closed_port_is_an_error_not_an_exit(daemon, visca):
+    with ViscaClient(daemon.path) as client:
+        visca.transport.close()
+        with pytest.raises(RPCError, match='port is not open'):
+            client.cmd_cam_lr_reverse_on(1)
+        visca.transport.open()
+        client.cmd_cam_lr_reverse_on(1)
+        assert client.inquiry_mirror_mode(1) is True
@@ -0,0 +1,187 @@
+import os
+import select
+import threading
+import time
+import tty
+
+import pytest
+
+from pyviscalib.gateway import ViscaGateway
+from pyviscalib.protocol import encode
+from pyviscalib.simulator import ViscaSimulator
+from pyviscalib.transport import Transport, UDPTransport
+from pyviscalib.visca import ViscaControl
+
+
+class PtyCamera(threading.Thread):
+    """
+    a ViscaSimulator behind the master side of a pseudo terminal. With
+    hold set the COMPLETIONs are kept back until release().
+    """
+
+    def __init__(self, devices=1):
+        threading.Thread.__init__(self, daemon=True)
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.simulator = ViscaSimulator(devices)
+        self.hold = False
+        self.held = []
+        self._exit = False
+
+    def run(self):
+        while not self._exit:
+            ready, _, _ = select.select([self.master], [], [], 0.02)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 64)
+            except OSError:
+                break
+            for reply in self.simulator.receive_data(data):
+                if self.hold and reply[1] & 0xf0 == 0x50 and len(reply) == 3:
+                    self.held.append(reply)
+                else:
+                    os.write(self.master, reply)
+
+    def release(self):
+        held, self.held = self.held, []
+        for reply in held:
+            os.write(self.master, reply)
+
+    def stop(self):
+        self._exit = True
+        self.join()
+        os.close(self.master)
+
+
+class PtyTransport(Transport):
+    """
+    the slave side of the pseudo terminal, read like a serial port
+    """
+
+    def __init__(self, fd, timeout=1):
+        Transport.__init__(self, os.ttyname(fd), timeout)
+        self.fd = fd
+        self._open = False
+
+    def open(self):
+        self._open = True
+
+    def close(self):
+        self._open = False
+
+    def is_open(self):
+        return self._open
+
+    def read(self, size=1):
+        data = b''
+        deadline = time.monotonic() + self.timeout
+        while len(data) < size:
+            wait = deadline - time.monotonic()
+            if wait <= 0 or not select.select([self.fd], [], [], wait)[0]:
+                break
+            data += os.read(self.fd, size - len(data))
+        return data
+
+    def write(self, packet):
+        return os.write(self.fd, packet)
+
+    def in_waiting(self):
+        return 1 if select.select([self.fd], [], [], 0)[0] else 0
+
+
+@pytest.fixture
+def camera():
+    camera = PtyCamera()
+    camera.start()
+    yield camera
+    camera.stop()
+    os.close(camera.slave)
+
+
+@pytest.fixture
+def gateway(camera):
+    gateways = []
+
+    def make(**kwargs):
+        visca = ViscaControl(transport=PtyTransport(camera.slave, timeout=0.3))
+        visca.start()
+        gateway = ViscaGateway(visca, host='127.0.0.1', port=0, **kwargs)
+        gateway.start()
+        gateways.append(gateway)
+        return gateway
+    yield make
+    for gateway in gateways:
+        gateway.stop()
+
+
+def client_for(gateway):
+    client = UDPTransport('127.0.0.1', gateway.port, timeout=1, retransmit=0.5)
+    client.open()
+    return client
+
+
+def read_packet(transport):
+    packet = b''
+    while not packet.endswith(b'\xff'):
+        byte = transport.read(1)
+        if not byte:
+            return packet
+        packet += byte
+    return packet
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_round_trip(gateway):
+    client = client_for(gateway())
+    client.write(encode(0, 1, b'\x09\x04\x00'))
+    assert read_packet(client) == b'\x90\x50\x02\xff'
+    client.write(encode(0, 1, b'\x01\x04\x61\x02'))
+    assert read_packet(client) == b'\x90\x41\xff'
+    assert read_packet(client) == b'\x90\x51\xff'
+    client.write(encode(0, 1, b'\x09\x04\x61'))
+    assert read_packet(client) == b'\x90\x50\x02\xff'
+    client.close()
+
+
+def test_completion_goes_to_the_owner(gateway, camera):
+    gw = gateway()
+    first = client_for(gw)
+    second = client_for(gw)
+    camera.hold = True
+    first.write(encode(0, 1, b'\x01\x04\x07\x02'))
+    assert read_packet(first) == b'\x90\x41\xff'
+    (owner, stamp), = gw.visca.protocol.sockets.values()
+    assert owner[0].address == first.sock.getsockname()
+
+    # the other client is served while the socket is bound
+    second.write(encode(0, 1, b'\x09\x04\x00'))
+    assert read_packet(second) == b'\x90\x50\x02\xff'
+
+    camera.release()
+    assert read_packet(first) == b'\x90\x51\xff'
+    assert wait_for(lambda: not gw.visca.protocol.sockets)
+    second.timeout = 0.2
+    assert second.read(1) == b''
+    first.close()
+    second.close()
+
+
+def test_unanswered_sockets_and_idle_clients_expire(gateway, camera):
+    gw = gateway(completion_timeout=0.2, client_timeout=0.3)
+    client = client_for(gw)
+    camera.hold = True
+    client.write(encode(0, 1, b'\x01\x04\x07\x02'))
+    assert read_packet(client) == b'\x90\x41\xff'
+    assert len(gw.clients) == 1
+    assert wait_for(lambda: not gw.visca.protocol.sockets)
+    assert wait_for(lambda: not gw.clients)
+    client.close()
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from pyviscalib.group import ViscaGroup, GroupError
+from pyviscalib.watchdog import HealthWatchdog
+
+
+@pytest.fixture
+def rig(make_visca):
+    return make_visca(), make_visca()
+
+
+def test_call_on_every_port(rig):
+    left, right = rig
+    result = ViscaGroup([(left, 1), (right, 1)]).call('cmd_cam_lr_reverse_on')
+    assert result.ok
+    assert result.send_skew is not None and result.completion_skew is not None
+    assert left.inquiry_mirror_mode(1) is True
+    assert right.inquiry_mirror_mode(1) is True
+
+
+def test_call_each_and_inquiries(rig):
+    left, right = rig
+    group = ViscaGroup([(left, 1), (right, 1)])
+    assert group.call_each('cmd_cam_ae_mode', [(0x03,), (0x0A,)]).ok
+    result = group.call('inquiry_AEMode')
+    assert result.replies == [b'\x90\x50\x03\xff', b'\x90\x50\x0a\xff']
+
+
+def test_busy_port_sends_nothing(rig):
+    left, right = rig
+    sent = len(right.transport.responder.received)
+    left.mutex.acquire()
+    try:
+        result = ViscaGroup([(left, 1), (right, 1)], lock_timeout=0.05).call('cmd_cam_lr_reverse_on')
+    finally:
+        left.mutex.release()
+    assert not result.ok
+    assert [s.error for s in result.steps] == ['busy', 'aborted']
+    assert len(right.transport.responder.received) == sent
+
+
+def test_failing_port_does_not_hang_the_others(rig):
+    left, right = rig
+    error = OSError('port gone')
+
+    def write(packet):
+        raise error
+    left.transport.write = write
+    done = []
+    thread = threading.Thread(target=lambda: done.append(
+        ViscaGroup([(left, 1), (right, 1)], lock_timeout=1).call('cmd_cam_lr_reverse_on')))
+    thread.start()
+    thread.join(3)
+    assert done
+    result = done[0]
+    assert result.steps[0].error is error
+    assert not left.mutex.locked()
+
+
+def test_transactions_reach_the_watchdog_and_registry(rig):
+    left, right = rig
+    watchdog = HealthWatchdog(left, devices=[1], recover=False)
+    left.watchdog = watchdog
+    ViscaGroup([(left, 1), (right, 1)]).call('inquiry_power')
+    assert watchdog[1].samples == 1
+
+
+def test_budget_of_the_caller_applies(rig):
+    left, right = rig
+    left.transport.baudrate = 9600
+    left.bandwidth.set_budget('rig', max_share=0.03)
+    with left.bandwidth.consumer('rig'):
+        left.bandwidth.account(30)
+        result = ViscaGroup([(left, 1), (right, 1)], lock_timeout=0.05).call('cmd_cam_lr_reverse_on')
+    assert [s.error for s in result.steps] == ['budget', 'aborted']
+
+
+def test_unsupported_member_is_refused(rig):
+    left, right = rig
+    left.set_profile(1, 'FCB-EV7500')
+    with pytest.raises(GroupError):
+        ViscaGroup([(left, 1), (right, 1)]).prepare('cmd_pt_home')
@@ -0,0 +1,61 @@
+import pytest
+
+from pyviscalib.history import ZoomHistory
+
+
+def test_interpolates_between_samples():
+    history = ZoomHistory()
+    history.record(0.9, 1.1, 100)
+    history.record(1.9, 2.1, 200)
+    value, error = history.zoom_at(1.5)
+    assert value == pytest.approx(150)
+    assert error == pytest.approx(10)
+    assert history.zoom_at(0.5) is None
+
+
+def test_extrapolation_error_grows_with_age():
+    history = ZoomHistory()
+    history.record(0.9, 1.1, 100)
+    history.record(1.9, 2.1, 200)
+    near = history.zoom_at(2.5)
+    far = history.zoom_at(4.0)
+    assert near[0] == far[0] == 200
+    assert far[1] > near[1]
+
+
+def test_old_samples_of_a_resting_lens_are_uncertain():
+    history = ZoomHistory(max_speed=1000)
+    history.record(0.9, 1.1, 500)
+    history.record(1.9, 2.1, 500)
+    assert history.zoom_at(101.0) == (500, pytest.approx(99100))
+    assert history.zoom_at(2.0)[1] == pytest.approx(100)
+
+
+def test_single_sample_has_no_error_without_max_speed():
+    history = ZoomHistory()
+    history.record(0.9, 1.1, 100)
+    assert history.zoom_at(5.0) == (100, None)
+
+
+def test_single_sample_error_from_max_speed():
+    history = ZoomHistory(max_speed=1000)
+    history.record(0.9, 1.1, 100)
+    assert history.zoom_at(1.0)[1] == pytest.approx(100)
+    assert history.zoom_at(3.0)[1] == pytest.approx(2100)
+
+
+def test_ring_buffer_keeps_the_newest():
+    history = ZoomHistory(size=4)
+    for i in range(10):
+        history.record(i, i + 0.01, i)
+    assert len(history) == 4
+    assert [s[2] for s in history.samples()] == [6, 7, 8, 9]
+    assert history.latest()[2] == 9
+
+
+def test_filled_by_zoom_inquiries(visca):
+    visca.cmd_cam_zoom_direct(1, 4)
+    position = visca.inquiry_precise_zoom_position(1)
+    history = visca.zoom_history(1)
+    assert len(history) == 1
+    assert history.latest()[2] == position
@@ -0,0 +1,96 @@
+import pytest
+
+from pyviscalib.macro import Macro, MacroError
+from pyviscalib.packet import Packet, COMMAND
+from pyviscalib.simulator import ViscaSimulator
+
+
+class OneSocketCamera():
+    """
+    the COMPLETION of the first command only comes after the next
+    command, which the camera refuses with buffer full
+    """
+
+    def __init__(self):
+        self.simulator = ViscaSimulator()
+        self.received = self.simulator.received
+        self.held = None
+        self.first = True
+
+    def handle(self, packet):
+        replies = self.simulator.handle(packet)
+        if Packet(packet).type != COMMAND:
+            return replies
+        if self.held is not None:
+            held, self.held = self.held, None
+            return [b'\x90\x60\x03\xff', held]
+        if self.first:
+            self.first = False
+            self.held = replies.pop()
+        return replies
+
+
+def test_run_sends_every_step(visca):
+    cue = (Macro(visca, device=1)
+           .add('cmd_cam_lr_reverse_on')
+           .add('cmd_cam_zoom_direct', 4, delay=0.02)
+           .wait(0.01)
+           .add('cmd_cam_ud_reverse_on')
+           .compile())
+    assert cue.duration == pytest.approx(0.03)
+    result = cue.run()
+    assert result.ok
+    assert [s[0] for s in result.steps] == ['cmd_cam_lr_reverse_on', 'cmd_cam_zoom_direct',
+                                            'cmd_cam_ud_reverse_on']
+    assert len(result.jitter()) == 3
+    assert all(s[2] >= s[1] for s in result.steps)
+    assert visca.inquiry_mirror_mode(1) is True
+    assert visca.inquiry_flip_mode(1) is True
+
+
+def test_compiled_macro_replays(visca):
+    cue = Macro(visca).add('cmd_cam_lr_reverse_on').compile()
+    assert cue.run().ok
+    visca.cmd_cam_lr_reverse_off(1)
+    assert cue.run().ok
+    assert visca.inquiry_mirror_mode(1) is True
+
+
+@pytest.mark.parametrize('name, args', [
+    ('inquiry_power', ()),
+    ('cmd_cam_power_all', (2,)),
+    ('cmd_cam_no_such_thing', ()),
+    ('cmd_cam_zoom_direct', ()),
+])
+def test_compile_rejects(visca, name, args):
+    with pytest.raises(MacroError):
+        Macro(visca).add(name, *args).compile()
+
+
+def test_negative_wait(visca):
+    with pytest.raises(MacroError):
+        Macro(visca).wait(-1)
+
+
+def test_compile_refuses_what_the_profile_rejects(visca):
+    visca.set_profile(1, 'FCB-EV7500')
+    with pytest.raises(MacroError):
+        Macro(visca).add('cmd_pt_home').compile()
+
+
+def test_step_refused_with_buffer_full_is_sent_again(make_visca):
+    camera = OneSocketCamera()
+    visca = make_visca(responder=camera)
+    cue = (Macro(visca)
+           .add('cmd_cam_lr_reverse_on')
+           .add('cmd_cam_ud_reverse_on')
+           .compile())
+    sent = len(camera.received)
+    with visca.timed() as timings:
+        result = cue.run()
+    assert result.ok
+    assert len(camera.received) - sent == 3
+    first, second = result.steps
+    # sent again after the first step completed
+    assert second[2] >= first[4]
+    assert len(timings) == 3
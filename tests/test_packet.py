@@ -0,0 +1,107 @@
+import pytest
+
+from pyviscalib.packet import (Packet, ACK, COMPLETION, REPLY, ERROR, COMMAND, INQUIRY,
+                               NETWORK_CHANGE, ADDRESS_SET, IF_CLEAR, UNKNOWN,
+                               nibbles_to_int, int_to_nibbles, word_from_nibbles, raw_word)
+
+
+@pytest.mark.parametrize('raw, kind', [
+    (b'\x90\x41\xff', ACK),
+    (b'\x90\x51\xff', COMPLETION),
+    (b'\x90\x50\x02\xff', REPLY),
+    (b'\x90\x61\x41\xff', ERROR),
+    (b'\x81\x01\x04\x07\x02\xff', COMMAND),
+    (b'\x81\x09\x04\x00\xff', INQUIRY),
+    (b'\x81\x01\x00\x01\xff', IF_CLEAR),
+    (b'\x88\x01\x00\x01\xff', IF_CLEAR),
+    (b'\x88\x30\x01\xff', ADDRESS_SET),
+    (b'\x88\x01\x04\x00\x02\xff', COMMAND),
+    (b'\x90\x38\xff', NETWORK_CHANGE),
+    (b'\x90\x41', UNKNOWN),
+    (b'\x90\xff', UNKNOWN),
+])
+def test_classification(raw, kind):
+    assert Packet(raw).type == kind
+
+
+def test_reply_fields():
+    p = Packet(b'\xb0\x52\x01\x02\x03\x04\xff')
+    assert p.sender == 3
+    assert p.recipient == 0
+    assert not p.broadcast
+    assert p.socket == 2
+    assert p.is_final
+    assert bytes(p.payload) == b'\x01\x02\x03\x04'
+    assert p.word() == 0x1234
+    assert p.raw_word() == 0x01020304
+    assert p.error_code is None
+
+
+def test_error_fields():
+    p = Packet(b'\xa0\x61\x41\xff')
+    assert p.sender == 2
+    assert p.socket == 1
+    assert p.error_code == 0x41
+    assert p.error_message == 'Command not executable'
+    assert Packet(b'\x90\x60\x7e\xff').error_message == 'Unknown error 7e'
+
+
+def test_ack_is_not_final():
+    p = Packet(b'\x90\x43\xff')
+    assert p.socket == 3
+    assert not p.is_final
+
+
+def test_command_fields():
+    p = Packet(b'\x83\x01\x04\x47\x01\x02\x03\x04\xff')
+    assert p.sender == 0
+    assert p.recipient == 3
+    assert p.socket is None
+    assert bytes(p.data) == b'\x47\x01\x02\x03\x04'
+    broadcast = Packet(b'\x88\x01\x04\x00\x02\xff')
+    assert broadcast.broadcast
+    assert broadcast.recipient == -1
+
+
+def test_signed_word():
+    p = Packet(b'\x90\x50\x0f\x0f\x0f\x0e\xff')
+    assert p.word() == 0xfffe
+    assert p.word(signed=True) == -2
+
+
+def test_packet_wraps_memoryview():
+    data = bytearray(b'\x00\x90\x50\x0a\x0b\xff')
+    p = Packet(memoryview(data)[1:])
+    assert p.type == REPLY
+    assert p.byte_from_nibbles() == 0xab
+    assert p == b'\x90\x50\x0a\x0b\xff'
+
+
+@pytest.mark.parametrize('value', [0, 1, 0x0fd, 0x4000, 0x7fff, 0xffff])
+def test_word_round_trip(visca, value):
+    encoded = visca.i2v(value)
+    assert len(encoded) == 4
+    assert all(b <= 0x0f for b in encoded)
+    assert encoded == int_to_nibbles(value)
+    assert word_from_nibbles(encoded) == value
+    assert nibbles_to_int(encoded) == value
+    assert visca.v2i(encoded) == value
+
+
+@pytest.mark.parametrize('value', [-0x8000, -1, 0, 1, 0x7fff])
+def test_signed_round_trip(visca, value):
+    encoded = int_to_nibbles(value)
+    assert nibbles_to_int(encoded, signed=True) == value
+    assert visca.v2i(encoded, signed=True) == value
+
+
+@pytest.mark.parametrize('count', [1, 2, 3, 5, 8])
+def test_nibble_counts_round_trip(count):
+    top = (1 << (count * 4)) - 1
+    for value in (0, 1, top // 3, top):
+        assert nibbles_to_int(int_to_nibbles(value, count), count=count) == value
+
+
+def test_raw_word_is_big_endian_bytes():
+    assert raw_word(b'\x01\x02\x03\x04') == 0x01020304
+    assert raw_word(b'\xff\x01\x02\x03\x04', 1) == 0x01020304
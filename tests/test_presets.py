@@ -0,0 +1,20 @@
+from pyviscalib import presets
+
+
+def test_recall_sends_only_differences(visca, tmp_path):
+    library = presets.PresetLibrary(str(tmp_path / 'presets.json'))
+    library.store(visca, 1, 'plain')
+    visca.cmd_cam_lr_reverse_on(1)
+    assert library.recall(visca, 1, 'plain') == ['mirror']
+    assert visca.inquiry_mirror_mode(1) is False
+    assert library.recall(visca, 1, 'plain') == []
+
+
+def test_exposure_settings_follow_ae_mode(visca):
+    changes = {'shutter': 0x10, 'aperture': 0x08}
+    assert presets.apply(visca, 1, dict(changes, ae_mode=0x00)) == ['ae_mode']
+    assert presets.apply(visca, 1, dict(changes, ae_mode=0x0A)) == ['ae_mode', 'shutter']
+    assert presets.apply(visca, 1, dict(changes, ae_mode=0x0B)) == ['ae_mode', 'aperture']
+    assert presets.apply(visca, 1, dict(changes, ae_mode=0x03)) == ['ae_mode', 'shutter', 'aperture']
+    # unchanged mode: the one the device is in
+    assert presets.apply(visca, 1, dict(changes), ae_mode=0x0A) == ['shutter']
@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+from pyviscalib import profiles
+from pyviscalib.profiles import CameraProfile, ProfileError, FCB_EV7500
+
+
+EV7500_VERSION = b'\x00\x20\x07\x12\x01\x00\x02'
+
+REJECTED = b'\x90\x60\x02\xff'
+
+
+@pytest.fixture(autouse=True)
+def known_profiles(monkeypatch):
+    # profiles registered by a test are forgotten after it
+    monkeypatch.setattr(profiles, 'PROFILES', list(profiles.PROFILES))
+
+
+def set_version(visca, device, version):
+    visca.transport.responder.state[device][(0x00, 0x02)] = version
+
+
+def test_version_inquiry_picks_profile_of_exact_model(visca):
+    set_version(visca, 1, EV7500_VERSION)
+    assert visca.inquiry_version(1)[:2] == (0x0020, 0x0712)
+    assert visca.profile(1) is FCB_EV7500
+    assert visca.cmd_cam_digital_effect_still(1) == REJECTED
+    assert visca.rejected == 1
+
+
+def test_other_model_of_same_vendor_is_not_checked(visca):
+    assert visca.inquiry_version(1)[:2] == (0x0020, 0x0465)
+    assert visca.profile(1) is None
+    assert visca.cmd_pt_home(1) != REJECTED
+    assert visca.rejected == 0
+
+
+def test_find_matches_vendor_and_model():
+    assert profiles.find(0x0020, 0x0712) is FCB_EV7500
+    assert profiles.find(0x0020, 0x0713) is None
+    assert profiles.find(0x0021, 0x0712) is None
+
+
+def test_last_registered_profile_wins():
+    newer = profiles.register(CameraProfile('FCB-EV7500 rev2', vendor=0x0020, models=(0x0712,)))
+    assert profiles.find(0x0020, 0x0712) is newer
+    assert profiles.find_name('FCB-EV7500') is FCB_EV7500
+
+
+def test_from_dict_inherits_missing_keys_from_base():
+    p = CameraProfile.from_dict({'name': 'FCB-EV7520', 'vendor': '0020', 'models': ['0713'],
+                                 'base': 'FCB-EV7500',
+                                 'values': {'04 63': ['00', '02']},
+                                 'ranges': {'shutter_speed': [0, 0x10]}})
+    assert p.models == (0x0713,)
+    assert p.commands is FCB_EV7500.commands
+    assert p.zoom_settings == FCB_EV7500.zoom_settings
+    assert p.values == {(0x04, 0x63): {0x00, 0x02}}
+    assert p.ranges['shutter_speed'] == (0, 0x10)
+    assert 'iris' not in p.ranges
+    assert p.check(b'\x01\x04\x63\x02') is None
+    assert p.check(b'\x01\x04\x63\x04') is not None
+    assert p.check(b'\x01\x04\x64\x02') is not None
+
+
+def test_from_dict_null_turns_checks_off():
+    p = CameraProfile.from_dict({'name': 'open', 'base': 'FCB-EV7500', 'commands': None})
+    assert p.commands is None
+    assert p.check(b'\x01\x06\x04') is None
+    assert p.check(b'\x09\x06\x12') is not None
+
+
+def test_from_dict_errors():
+    with pytest.raises(ProfileError):
+        CameraProfile.from_dict({'vendor': '0020'})
+    with pytest.raises(ProfileError):
+        CameraProfile.from_dict({'name': 'x', 'base': 'no such profile'})
+    with pytest.raises(ProfileError):
+        CameraProfile.from_dict({'name': 'x', 'vendor': 'zz'})
+
+
+def test_load_registers_profile(tmp_path, make_visca):
+    path = str(tmp_path / 'profile.json')
+    with open(path, 'w') as f:
+        json.dump({'name': 'test camera', 'vendor': '0020', 'models': ['0465'],
+                   'commands': {'04': ['00', '07']}, 'inquiries': {'00': ['02']}}, f)
+    loaded = profiles.load(path)
+    assert profiles.find(0x0020, 0x0465) is loaded
+    visca = make_visca()
+    visca.inquiry_version(1)
+    assert visca.profile(1) is loaded
+    assert visca.cmd_cam_zoom_stop(1) != REJECTED
+    assert visca.cmd_cam_lr_reverse_on(1) == REJECTED
+
+
+def test_set_profile_by_name_and_off(visca):
+    visca.set_profile(1, 'FCB-EV7500')
+    assert visca.profile(1) is FCB_EV7500
+    visca.set_profile(1, None)
+    assert visca.profile(1) is None
+    with pytest.raises(ProfileError):
+        visca.set_profile(1, 'no such profile')
+
+
+@pytest.mark.parametrize('method, top, above, bottom', [
+    ('cmd_cam_shutter_speed', [0x15], [0x16], [0x00]),
+    ('cmd_cam_aperture_direct', 0x0f, 0x10, 0x00),
+    ('cmd_cam_iris_direct', 0x11, 0x12, 0x00),
+    ('cmd_cam_gain_direct', 0x0f, 0x10, 0x00),
+])
+def test_out_of_range_values_are_rejected(visca, method, top, above, bottom):
+    visca.set_profile(1, 'FCB-EV7500')
+    call = getattr(visca, method)
+    sent = len(visca.transport.responder.received)
+    assert call(1, above) == REJECTED
+    assert len(visca.transport.responder.received) == sent
+    assert visca.rejected == 1
+    assert call(1, top) != REJECTED
+    assert call(1, bottom) != REJECTED
+    assert visca.rejected == 1
+
+
+def test_out_of_range_needs_a_profile(visca):
+    assert visca.cmd_cam_gain_direct(1, 0x40) != REJECTED
+    assert visca.rejected == 0
@@ -0,0 +1,158 @@
+from pyviscalib.packet import ACK, COMPLETION, REPLY, ERROR, UNKNOWN
+from pyviscalib.protocol import Framer, ViscaProtocol, TIMEOUT, MAX_PACKET
+
+
+def test_ack_binds_socket_to_owner():
+    protocol = ViscaProtocol()
+    protocol.start(1, owner='zoom')
+    event, = protocol.receive_data(b'\x90\x41\xff')
+    assert event.type == ACK
+    assert event.owner == 'zoom'
+    assert event.final
+    assert protocol.pending is None
+    assert protocol.sockets[(1, 1)][0] == 'zoom'
+    assert protocol.owners() == ['zoom']
+
+
+def test_late_completion_goes_to_its_owner():
+    protocol = ViscaProtocol()
+    protocol.start(1, owner='zoom')
+    protocol.receive_data(b'\x90\x41\xff')
+    protocol.start(1, inquiry=True, owner='power')
+    completion, reply = protocol.receive_data(b'\x90\x51\xff\x90\x50\x02\xff')
+    assert completion.type == COMPLETION
+    assert completion.owner == 'zoom'
+    assert not completion.final
+    assert reply.type == REPLY
+    assert reply.owner == 'power'
+    assert reply.final
+    assert protocol.sockets == {}
+
+
+def test_inquiry_reply_without_ack():
+    protocol = ViscaProtocol()
+    protocol.start(2, inquiry=True, owner='position')
+    event, = protocol.receive_data(b'\xa0\x50\x01\x02\x03\x04\xff')
+    assert event.type == REPLY
+    assert event.owner == 'position'
+    assert event.final
+    assert event.packet.word() == 0x1234
+    assert protocol.sockets == {}
+
+
+def test_ack_of_inquiry_does_not_end_it():
+    protocol = ViscaProtocol()
+    protocol.start(1, inquiry=True, owner='power')
+    ack, reply = protocol.receive_data(b'\x90\x41\xff\x90\x50\x02\xff')
+    assert ack.owner == 'power'
+    assert not ack.final
+    assert reply.final
+    assert protocol.sockets == {}
+
+
+def test_reply_of_another_device_is_not_routed():
+    protocol = ViscaProtocol()
+    protocol.start(1, inquiry=True, owner='power')
+    event, = protocol.receive_data(b'\xa0\x50\x02\xff')
+    assert event.owner is None
+    assert not event.final
+    assert protocol.pending is not None
+
+
+def test_error_ends_request():
+    protocol = ViscaProtocol()
+    protocol.start(1, owner='effect')
+    event, = protocol.receive_data(b'\x90\x60\x02\xff')
+    assert event.type == ERROR
+    assert event.packet.error_code == 0x02
+    assert event.owner == 'effect'
+    assert event.final
+
+
+def test_error_on_bound_socket_goes_to_its_owner():
+    protocol = ViscaProtocol()
+    protocol.start(1, owner='zoom')
+    protocol.receive_data(b'\x90\x42\xff')
+    protocol.start(1, inquiry=True, owner='power')
+    event, = protocol.receive_data(b'\x90\x62\x41\xff')
+    assert event.type == ERROR
+    assert event.owner == 'zoom'
+    assert not event.final
+    assert protocol.pending is not None
+
+
+def test_timeout_carries_partial_packet():
+    protocol = ViscaProtocol()
+    protocol.start(1, owner='zoom')
+    assert protocol.receive_data(b'\x90\x41') == []
+    event = protocol.timeout()
+    assert event.type == TIMEOUT
+    assert event.raw == b'\x90\x41'
+    assert event.packet is None
+    assert event.owner == 'zoom'
+    assert event.final
+    assert protocol.pending is None
+    assert len(protocol.framer) == 0
+
+
+def test_timeout_without_request():
+    event = ViscaProtocol().timeout()
+    assert event.owner is None
+    assert not event.final
+
+
+def test_unanswered_inquiry_gives_up_after_packet_limit():
+    protocol = ViscaProtocol()
+    protocol.start(1, inquiry=True)
+    events = protocol.receive_data(b'\xa0\x50\x02\xff' * ViscaProtocol.INQUIRY_PACKETS)
+    assert [e.final for e in events] == [False] * (ViscaProtocol.INQUIRY_PACKETS - 1) + [True]
+
+
+def test_expire_and_forget():
+    now = [0.0]
+    protocol = ViscaProtocol(clock=lambda: now[0])
+    protocol.start(1, owner='a')
+    protocol.receive_data(b'\x90\x41\xff')
+    now[0] = 1.0
+    protocol.start(2, owner='b')
+    protocol.receive_data(b'\xa0\x42\xff')
+    assert protocol.expire(0.5, now=1.2) == ['a']
+    assert protocol.forget(2) == ['b']
+    assert protocol.sockets == {}
+
+
+def test_framer_splits_and_joins_packets():
+    framer = Framer()
+    assert framer.feed(b'\x90\x41\xff\x90') == [b'\x90\x41\xff']
+    assert len(framer) == 1
+    assert framer.feed(b'\x51\xff') == [b'\x90\x51\xff']
+    assert len(framer) == 0
+
+
+def test_framer_resyncs_after_garbage():
+    protocol = ViscaProtocol()
+    protocol.start(1, owner='zoom')
+    garbage, ack = protocol.receive_data(b'\x13\x37\xff\x90\x41\xff')
+    assert garbage.type == UNKNOWN
+    assert not garbage.final
+    assert ack.type == ACK
+    assert ack.owner == 'zoom'
+
+
+def test_framer_overflow_cuts_unterminated_bytes():
+    framer = Framer()
+    frames = framer.feed(bytes(range(20)))
+    assert frames == [bytes(range(MAX_PACKET))]
+    assert len(framer) == 20 - MAX_PACKET
+    assert framer.flush() == bytes(range(MAX_PACKET, 20))
+    assert framer.feed(b'\x90\x41\xff') == [b'\x90\x41\xff']
+
+
+def test_unterminated_packet_ends_request():
+    protocol = ViscaProtocol()
+    protocol.start(1, owner='zoom')
+    event, = protocol.receive_data(b'\x01' * MAX_PACKET)
+    assert event.type == UNKNOWN
+    assert not event.packet.terminated
+    assert event.owner == 'zoom'
+    assert event.final
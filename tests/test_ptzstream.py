@@ -0,0 +1,123 @@
+import time
+
+import pytest
+
+from pyviscalib.bandwidth import BandwidthManager
+from pyviscalib.ptzstream import PTZStream, PTZSample
+from pyviscalib.transport import SerialTransport
+
+PT_POSITION = b'\x09\x06\x12'
+ZOOM_POSITION = b'\x09\x04\x47'
+
+
+def run(stream, seconds):
+    """
+    runs the stream, returns the inquiries it sent (QQ RR opcode)
+    """
+    received = stream.visca.transport.responder.received
+    before = len(received)
+    stream.start()
+    time.sleep(seconds)
+    stream.stop()
+    return [bytes(p[1:4]) for p in received[before:]]
+
+
+def test_pan_tilt_moves(visca):
+    visca.cmd_pt_absolute(1, -100, 50)
+    assert visca.inquiry_pt_position(1) == (-100, 50)
+    visca.cmd_pt_relative(1, 10, -20)
+    assert visca.inquiry_pt_position(1) == (-90, 30)
+    visca.cmd_pt_home(1)
+    assert visca.inquiry_pt_position(1) == (0, 0)
+    visca.cmd_pt_absolute(1, 0x7fff, -0x8000)
+    assert visca.inquiry_pt_position(1) == (0x7fff, -0x8000)
+
+
+def test_pan_tilt_packets(visca):
+    received = visca.transport.responder.received
+    visca.cmd_pt_left(1, 5, 6)
+    assert received[-1] == b'\x81\x01\x06\x01\x05\x06\x01\x03\xff'
+    visca.cmd_pt_downright(1)
+    assert received[-1] == b'\x81\x01\x06\x01\x18\x18\x02\x02\xff'
+    visca.cmd_pt_stop(1)
+    assert received[-1] == b'\x81\x01\x06\x01\x18\x18\x03\x03\xff'
+    visca.cmd_pt_absolute(1, -1, 2, pan_speed=0, tilt_speed=100)
+    assert received[-1] == (b'\x81\x01\x06\x02\x01\x18'
+                            b'\x0f\x0f\x0f\x0f\x00\x00\x00\x02\xff')
+    visca.cmd_pt_limit_set(1, 1, 0x100, -0x100)
+    assert received[-1] == (b'\x81\x01\x06\x07\x00\x01'
+                            b'\x00\x01\x00\x00\x0f\x0f\x00\x00\xff')
+    visca.cmd_pt_limit_clear(1, 0)
+    assert received[-1] == (b'\x81\x01\x06\x07\x01\x00'
+                            b'\x07\x0f\x0f\x0f\x07\x0f\x0f\x0f\xff')
+
+
+def test_pan_tilt_inquiries(visca):
+    assert visca.inquiry_pt_mode(1) == 0x0010
+    assert visca.inquiry_pt_max_speed(1) == (0x18, 0x17)
+    assert visca.inquiry_pt_position(2) is None
+
+
+def test_max_staleness():
+    assert PTZStream(None, 1, rate=10).max_staleness() == pytest.approx(0.2)
+    stream = PTZStream(None, 1, rate=10, schedule=('pt', 'pt', 'zoom'))
+    assert stream.max_staleness() == pytest.approx(0.3)
+    stream = PTZStream(None, 1, rate=10, schedule=('pt', 'zoom', 'pt', 'pt'))
+    assert stream.max_staleness() == pytest.approx(0.4)
+    assert PTZStream(None, 1, rate=10, schedule=('pt',)).max_staleness() == pytest.approx(0.1)
+    with pytest.raises(ValueError):
+        PTZStream(None, 1, schedule=('pt', 'focus'))
+
+
+def test_poll_keeps_latest_of_both(visca):
+    visca.cmd_pt_absolute(1, 20, -10)
+    stream = PTZStream(visca, 1)
+    first = stream.poll('pt')
+    assert (first.pan, first.tilt, first.zoom) == (20, -10, None)
+    assert first.zoom_time is None
+    second = stream.poll('zoom')
+    assert (second.pan, second.tilt, second.zoom) == (20, -10, 0)
+    assert second.pt_time == first.pt_time
+    assert second.staleness() == second.time - first.pt_time
+    assert stream.latest is second
+
+
+def test_interleaved_schedule(visca):
+    stream = PTZStream(visca, 1, rate=200, schedule=('pt', 'pt', 'zoom'))
+    samples = []
+    stream.subscribe(samples.append)
+    polled = run(stream, 0.1)
+    assert len(polled) >= 6
+    assert polled == [(PT_POSITION, PT_POSITION, ZOOM_POSITION)[i % 3]
+                      for i in range(len(polled))]
+    assert len(samples) == len(polled)
+    assert all(isinstance(s, PTZSample) for s in samples)
+    assert samples[-1].staleness() <= stream.max_staleness() + 0.05
+
+
+def test_failing_subscriber_does_not_stop_the_stream(visca):
+    stream = PTZStream(visca, 1)
+    seen = []
+
+    def broken(sample):
+        raise RuntimeError('broken')
+
+    stream.subscribe(broken)
+    stream.subscribe(seen.append)
+    stream.poll('pt')
+    stream.unsubscribe(broken)
+    stream.poll('zoom')
+    assert len(seen) == 2
+
+
+def test_slots_over_budget_are_thinned(visca):
+    # 9600 baud accounting: about 1 ms per byte
+    visca.bandwidth = BandwidthManager(SerialTransport('/dev/null'))
+    # a pt poll (5 + 11 bytes) and a zoom poll (5 + 7 bytes) fit, a third
+    # does not
+    visca.bandwidth.set_budget('ptz', max_share=0.03)
+    stream = PTZStream(visca, 1, rate=100)
+    assert run(stream, 0.2) == [PT_POSITION, ZOOM_POSITION]
+    assert stream.thinned >= 5
+    wire_time = visca.bandwidth.transport.wire_time(16 + 12)
+    assert visca.bandwidth.utilization('ptz') == pytest.approx(wire_time)
@@ -0,0 +1,43 @@
+from pyviscalib import registers
+from pyviscalib.registers import RegisterImage
+
+
+def test_inquiry_register_without_meaning_is_raw(visca):
+    assert visca.inquiry_register(1, b'\x72') == b'\x00'
+    assert visca.inquiry_register(1, b'\x50') == b'\x00'
+    assert visca.inquiry_register(3, b'\x72') is None
+
+
+def test_inquiry_register_meaning(visca):
+    value, meaning = next(iter(visca.REGISTER_VALUES[b'\x72'].items()))
+    visca.cmd_cam_register_set(1, b'\x72', value)
+    assert visca.inquiry_register(1, b'\x72') == meaning
+
+
+def test_dump_write_and_verify(visca):
+    wanted = {0x50: 0x01, 0x51: 0x22, 0x72: 0x03}
+    assert registers.write_registers(visca, 1, wanted) == {}
+    values, errors = registers.read_registers(visca, 1, sorted(wanted))
+    assert values == wanted
+    assert errors == {}
+    assert registers.verify(visca, 1, wanted) == {}
+
+
+def test_restore_sends_only_differences(visca, tmp_path):
+    registers.write_registers(visca, 1, {0x50: 0x01, 0x51: 0x02})
+    image = registers.dump(visca, 1, [0x50, 0x51])
+    path = str(tmp_path / 'image.json')
+    image.save(path)
+    registers.write_registers(visca, 1, {0x51: 0x05})
+    loaded = RegisterImage.load(path)
+    assert dict(loaded.values) == {0x50: 0x01, 0x51: 0x02}
+    registers.restore(visca, 1, loaded)
+    assert registers.read_registers(visca, 1, [0x50, 0x51])[0] == {0x50: 0x01, 0x51: 0x02}
+
+
+def test_dump_inquiries_are_transactions(visca):
+    with visca.timed() as timings:
+        registers.read_registers(visca, 1, [0x50, 0x51, 0x52])
+    assert [t.recipient for t in timings] == [1, 1, 1]
+    assert all(t.inquiry for t in timings)
+    assert [t.rx_bytes for t in timings] == [5, 5, 5]
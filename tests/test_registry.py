@@ -0,0 +1,68 @@
+from pyviscalib.registry import DeviceRegistry, ViscaDevice
+from pyviscalib.simulator import ViscaSimulator
+from pyviscalib.transport import LoopbackTransport
+from pyviscalib.visca import ViscaControl
+
+
+def test_enumerate_describes_every_device(make_visca):
+    visca = make_visca(devices=2)
+    registry = DeviceRegistry().enumerate(visca)
+    assert len(registry) == 2
+    assert [d.address for d in registry] == [1, 2]
+    for device in registry:
+        assert (device.vendor, device.model) == (0x0020, 0x0465)
+        assert device.capabilities == {'camera', 'pan_tilt'}
+
+
+def test_enumerate_keeps_silent_devices(make_visca):
+    visca = make_visca(devices=1)
+    registry = DeviceRegistry().enumerate(visca, count=2)
+    assert registry[2].vendor is None
+    assert registry[2].capabilities == set()
+
+
+def test_save_load_round_trip(make_visca, tmp_path):
+    visca = make_visca(devices=2)
+    registry = DeviceRegistry().enumerate(visca)
+    path = str(tmp_path / 'bus.json')
+    registry.save(path)
+    loaded = DeviceRegistry.load(path)
+    assert [d.to_dict() for d in loaded] == [d.to_dict() for d in registry]
+
+
+def test_probe_checks_every_device(make_visca):
+    visca = make_visca(devices=3)
+    registry = DeviceRegistry().enumerate(visca)
+    assert registry.probe(visca)
+    # a camera swapped in the middle of the chain
+    visca.transport.responder.state[2][(0x00, 0x02)] = b'\x00\x20\x07\x12\x01\x00\x02'
+    assert not registry.probe(visca)
+
+
+def test_probe_of_shorter_chain_fails(make_visca):
+    registry = DeviceRegistry([ViscaDevice(1, 0x0020, 0x0465), ViscaDevice(2, 0x0020, 0x0465)])
+    assert not registry.probe(make_visca(devices=1))
+    assert not DeviceRegistry().probe(make_visca(devices=1))
+
+
+def test_start_with_valid_bus_map_skips_enumeration(make_visca, tmp_path):
+    path = str(tmp_path / 'bus.json')
+    make_visca(devices=2).enumerate_devices(path)
+    simulator = ViscaSimulator(2)
+    visca = ViscaControl(transport=LoopbackTransport(simulator, timeout=0.2))
+    visca.start(bus_map=path)
+    assert visca.devices == 2
+    assert [d.address for d in visca.registry] == [1, 2]
+    # version inquiries only, no address set
+    assert [p[1:4] for p in simulator.received] == [b'\x09\x00\x02', b'\x09\x00\x02']
+
+
+def test_stats_are_recorded(make_visca):
+    visca = make_visca(devices=2)
+    visca.enumerate_devices(count=2)
+    visca.inquiry_power(2)
+    visca.cmd_cam_zoom_stop(2)
+    stats = visca.registry[2].stats
+    assert stats.inquiries >= 1
+    assert stats.commands == 1
+    assert stats.timeouts == 0
@@ -0,0 +1,41 @@
+from pyviscalib.profiles import CameraProfile
+from pyviscalib.registers import read_registers, write_registers
+
+
+def test_batch_runs_in_order(visca):
+    with visca.session(1) as s:
+        s.cmd_cam_lr_reverse_on()
+        s.cmd_cam_ud_reverse_on()
+        s.inquiry_mirror_mode()
+    assert s.ok
+    assert s.replies == [b'\x90\x51\xff', b'\x90\x51\xff', b'\x90\x50\x02\xff']
+    assert s.errors == {}
+    assert len(s.holds) == 1
+    assert visca.inquiry_flip_mode(1) is True
+
+
+def test_lock_is_given_up_after_max_hold(visca):
+    with visca.session(1, max_hold=0) as s:
+        for i in range(3):
+            s.cmd_cam_lr_reverse_on()
+    assert s.ok
+    assert len(s.holds) == 3
+
+
+def test_rejected_call_keeps_replies_in_order(visca):
+    visca.set_profile(1, 'FCB-EV7500')
+    with visca.session(1) as s:
+        s.cmd_cam_lr_reverse_on()
+        s.cmd_pt_home()
+        s.cmd_cam_ud_reverse_on()
+    assert not s.ok
+    assert s.errors == {1: 0x02}
+    assert s.replies == [b'\x90\x51\xff', b'\x90\x60\x02\xff', b'\x90\x51\xff']
+
+
+def test_rejected_register_write_is_reported_for_its_register(visca):
+    visca.set_profile(1, CameraProfile('test', values={(0x04, 0x24): {0x51, 0x72}}))
+    errors = write_registers(visca, 1, {0x51: 0x01, 0x60: 0x02, 0x72: 0x03})
+    assert errors == {0x60: 0x02}
+    values, errors = read_registers(visca, 1, [0x51, 0x72])
+    assert values == {0x51: 0x01, 0x72: 0x03}
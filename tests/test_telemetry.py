@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+from pyviscalib import telemetry
+from pyviscalib.telemetry import (TelemetryPublisher, TelemetryReader, TelemetryError,
+                                  HEADER, MAGIC, SEQUENCE, UNKNOWN, UNKNOWN_ZOOM)
+
+
+@pytest.fixture
+def publisher(visca, tmp_path):
+    publisher = TelemetryPublisher(visca, 1, path=str(tmp_path / 'telemetry'))
+    yield publisher
+    publisher.close()
+
+
+class ScriptedSequence():
+    """
+    stands in for telemetry.SEQUENCE: the first reads return the script,
+    then the real sequence
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+
+    def unpack_from(self, buffer, offset):
+        if self.script:
+            return (self.script.pop(0),)
+        return SEQUENCE.unpack_from(buffer, offset)
+
+
+def test_reader_sees_published_values(publisher):
+    with TelemetryReader(publisher.path) as reader:
+        state = reader.read()
+        assert state.zoom_raw == UNKNOWN_ZOOM
+        assert state.mirror == UNKNOWN
+        assert state.updates == 0
+        publisher.publish(zoom_raw=0x4000, zoom_index=29, mirror=1)
+        state = reader.read()
+        assert state.updates == 1
+        assert state.sequence == 4
+        assert state.mirror == 1
+        assert reader.zoom() == (0x4000, 29)
+        assert state.age() >= 0
+
+
+def test_poll_publishes_camera_state(visca, publisher):
+    visca.cmd_cam_lr_reverse_on(1)
+    assert publisher.poll_zoom()
+    publisher.poll_mode()
+    publisher.poll_mode()
+    with TelemetryReader(publisher.path) as reader:
+        state = reader.read()
+    assert state.zoom_raw == 0
+    assert state.zoom_index == 0
+    assert state.power == 1
+    assert state.mirror == 1
+
+
+def test_unknown_field_is_refused(publisher):
+    with pytest.raises(TelemetryError):
+        publisher.publish(focus=1)
+
+
+def test_read_retries_while_publisher_writes(publisher, monkeypatch):
+    publisher.publish(zoom_raw=1, zoom_index=0)
+    reader = TelemetryReader(publisher.path)
+    # odd: being written; 4 -> 6: written while copied
+    sequence = ScriptedSequence([5, 4, 6, 6, 6])
+    monkeypatch.setattr(telemetry, 'SEQUENCE', sequence)
+    sequence_read, values = reader.read_values()
+    assert sequence_read == 6
+    assert values[2] == 1
+    assert sequence.script == []
+    monkeypatch.setattr(telemetry, 'SEQUENCE', ScriptedSequence([7] * 3))
+    assert reader.read_values(spins=3) is None
+    reader.close()
+
+
+def test_reads_are_consistent_while_publishing(publisher):
+    done = threading.Event()
+
+    def write():
+        n = 0
+        while not done.is_set():
+            n = (n + 1) % 30000
+            publisher.publish(zoom_raw=n, zoom_index=n)
+
+    writers = [threading.Thread(target=write) for i in range(2)]
+    for writer in writers:
+        writer.start()
+    try:
+        with TelemetryReader(publisher.path) as reader:
+            for i in range(20000):
+                result = reader.read_values()
+                if result is not None:
+                    values = result[1]
+                    assert values[2] == values[3]
+                    assert result[0] % 2 == 0
+    finally:
+        done.set()
+        for writer in writers:
+            writer.join()
+    assert publisher.values['updates'] == (publisher._sequence - 2) // 2
+
+
+def test_reader_reports_version_it_found(publisher):
+    HEADER.pack_into(publisher._mm, 0, MAGIC, 7, 0)
+    with pytest.raises(TelemetryError, match='version 7'):
+        TelemetryReader(publisher.path)
+    HEADER.pack_into(publisher._mm, 0, b'XXXX', 1, 0)
+    with pytest.raises(TelemetryError, match='not a telemetry file'):
+        TelemetryReader(publisher.path)
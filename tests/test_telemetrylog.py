@@ -0,0 +1,59 @@
+import pytest
+
+from pyviscalib import telemetrylog
+from pyviscalib.telemetrylog import TelemetryLog, TelemetryLogError
+
+
+def test_rows_round_trip(tmp_path):
+    path = str(tmp_path / 'log.vlog')
+    with TelemetryLog(path, block_size=3) as log:
+        for i in range(7):
+            log.record(1 + i % 2, 'zoom', float(i), i * 100)
+        log.record(1, telemetrylog.POWER, 7.0, 1)
+    columns = telemetrylog.load(path)
+    assert list(columns['time']) == [float(i) for i in range(8)]
+    assert list(columns['value']) == [i * 100 for i in range(7)] + [1]
+    assert list(columns['device']) == [1, 2, 1, 2, 1, 2, 1, 1]
+    assert list(columns['field']) == [telemetrylog.ZOOM] * 7 + [telemetrylog.POWER]
+
+
+def test_appends_to_an_existing_log(tmp_path):
+    path = str(tmp_path / 'log.vlog')
+    for t in (1.0, 2.0):
+        with TelemetryLog(path) as log:
+            log.record_zoom(1, t, 0)
+    assert list(telemetrylog.load(path)['time']) == [1.0, 2.0]
+
+
+def test_cut_block_is_ignored(tmp_path):
+    path = str(tmp_path / 'log.vlog')
+    with TelemetryLog(path, block_size=2) as log:
+        for i in range(3):
+            log.record_zoom(1, float(i), i)
+    with open(path, 'rb+') as f:
+        f.truncate(f.seek(0, 2) - 1)
+    assert list(telemetrylog.load(path)['value']) == [0, 1]
+
+
+def test_not_a_log(tmp_path):
+    path = tmp_path / 'other'
+    path.write_bytes(b'something else')
+    with pytest.raises(TelemetryLogError):
+        TelemetryLog(str(path))
+
+
+def test_zoom_steps_match_zoom_index(visca, tmp_path):
+    path = str(tmp_path / 'log.vlog')
+    log = TelemetryLog(path)
+    visca.telemetry_log = log
+    try:
+        for step in (0, 5, 29):
+            visca.cmd_cam_zoom_direct(1, step)
+            visca.inquiry_precise_zoom_position(1)
+    finally:
+        visca.telemetry_log = None
+        log.close()
+    times, raw, steps, zoom = telemetrylog.decode_zoom(path, device=1)
+    assert len(times) == 3
+    assert list(steps) == [visca.zoom_index(r, 1) for r in raw]
+    assert list(zoom) == [s + 1 for s in steps]
@@ -0,0 +1,142 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from pyviscalib import viscaip
+from pyviscalib.protocol import encode
+from pyviscalib.simulator import ViscaSimulator
+from pyviscalib.transport import LoopbackTransport, UDPTransport
+from pyviscalib.visca import ViscaControl
+
+
+class UDPCamera(threading.Thread):
+    """
+    VISCA over IP camera stand-in: drops the first `drop` packets and
+    answers the next `sequence_errors` ones with a sequence error
+    """
+
+    def __init__(self, drop=0, sequence_errors=0, silent=False):
+        threading.Thread.__init__(self, daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.02)
+        self.port = self.sock.getsockname()[1]
+        self.drop = drop
+        self.sequence_errors = sequence_errors
+        self.silent = silent
+        self.simulator = ViscaSimulator()
+        self.received = []
+        self._exit = False
+
+    def run(self):
+        while not self._exit:
+            try:
+                datagram, address = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            payload_type, seq, payload = viscaip.unpack(datagram)
+            self.received.append((payload_type, seq, payload))
+            if payload_type == viscaip.PAYLOAD_CONTROL:
+                self.sock.sendto(viscaip.pack(viscaip.PAYLOAD_CONTROL_REPLY, seq, b'\x01'), address)
+            elif self.silent:
+                continue
+            elif self.drop:
+                self.drop -= 1
+            elif self.sequence_errors:
+                self.sequence_errors -= 1
+                self.sock.sendto(viscaip.pack(viscaip.PAYLOAD_CONTROL_REPLY, seq,
+                                              viscaip.CONTROL_ERROR_SEQUENCE), address)
+            else:
+                for reply in self.simulator.handle(payload):
+                    self.sock.sendto(viscaip.pack(viscaip.PAYLOAD_REPLY, seq, reply), address)
+
+    def stop(self):
+        self._exit = True
+        self.join()
+        self.sock.close()
+
+
+@pytest.fixture
+def udp_camera():
+    cameras = []
+
+    def make(**kwargs):
+        camera = UDPCamera(**kwargs)
+        camera.start()
+        cameras.append(camera)
+        return camera
+    yield make
+    for camera in cameras:
+        camera.stop()
+
+
+def read_packet(transport):
+    packet = b''
+    while not packet.endswith(b'\xff'):
+        byte = transport.read(1)
+        if not byte:
+            return packet
+        packet += byte
+    return packet
+
+
+def power_inquiry():
+    return encode(0, 1, b'\x09\x04\x00')
+
+
+def test_udp_retransmits_lost_packet(udp_camera):
+    camera = udp_camera(drop=1)
+    transport = UDPTransport('127.0.0.1', camera.port, timeout=1, retransmit=0.05)
+    transport.open()
+    transport.write(power_inquiry())
+    assert read_packet(transport) == b'\x90\x50\x02\xff'
+    assert transport.retransmits == 1
+    transport.close()
+
+
+def test_udp_sequence_error_resets_numbering(udp_camera):
+    camera = udp_camera(sequence_errors=1)
+    transport = UDPTransport('127.0.0.1', camera.port, timeout=1, retransmit=0.5)
+    transport.open()
+    transport.write(power_inquiry())
+    transport.write(power_inquiry())
+    assert read_packet(transport) == b'\x90\x50\x02\xff'
+    inquiries = [r for r in camera.received if r[0] == viscaip.PAYLOAD_INQUIRY]
+    # the second inquiry was answered with a sequence error, the
+    # transport started over at 1 and sent it again
+    assert [seq for t, seq, p in inquiries] == [1, 2, 1]
+    controls = [r for r in camera.received if r[0] == viscaip.PAYLOAD_CONTROL]
+    assert len(controls) == 2
+    transport.close()
+
+
+def test_udp_read_times_out_empty(udp_camera):
+    camera = udp_camera(silent=True)
+    transport = UDPTransport('127.0.0.1', camera.port, timeout=0.2, retransmit=0.05, retries=2)
+    transport.open()
+    transport.write(power_inquiry())
+    started = time.monotonic()
+    assert transport.read(1) == b''
+    assert time.monotonic() - started < 1
+    assert transport.retransmits == 2
+    transport.close()
+
+
+def test_same_transport_same_control():
+    transport = LoopbackTransport()
+    assert ViscaControl(transport=transport) is ViscaControl(transport=transport)
+
+
+def test_transports_with_the_same_name_are_different_links():
+    first = ViscaControl(transport=LoopbackTransport(name='loop://same'))
+    second = ViscaControl(transport=LoopbackTransport(name='loop://same'))
+    assert first is not second
+    assert first.transport is not second.transport
+
+
+def test_loopback_round_trip(visca):
+    assert visca.inquiry_power(1) is True
+    visca.cmd_cam_lr_reverse_on(1)
+    assert visca.inquiry_mirror_mode(1) is True
@@ -0,0 +1,84 @@
+import time
+
+from pyviscalib.simulator import ViscaSimulator
+from pyviscalib.timing import Transaction
+from pyviscalib.watchdog import HealthWatchdog, OK, DEGRADED, DOWN, UNKNOWN
+
+
+class Flaky(ViscaSimulator):
+
+    silent = False
+
+    def handle(self, packet):
+        replies = ViscaSimulator.handle(self, packet)
+        return [] if self.silent else replies
+
+
+def answer(watchdog, camera_time, device=1, now=[100.0]):
+    now[0] += 1
+    watchdog.observe(Transaction(device, True, now[0], now[0] + camera_time, 5, 4, 0.0), b'\x90\x50\x02\xff')
+
+
+def test_states_follow_the_answers(visca):
+    watchdog = HealthWatchdog(visca, devices=[1], recover=False)
+    visca.watchdog = watchdog
+    assert watchdog.state(1) == UNKNOWN
+    visca.inquiry_power(1)
+    assert watchdog.state(1) == OK
+    assert watchdog[1].samples == 1
+
+
+def test_late_answer_is_degraded(visca):
+    watchdog = HealthWatchdog(visca, devices=[1], margin=0.001)
+    for i in range(20):
+        answer(watchdog, 0.010 + (i % 2) * 0.001)
+    assert watchdog.state(1) == OK
+    # far outside srtt + 4 rttvar, though below twice the best
+    answer(watchdog, 0.019)
+    assert watchdog.state(1) == DEGRADED
+    answer(watchdog, 0.010)
+    assert watchdog.state(1) == OK
+
+
+def test_slow_average_is_degraded(visca):
+    watchdog = HealthWatchdog(visca, devices=[1], margin=0.0)
+    answer(watchdog, 0.010)
+    for i in range(40):
+        answer(watchdog, 0.050)
+    assert watchdog.state(1) == DEGRADED
+    assert not watchdog.healthy(1)
+
+
+def test_batched_transactions_are_seen(visca):
+    watchdog = HealthWatchdog(visca, devices=[1], recover=False)
+    visca.watchdog = watchdog
+    with visca.session(1) as s:
+        s.cmd_cam_lr_reverse_on()
+        s.inquiry_power()
+    assert watchdog[1].samples == 2
+
+
+def test_down_device_is_recovered_outside_the_caller(make_visca):
+    camera = Flaky()
+    visca = make_visca(responder=camera, timeout=0.05)
+    changes = []
+    watchdog = HealthWatchdog(visca, devices=[1], down_after=2,
+                              on_change=lambda *change: changes.append(change))
+    visca.watchdog = watchdog
+    visca.inquiry_power(1)
+    camera.silent = True
+    # the timeout is seen while the session holds the bus lock
+    with visca.session(1) as s:
+        s.inquiry_power()
+        s.inquiry_power()
+    assert watchdog.state(1) == DOWN
+    deadline = time.monotonic() + 2
+    while watchdog[1].recoveries == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert watchdog[1].recoveries == 1
+    assert changes[:3] == [(1, UNKNOWN, OK), (1, OK, DEGRADED), (1, DEGRADED, DOWN)]
+    camera.silent = False
+    visca.mutex.acquire()
+    visca.mutex.release()
+    visca.inquiry_power(1)
+    assert watchdog.state(1) == OK